@@ -0,0 +1,113 @@
+''' Search latency of the catalog cache (database.catalog) against the SQL reads of
+the models, on a database with --students students. Also times the first load of
+the table and catching up after a single write, and checks that the catalog finds
+every row that the SQL search finds and that text in the integer columns loads.
+
+Usage (from the project root):
+    python -m benchmarks.bench_catalog [--students 20000] [--repeat 5] [--json results.json]
+'''
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from database.catalog import CatalogCache
+from database.connection import DatabaseManager
+from database.models import StudentModel, InventoryModel
+from .synthetic import FIRST_NAMES, LAST_NAMES, PROJECTS, STUDENT_BASE
+
+TERMS = ['', 'a', 'gom', 'luis', '2018100', 'perez', 'Sistemas']
+
+def build(db_manager, students, seed=42):
+    rng = random.Random(seed)
+    with db_manager.get_connection() as conn:
+        conn.executemany('INSERT INTO proyectos_curriculares (nombre) VALUES (?)', [(p,) for p in PROJECTS])
+        conn.executemany('INSERT INTO estudiantes (codigo, nombre, cedula, proyecto_curricular_id) VALUES (?, ?, ?, ?)', [
+            (STUDENT_BASE + i, f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}',
+             1000000000 + i, rng.randint(1, len(PROJECTS)))
+            for i in range(students)
+        ])
+        conn.commit()
+
+def check_text_values(db_manager):
+    ''' Text where the catalog expects integers (the inventory dialog saves an empty
+    documento_funcionario as '', hand edits may leave text in a cedula) must load,
+    both on the first read and as an incremental update '''
+    inventory = InventoryModel(db_manager)
+    inventory.add_equipment('INV-9', '', '', '', 'Osciloscopio', '', 'DISPONIBLE', None)
+    with db_manager.get_connection() as conn:
+        conn.execute("INSERT INTO estudiantes (codigo, nombre, cedula) VALUES (1, 'Sin Cédula', '')")
+        conn.commit()
+    catalog = CatalogCache(db_manager)
+    assert catalog.get_all_equipment() == inventory.get_all_equipment()
+    assert catalog.get_all_students('sin cedula') == [(1, 'Sin Cédula', '', None)]
+    inventory.add_equipment('INV-10', 'Fluke', 'n/a', 'Ana', 'Multímetro', '', 'DISPONIBLE', None)
+    with db_manager.get_connection() as conn:
+        conn.execute("UPDATE estudiantes SET cedula = 'pendiente' WHERE codigo = ?", (STUDENT_BASE + 1,))
+        conn.commit()
+    assert sorted(catalog.get_all_equipment()) == sorted(inventory.get_all_equipment())
+    assert catalog.get_all_students('pendiente')[0][2] == 'pendiente'
+
+def best_of(repeat, fn, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='Optional path to save the results')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_manager = DatabaseManager(os.path.join(directory, 'catalog.db'))
+        build(db_manager, args.students)
+        model = StudentModel(db_manager)
+        catalog = CatalogCache(db_manager)
+
+        start = time.perf_counter()
+        catalog.get_all_students()
+        load_ms = (time.perf_counter() - start) * 1000
+
+        results = []
+        for term in TERMS:
+            project = 'Ingeniería de Sistemas' if term == 'Sistemas' else ''
+            search = '' if project else term
+            # The catalog also finds the names with accents ('perez' -> 'Pérez')
+            assert set(model.get_all_students(search, project)) <= set(catalog.get_all_students(search, project)), term
+            sql = best_of(args.repeat, model.get_all_students, search, project)
+            cached = best_of(args.repeat, catalog.get_all_students, search, project)
+            results.append({
+                'search': term,
+                'rows': len(catalog.get_all_students(search, project)),
+                'sql_ms': round(sql * 1000, 2),
+                'catalog_ms': round(cached * 1000, 2),
+                'speedup': round(sql / cached, 1),
+            })
+
+        model.update_student(STUDENT_BASE, 'Zoe Núñez', 1000000000, 1)
+        start = time.perf_counter()
+        found = catalog.get_all_students('zoe nunez')
+        update_ms = (time.perf_counter() - start) * 1000
+        assert [row[0] for row in found] == [STUDENT_BASE], found
+        check_text_values(db_manager)
+        db_manager.pool.close_all()
+
+    headers = list(results[0])
+    print(' | '.join(f'{h:>12}' for h in headers))
+    for row in results:
+        print(' | '.join(f'{str(row[h]):>12}' for h in headers))
+    print(f'First load, {args.students} students: {load_ms:.1f} ms; search after one update: {update_ms:.1f} ms')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'searches': results, 'load_ms': round(load_ms, 1), 'update_ms': round(update_ms, 1)}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+''' Wall time of the database export, serial against the process pool.
+
+The export only reads, so every run uses the same synthetic database built by
+benchmarks.synthetic. Each worker count is run --repeat times and the median is
+compared with the serial export (one worker, single read snapshot). --formats
+runs the same comparison for each export format.
+
+Usage (from the project root):
+    python -m benchmarks.bench_export [--scale medium] [--workers 1 2 4 8] [--repeat 3]
+                                      [--formats xlsx csv jsonl sqlite]
+                                      [--cache .bench_cache] [--json results.json]
+'''
+import argparse
+import json
+import os
+import platform
+import statistics
+import tempfile
+from datetime import datetime
+
+from utils.exporter import EXPORT_FORMATS, run_export
+from .synthetic import SCALES, generate
+
+def bench_workers(db_path, fmt, workers, repeat, out_dir):
+    file_path = os.path.join(out_dir, f'export_{workers}{EXPORT_FORMATS[fmt].extension}')
+    runs = [run_export(file_path, db_path, workers=workers, fmt=fmt) for _ in range(repeat)]
+    os.remove(file_path)
+    seconds = [run['seconds'] for run in runs]
+    return {
+        'median_s': round(statistics.median(seconds), 2),
+        'min_s': min(seconds),
+        'max_s': max(seconds),
+        'rows': runs[0]['total_rows'],
+        'size_mb': runs[0]['size_mb'],
+        'peak_rss_mb': max(run['peak_rss_mb'] or 0 for run in runs),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=list(SCALES), default='medium')
+    parser.add_argument('--workers', nargs='+', type=int,
+                        default=sorted({1, 2, 4, min(os.cpu_count() or 1, 10)}))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--formats', nargs='+', choices=list(EXPORT_FORMATS), default=['xlsx'])
+    parser.add_argument('--cache', default=os.path.join(tempfile.gettempdir(), 'lab_bench_cache'),
+                        help='Directory where the synthetic databases are kept between runs')
+    parser.add_argument('--json', help='Optional path to save the results')
+    args = parser.parse_args()
+
+    db_path = generate(args.cache, args.scale)
+    results = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'scale': args.scale,
+        'size': SCALES[args.scale],
+        'repeat': args.repeat,
+        'formats': {},
+    }
+    with tempfile.TemporaryDirectory(prefix='bench_export_') as out_dir:
+        for fmt in args.formats:
+            # The SQLite copy does not use the process pool
+            worker_counts = args.workers if EXPORT_FORMATS[fmt].uses_sheets else [1]
+            results['formats'][fmt] = {workers: bench_workers(db_path, fmt, workers, args.repeat, out_dir)
+                                       for workers in worker_counts}
+
+    print(f"\n{args.scale}, {os.cpu_count()} cpus")
+    print(f"{'format':<8} {'workers':>7} {'median s':>9} {'min s':>7} {'max s':>7} {'rows':>9} "
+          f"{'size MB':>8} {'RSS MB':>7} {'speedup':>8}")
+    for fmt, by_workers in results['formats'].items():
+        serial = by_workers.get(1)
+        for workers, r in by_workers.items():
+            speedup = f"{serial['median_s'] / r['median_s']:.2f}x" if serial and r['median_s'] else '-'
+            print(f"{fmt:<8} {workers:>7} {r['median_s']:>9.2f} {r['min_s']:>7.2f} {r['max_s']:>7.2f} "
+                  f"{r['rows'] if r['rows'] is not None else '-':>9} {r['size_mb']:>8} {r['peak_rss_mb']:>7} {speedup:>8}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+if __name__ == '__main__':
+    main()
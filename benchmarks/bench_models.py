@@ -0,0 +1,239 @@
+''' Latency of the public model methods on synthetic databases of growing size.
+
+Every call runs against a copy of a database built by benchmarks.synthetic, so
+the writes of one run never leak into the next. Reads are timed after one warm-up
+call; writes (inserts, exits, returns, updates) use fresh rows on each repetition.
+Results go to JSON so two runs can be compared with --compare.
+
+Usage (from the project root):
+    python -m benchmarks.bench_models [--scales small medium] [--repeat 5]
+                                      [--cache .bench_cache] [--json results.json]
+                                      [--compare previous.json] [--only RoomLoan]
+'''
+import argparse
+import itertools
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from database.connection import DatabaseManager
+from database.models import (StudentModel, ProfesorModel, RoomModel, InventoryModel, PersonalLaboratorioModel,
+                             RoomLoanModel, EquipmentLoanModel, EquiposModel, ProyectosCurricularesModel,
+                             SedesModel, DashboardModel)
+from .synthetic import SCALES, STUDENT_BASE, PROFESSOR_BASE, generate, copy_database
+
+def _models(db_manager):
+    return {
+        'students': StudentModel(db_manager),
+        'profesores': ProfesorModel(db_manager),
+        'rooms': RoomModel(db_manager),
+        'inventory': InventoryModel(db_manager),
+        'personal': PersonalLaboratorioModel(db_manager),
+        'room_loans': RoomLoanModel(db_manager),
+        'equipment_loans': EquipmentLoanModel(db_manager),
+        'equipos': EquiposModel(db_manager),
+        'proyectos': ProyectosCurricularesModel(db_manager),
+        'sedes': SedesModel(db_manager),
+        'dashboard': DashboardModel(db_manager),
+    }
+
+def _available_items(db_manager):
+    conn = db_manager.get_connection()
+    try:
+        return [row[0] for row in conn.execute("SELECT codigo FROM inventario WHERE estado = 'DISPONIBLE' ORDER BY codigo")]
+    finally:
+        conn.close()
+
+# (name, kind, call). kind is 'read' or 'write'; write calls get the repetition number
+def _calls(m, db_manager):
+    now = datetime.now
+    new_codes = itertools.count(99000000000)
+    new_room_loans = {'student': [], 'professor': []}
+    new_equipment_loans = {'student': [], 'professor': []}
+    items = iter(_available_items(db_manager))
+    student, professor = STUDENT_BASE + 7, PROFESSOR_BASE + 3
+    # A page from the middle of the history, about a year back
+    page_cursor = (0, (now() - timedelta(days=365)).strftime('%Y-%m-%d %H:%M:%S'), 'student', 1 << 62)
+
+    def add_room_loan_student(i):
+        loan_id = m['room_loans'].add_loan_student(now(), 1, 4, i % 5 + 1, student, None, '')
+        new_room_loans['student'].append(loan_id)
+        return loan_id
+
+    def add_room_loan_professor(i):
+        loan_id = m['room_loans'].add_loan_professor(now(), 1, 4, i % 5 + 1, professor, '')
+        new_room_loans['professor'].append(loan_id)
+        return loan_id
+
+    def add_equipment_loan_student(i):
+        loan_id = m['equipment_loans'].add_loan_student(now(), next(items), 1, 4, student, 2, 1, 'Circuitos I', '')
+        new_equipment_loans['student'].append(loan_id)
+        return loan_id
+
+    def add_equipment_loan_professor(i):
+        loan_id = m['equipment_loans'].add_loan_professor(now(), next(items), 1, 4, professor, 1, 'Control', '')
+        new_equipment_loans['professor'].append(loan_id)
+        return loan_id
+
+    return [
+        # Searches
+        ('StudentModel.get_all_students', 'read', lambda: m['students'].get_all_students()),
+        ('StudentModel.get_all_students (search)', 'read', lambda: m['students'].get_all_students('Pérez')),
+        ('StudentModel.get_all_students (short)', 'read', lambda: m['students'].get_all_students('An')),
+        ('StudentModel.get_student_by_code_or_id', 'read', lambda: m['students'].get_student_by_code_or_id(student)),
+        ('StudentModel.get_students_by_partial_query', 'read', lambda: m['students'].get_students_by_partial_query('2018100')),
+        ('StudentModel.get_curriculum_projects', 'read', lambda: m['students'].get_curriculum_projects()),
+        ('ProfesorModel.get_all_profesores', 'read', lambda: m['profesores'].get_all_profesores()),
+        ('ProfesorModel.get_all_profesores (search)', 'read', lambda: m['profesores'].get_all_profesores('Gómez')),
+        ('ProfesorModel.get_professor_by_id', 'read', lambda: m['profesores'].get_professor_by_id(professor)),
+        ('ProfesorModel.get_professors_by_partial_query', 'read', lambda: m['profesores'].get_professors_by_partial_query('Lui')),
+        ('RoomModel.get_all_rooms_with_status', 'read', lambda: m['rooms'].get_all_rooms_with_status()),
+        ('RoomModel.get_available_rooms_for_dropdown', 'read', lambda: m['rooms'].get_available_rooms_for_dropdown()),
+        ('RoomModel.get_all_rooms_with_id_for_dropdown', 'read', lambda: m['rooms'].get_all_rooms_with_id_for_dropdown()),
+        ('RoomModel.get_room_by_code', 'read', lambda: m['rooms'].get_room_by_code('S-001')),
+        ('InventoryModel.get_all_equipment', 'read', lambda: m['inventory'].get_all_equipment()),
+        ('InventoryModel.get_all_equipment (search)', 'read', lambda: m['inventory'].get_all_equipment('Osciloscopio')),
+        ('InventoryModel.get_all_equipment (estado)', 'read', lambda: m['inventory'].get_all_equipment(status_filter='EN USO')),
+        ('InventoryModel.get_equipment_by_code', 'read', lambda: m['inventory'].get_equipment_by_code('INV-000010')),
+        ('InventoryModel.get_available_equipment_for_dropdown', 'read', lambda: m['inventory'].get_available_equipment_for_dropdown()),
+        ('InventoryModel.get_equipment_by_partial_code', 'read', lambda: m['inventory'].get_equipment_by_partial_code('INV-0001')),
+        ('InventoryModel.get_sedes', 'read', lambda: m['inventory'].get_sedes()),
+        ('PersonalLaboratorioModel.get_all_personal', 'read', lambda: m['personal'].get_all_personal()),
+        ('PersonalLaboratorioModel.get_laboratoristas', 'read', lambda: m['personal'].get_laboratoristas()),
+        ('EquiposModel.get_all_equipos', 'read', lambda: m['equipos'].get_all_equipos()),
+        ('EquiposModel.get_equipo_by_identifier', 'read', lambda: m['equipos'].get_equipo_by_identifier(1, numero_equipo=3)),
+        ('ProyectosCurricularesModel.get_all_proyectos', 'read', lambda: m['proyectos'].get_all_proyectos()),
+        ('SedesModel.get_all_sedes', 'read', lambda: m['sedes'].get_all_sedes()),
+        # Histories
+        ('RoomLoanModel.get_room_loans_page', 'read', lambda: m['room_loans'].get_room_loans_page()),
+        ('RoomLoanModel.get_room_loans_page (cursor)', 'read', lambda: m['room_loans'].get_room_loans_page(cursor=page_cursor)),
+        ('RoomLoanModel.count_room_loans', 'read', lambda: m['room_loans'].count_room_loans()),
+        ('RoomLoanModel.get_room_loans (en préstamo)', 'read', lambda: m['room_loans'].get_room_loans(status_filter='En Préstamo')),
+        ('RoomLoanModel.get_room_loans_page (sala)', 'read', lambda: m['room_loans'].get_room_loans_page(sala_filter_id=2)),
+        ('RoomLoanModel.get_room_loans_page (búsqueda)', 'read', lambda: m['room_loans'].get_room_loans_page(search_term='Pérez')),
+        ('RoomLoanModel.get_room_loan_details', 'read', lambda: m['room_loans'].get_room_loan_details(1, 'student')),
+        ('EquipmentLoanModel.get_equipment_loans_page', 'read', lambda: m['equipment_loans'].get_equipment_loans_page()),
+        ('EquipmentLoanModel.count_equipment_loans', 'read', lambda: m['equipment_loans'].count_equipment_loans()),
+        ('EquipmentLoanModel.get_equipment_loans (en préstamo)', 'read',
+         lambda: m['equipment_loans'].get_equipment_loans(status_filter='En Préstamo')),
+        ('EquipmentLoanModel.get_equipment_loans_page (búsqueda)', 'read',
+         lambda: m['equipment_loans'].get_equipment_loans_page(search_term='Osciloscopio')),
+        ('EquipmentLoanModel.get_equipment_loan_details', 'read', lambda: m['equipment_loans'].get_equipment_loan_details(1, 'student')),
+        # Dashboard
+        ('DashboardModel.get_room_metrics', 'read', lambda: m['dashboard'].get_room_metrics()),
+        ('DashboardModel.get_equipment_metrics', 'read', lambda: m['dashboard'].get_equipment_metrics()),
+        ('DashboardModel.get_active_loans', 'read', lambda: m['dashboard'].get_active_loans()),
+        ('DashboardModel.get_alerts', 'read', lambda: m['dashboard'].get_alerts()),
+        ('RoomModel.rebuild_occupancy', 'read', lambda: m['rooms'].rebuild_occupancy()),
+        # Inserts and returns
+        ('StudentModel.add_student', 'write', lambda i: m['students'].add_student(next(new_codes), 'Estudiante Nuevo', 5000 + i, 1)),
+        ('ProfesorModel.add_profesor', 'write', lambda i: m['profesores'].add_profesor(next(new_codes), 'Profesor Nuevo', 1)),
+        ('RoomLoanModel.add_loan_student', 'write', add_room_loan_student),
+        ('RoomLoanModel.add_loan_professor', 'write', add_room_loan_professor),
+        ('RoomLoanModel.update_room_loan_exit', 'write',
+         lambda i: m['room_loans'].update_room_loan_exit(new_room_loans['student'][i], 'student', '18:00:00', '', 1)),
+        ('EquipmentLoanModel.add_loan_student', 'write', add_equipment_loan_student),
+        ('EquipmentLoanModel.add_loan_professor', 'write', add_equipment_loan_professor),
+        ('EquipmentLoanModel.update_equipment_loan_return', 'write',
+         lambda i: m['equipment_loans'].update_equipment_loan_return(new_equipment_loans['student'][i], 'student',
+                                                                     now(), 1, 4, '')),
+        ('RoomLoanModel.delete_loan', 'write',
+         lambda i: m['room_loans'].delete_loan(new_room_loans['professor'][i], 'professor')),
+    ]
+
+def _rows(result):
+    # Paged readers return (rows, cursor); single-row readers return one tuple
+    if isinstance(result, tuple) and len(result) == 2 and isinstance(result[0], list):
+        return len(result[0])
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        return sum(len(v) if isinstance(v, list) else 1 for v in result.values())
+    return 1 if result is not None else 0
+
+def _summary(times, rows):
+    times_ms = sorted(t * 1000 for t in times)
+    p95 = times_ms[min(len(times_ms) - 1, int(round(0.95 * (len(times_ms) - 1))))]
+    return {
+        'runs': len(times_ms),
+        'min_ms': round(times_ms[0], 3),
+        'median_ms': round(statistics.median(times_ms), 3),
+        'p95_ms': round(p95, 3),
+        'max_ms': round(times_ms[-1], 3),
+        'rows': rows,
+    }
+
+def bench_scale(scale, repeat, cache_dir, only=None):
+    source = generate(cache_dir, scale)
+    with tempfile.TemporaryDirectory(prefix=f'bench_models_{scale}_') as tmp_dir:
+        db_manager = DatabaseManager(copy_database(source, os.path.join(tmp_dir, 'bench.db')))
+        results = {}
+        try:
+            for name, kind, call in _calls(_models(db_manager), db_manager):
+                if only and not any(o in name for o in only):
+                    continue
+                times, rows = [], 0
+                if kind == 'read':
+                    call() # Warm-up, fills the page cache
+                for i in range(repeat):
+                    start = time.perf_counter()
+                    result = call() if kind == 'read' else call(i)
+                    times.append(time.perf_counter() - start)
+                    rows = _rows(result)
+                results[name] = _summary(times, rows)
+                print(f"  {name:<60} {results[name]['median_ms']:>10.3f} ms  ({rows} rows)")
+        finally:
+            db_manager.close()
+    return results
+
+def compare(current, previous):
+    ''' Prints the median of both runs side by side for the scales they share '''
+    for scale, methods in current['scales'].items():
+        old_methods = previous.get('scales', {}).get(scale)
+        if not old_methods:
+            continue
+        print(f'\n{scale}: median ms (previous -> current)')
+        for name, stats in methods.items():
+            old = old_methods.get(name)
+            if not old:
+                continue
+            ratio = stats['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+            print(f"  {name:<60} {old['median_ms']:>10.3f} -> {stats['median_ms']:>10.3f}  x{ratio:.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['small', 'medium'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--cache', default=os.path.join(tempfile.gettempdir(), 'lab_bench_cache'),
+                        help='Directory where the synthetic databases are kept between runs')
+    parser.add_argument('--only', nargs='+', help='Run only the methods whose name contains one of these')
+    parser.add_argument('--json', help='Optional path to save the results')
+    parser.add_argument('--compare', help='Results of a previous run to compare with')
+    args = parser.parse_args()
+
+    results = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'repeat': args.repeat,
+        'scales': {},
+        'sizes': {scale: SCALES[scale] for scale in args.scales},
+    }
+    for scale in args.scales:
+        print(f'{scale}:')
+        results['scales'][scale] = bench_scale(scale, args.repeat, args.cache, args.only)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+if __name__ == '__main__':
+    main()
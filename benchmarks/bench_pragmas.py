@@ -0,0 +1,107 @@
+''' Compares the pragma profiles of DatabaseManager on the two operations that
+compete at the counter: registering room loans and reading the loan history.
+
+Usage (from the project root):
+    python -m benchmarks.bench_pragmas [--loans 2000] [--reads 30] [--json results.json]
+'''
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from database.connection import DatabaseManager, PRAGMA_PROFILES
+from database.models import RoomLoanModel
+
+def seed(db_manager, students=2000, rooms=10):
+    conn = db_manager.get_connection()
+    try:
+        conn.executemany('INSERT INTO salas (codigo_interno, nombre) VALUES (?, ?)',
+                         [(f'S{i:02d}', f'Sala {i}') for i in range(1, rooms + 1)])
+        conn.executemany('INSERT INTO personal_laboratorio (nombre, cargo) VALUES (?, ?)',
+                         [('Laboratorista Uno', 0), ('Monitor Uno', 1)])
+        conn.executemany('INSERT INTO estudiantes (codigo, nombre, cedula) VALUES (?, ?, ?)',
+                         [(20200000000 + i, f'Estudiante {i}', 1000000 + i) for i in range(students)])
+        conn.commit()
+    finally:
+        conn.close()
+
+def bench_profile(profile, loans, reads, students):
+    tmp_dir = tempfile.mkdtemp(prefix=f'bench_{profile}_')
+    try:
+        manager = DatabaseManager(os.path.join(tmp_dir, 'bench.db'), profile=profile)
+        seed(manager, students)
+        loan_model = RoomLoanModel(manager)
+        start_date = datetime(2024, 1, 1, 7, 0)
+
+        # 1. Loan inserts, one commit each like the "Guardar Préstamo" button
+        start = time.perf_counter()
+        for i in range(loans):
+            loan_model.add_loan_student(start_date + timedelta(minutes=i), 1, 2, i % 10 + 1,
+                                        20200000000 + i % students, None, '')
+        insert_seconds = time.perf_counter() - start
+
+        # 2. History reads with no concurrent writer
+        read_times = []
+        for _ in range(reads):
+            start = time.perf_counter()
+            loan_model.get_room_loans()
+            read_times.append(time.perf_counter() - start)
+
+        # 3. History reads while another thread keeps registering loans
+        stop = threading.Event()
+        concurrent_reads = []
+
+        def reader():
+            while not stop.is_set():
+                start = time.perf_counter()
+                loan_model.get_room_loans(search_term='Estudiante 1')
+                concurrent_reads.append(time.perf_counter() - start)
+
+        reader_thread = threading.Thread(target=reader)
+        reader_thread.start()
+        start = time.perf_counter()
+        for i in range(loans // 4):
+            loan_model.add_loan_student(datetime.now(), 1, 2, i % 10 + 1, 20200000000 + i % students, None, '')
+        concurrent_insert_seconds = time.perf_counter() - start
+        stop.set()
+        reader_thread.join()
+        manager.close()
+
+        return {
+            'profile': profile,
+            'loan_inserts_per_s': round(loans / insert_seconds, 1),
+            'history_read_ms_median': round(statistics.median(read_times) * 1000, 2),
+            'concurrent_inserts_per_s': round((loans // 4) / concurrent_insert_seconds, 1),
+            'concurrent_reads': len(concurrent_reads),
+            'concurrent_read_ms_max': round(max(concurrent_reads, default=0) * 1000, 2),
+        }
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loans', type=int, default=2000)
+    parser.add_argument('--reads', type=int, default=30)
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--profiles', nargs='+', default=list(PRAGMA_PROFILES))
+    parser.add_argument('--json', help='Optional path to save the results')
+    args = parser.parse_args()
+
+    results = [bench_profile(p, args.loans, args.reads, args.students) for p in args.profiles]
+
+    headers = list(results[0])
+    print(' | '.join(f'{h:>24}' for h in headers))
+    for row in results:
+        print(' | '.join(f'{str(row[h]):>24}' for h in headers))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+''' Compares the per-value validators of utils.validators with the column versions
+of utils.batch_validators on a synthetic roster column, and times the whole
+validate_students step of the roster import.
+
+Usage (from the project root):
+    python -m benchmarks.bench_validators [--rows 100000] [--repeat 3] [--json results.json]
+'''
+import argparse
+import json
+import random
+import time
+
+from utils import validators, batch_validators
+from utils.importer import validate_students, iter_batches, IMPORT_BATCH_SIZE
+
+def synthetic_column(rows, seed=42):
+    ''' Roster-like values: mostly valid, with the typical typos mixed in '''
+    rng = random.Random(seed)
+    codes, numbers, dates = [], [], []
+    for i in range(rows):
+        codes.append(rng.choice([str(20150000000 + i)] * 20 + ['2015000', '2015-000-001', '']))
+        numbers.append(rng.choice([str(1000000 + i)] * 10 + ['', 'n/a', '-5', ' 42 ']))
+        dates.append(rng.choice([f'2023-{rng.randint(1, 12):02d}-{rng.randint(1, 31):02d} 10:30:00'] * 10
+                                + ['2023-02-30 10:00:00', '30/01/2023']))
+    return codes, numbers, dates
+
+def best_of(repeat, fn, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='Optional path to save the results')
+    args = parser.parse_args()
+
+    codes, numbers, dates = synthetic_column(args.rows)
+    cases = [
+        ('valid_ids', codes, validators.is_valid_id, batch_validators.valid_ids),
+        ('positive_integers', numbers, validators.is_positive_integer, batch_validators.positive_integers),
+        ('valid_datetimes', dates, validators.is_valid_datetime_format, batch_validators.valid_datetimes),
+    ]
+    results = []
+    for name, column, single, batch in cases:
+        assert [bool(single(value)) for value in column] == batch(column), f'{name} disagrees with {single.__name__}'
+        per_value = best_of(args.repeat, lambda: [single(value) for value in column])
+        per_column = best_of(args.repeat, batch, column)
+        results.append({
+            'check': name,
+            'per_value_ms': round(per_value * 1000, 1),
+            'column_ms': round(per_column * 1000, 1),
+            'speedup': round(per_value / per_column, 1),
+        })
+
+    records = [(line, {'codigo': codigo, 'nombre': f'Estudiante {line}', 'cedula': cedula, 'proyecto': ''})
+               for line, (codigo, cedula) in enumerate(zip(codes, numbers), start=2)]
+
+    def validate_roster():
+        errors, seen = [], set()
+        for batch in iter_batches(iter(records), IMPORT_BATCH_SIZE):
+            validate_students(batch, {}, seen, errors)
+
+    roster_seconds = best_of(args.repeat, validate_roster)
+
+    headers = list(results[0])
+    print(' | '.join(f'{h:>18}' for h in headers))
+    for row in results:
+        print(' | '.join(f'{str(row[h]):>18}' for h in headers))
+    print(f'validate_students, {args.rows} rows: {roster_seconds * 1000:.1f} ms')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'checks': results, 'validate_students_ms': round(roster_seconds * 1000, 1)}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
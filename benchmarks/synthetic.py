@@ -0,0 +1,251 @@
+''' Synthetic databases for the benchmarks, with the shape of a real laboratory:
+students and professors spread over the curricular projects, an inventory with a
+few damaged items, rooms with numbered computers and years of loan history in
+the four loan tables. Only the most recent loans are still open, like at the
+counter: rooms are given back the same day and equipment within a few days.
+
+The data is reproducible for a given scale and seed. generate() can reuse a
+database built earlier, because the large scale takes a few minutes to build.
+
+Usage (from the project root):
+    python -m benchmarks.synthetic --scale small --out synthetic_small.db
+'''
+import argparse
+import os
+import random
+import shutil
+import time
+from datetime import datetime, timedelta
+
+from database.connection import DatabaseManager
+
+SCALES = {
+    'small': dict(students=1000, professors=100, inventory=500, rooms=10, computers_per_room=20, loans=20000),
+    'medium': dict(students=5000, professors=400, inventory=2000, rooms=25, computers_per_room=25, loans=200000),
+    'large': dict(students=10000, professors=800, inventory=5000, rooms=40, computers_per_room=30, loans=1000000),
+}
+
+# Share of the loans that goes to each table
+LOAN_SPLIT = {
+    'prestamos_salas_estudiantes': 0.55,
+    'prestamos_salas_profesores': 0.10,
+    'prestamos_equipos_estudiantes': 0.28,
+    'prestamos_equipos_profesores': 0.07,
+}
+
+# Loans still open, among the most recent ones of each table
+OPEN_ROOM_LOANS = 0.002
+OPEN_EQUIPMENT_LOANS = 0.01
+DAMAGED_INVENTORY = 0.03
+HISTORY_DAYS = 730
+CHUNK_SIZE = 10000
+
+FIRST_NAMES = ['Ana', 'Luis', 'María', 'Carlos', 'Laura', 'Andrés', 'Sofía', 'Juan', 'Valentina', 'Diego',
+               'Camila', 'Santiago', 'Daniela', 'Felipe', 'Natalia', 'Jorge', 'Paula', 'Sebastián', 'Isabel', 'Óscar']
+LAST_NAMES = ['Pérez', 'Gómez', 'Rodríguez', 'Martínez', 'García', 'López', 'Hernández', 'Díaz', 'Moreno', 'Muñoz',
+              'Rojas', 'Vargas', 'Castro', 'Ortiz', 'Ramírez', 'Suárez', 'Jiménez', 'Torres', 'Núñez', 'Peña']
+PROJECTS = ['Ingeniería Electrónica', 'Ingeniería de Sistemas', 'Ingeniería Industrial', 'Ingeniería Eléctrica',
+            'Ingeniería Catastral', 'Tecnología en Electrónica', 'Tecnología en Sistematización de Datos']
+EQUIPMENT = ['Osciloscopio', 'Multímetro', 'Fuente de poder', 'Generador de señales', 'Protoboard',
+             'Kit Arduino', 'Cautín', 'Analizador lógico', 'Proyector', 'Portátil']
+BRANDS = ['Tektronix', 'Fluke', 'Rigol', 'Keysight', 'Uni-T', 'Epson', 'Lenovo']
+PRACTICES = ['Circuitos I', 'Electrónica II', 'Control', 'Comunicaciones', 'Microcontroladores', 'Redes']
+
+STUDENT_BASE = 20181000000
+PROFESSOR_BASE = 70000000
+
+def _name(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+def _chunks(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _insert(conn, sql, rows):
+    for chunk in _chunks(rows):
+        conn.executemany(sql, chunk)
+
+def _people(conn, rng, counts):
+    conn.executemany('INSERT INTO proyectos_curriculares (nombre) VALUES (?)', [(p,) for p in PROJECTS])
+    conn.executemany('INSERT INTO sedes (nombre) VALUES (?)', [('Sede Principal',), ('Sede Tecnológica',)])
+    staff = [(f'Laboratorista {i}', 0) for i in range(1, 4)] + [(f'Monitor {i}', 1) for i in range(1, 9)]
+    conn.executemany('INSERT INTO personal_laboratorio (nombre, cargo) VALUES (?, ?)', staff)
+    _insert(conn, 'INSERT INTO estudiantes (codigo, nombre, cedula, proyecto_curricular_id) VALUES (?, ?, ?, ?)',
+            ((STUDENT_BASE + i, _name(rng), 1000000000 + i, rng.randint(1, len(PROJECTS)))
+             for i in range(counts['students'])))
+    _insert(conn, 'INSERT INTO profesores (cedula, nombre, proyecto_curricular_id) VALUES (?, ?, ?)',
+            ((PROFESSOR_BASE + i, _name(rng), rng.randint(1, len(PROJECTS)))
+             for i in range(counts['professors'])))
+
+def _places(conn, rng, counts):
+    conn.executemany('INSERT INTO salas (codigo_interno, nombre) VALUES (?, ?)',
+                     [(f'S-{i:03d}', f'Laboratorio {i}') for i in range(1, counts['rooms'] + 1)])
+    _insert(conn, 'INSERT INTO equipos (codigo, sala_id, numero_equipo, descripcion, estado) VALUES (?, ?, ?, ?, 1)',
+            ((f'PC-{room:03d}-{n:02d}', room, n, 'Computador de escritorio')
+             for room in range(1, counts['rooms'] + 1) for n in range(1, counts['computers_per_room'] + 1)))
+    _insert(conn, '''INSERT INTO inventario (codigo, marca_serie, documento_funcionario, nombre_funcionario,
+                                            descripcion, contenido, estado, sede_id)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+            ((f'INV-{i:06d}', f'{rng.choice(BRANDS)} {rng.randint(10000, 99999)}', 79000000 + i % 20,
+              f'Funcionario {i % 20}', f'{rng.choice(EQUIPMENT)} {i}', 'Cables y manual', 'DISPONIBLE',
+              rng.randint(1, 2))
+             for i in range(counts['inventory'])))
+    # Damaged items keep their old loans but are never lent again
+    return {f'INV-{i:06d}' for i in range(counts['inventory']) if rng.random() < DAMAGED_INVENTORY}
+
+def _timestamps(rng, count, end):
+    ''' count loan start times over the history, oldest first, during opening hours '''
+    start = end - timedelta(days=HISTORY_DAYS)
+    span = int((end - start).total_seconds())
+    for offset in sorted(rng.randrange(span) for _ in range(count)):
+        moment = start + timedelta(seconds=offset)
+        yield moment.replace(hour=7 + moment.hour % 13)
+
+def _room_loans(rng, table, count, counts, end):
+    open_from = count - int(count * OPEN_ROOM_LOANS)
+    student = table == 'prestamos_salas_estudiantes'
+    for i, moment in enumerate(_timestamps(rng, count, end)):
+        sala = rng.randint(1, counts['rooms'])
+        if i >= open_from:
+            # Open loans happened today
+            moment = end - timedelta(minutes=rng.randint(1, 240))
+            salida = None
+        else:
+            salida = (moment + timedelta(minutes=rng.randint(30, 180))).strftime('%H:%M:%S')
+        fecha = moment.strftime('%Y-%m-%d %H:%M:%S')
+        lab, monitor = rng.randint(1, 3), rng.randint(4, 11)
+        if student:
+            equipo = f'PC-{sala:03d}-{rng.randint(1, counts["computers_per_room"]):02d}' if rng.random() < 0.7 else None
+            yield (fecha, lab, monitor, sala, STUDENT_BASE + rng.randrange(counts['students']), salida, equipo,
+                   1 if salida else None, 'Sin novedad' if rng.random() < 0.9 else 'Teclado con fallas')
+        else:
+            yield (fecha, lab, monitor, sala, PROFESSOR_BASE + rng.randrange(counts['professors']), salida,
+                   1 if salida else None, '')
+
+def _equipment_loans(rng, table, count, counts, end, open_items):
+    ''' Equipment loans; open_items hands out the items still lent, one open loan per item '''
+    open_from = count - min(int(count * OPEN_EQUIPMENT_LOANS), len(open_items))
+    student = table == 'prestamos_equipos_estudiantes'
+    for i, moment in enumerate(_timestamps(rng, count, end)):
+        if i >= open_from:
+            moment = end - timedelta(hours=rng.randint(1, 72))
+            item = open_items.pop()
+            devolucion = None
+        else:
+            item = f'INV-{rng.randrange(counts["inventory"]):06d}'
+            devolucion = (moment + timedelta(hours=rng.randint(1, 48))).strftime('%Y-%m-%d %H:%M:%S')
+        fecha = moment.strftime('%Y-%m-%d %H:%M:%S')
+        lab, monitor = rng.randint(1, 3), rng.randint(4, 11)
+        lab_dev, monitor_dev = (rng.randint(1, 3), rng.randint(4, 11)) if devolucion else (None, None)
+        estado = 0 if devolucion else 1
+        obs = 'Revisar' if devolucion and rng.random() < 0.02 else ''
+        practica = rng.choice(PRACTICES)
+        sala = rng.randint(1, counts['rooms'])
+        if student:
+            yield (fecha, devolucion, item, lab, monitor, STUDENT_BASE + rng.randrange(counts['students']),
+                   rng.randint(1, 4), sala, practica, estado, lab_dev, monitor_dev, obs)
+        else:
+            yield (fecha, devolucion, lab, monitor, item, PROFESSOR_BASE + rng.randrange(counts['professors']),
+                   sala, practica, estado, lab_dev, monitor_dev, obs)
+
+LOAN_INSERTS = {
+    'prestamos_salas_estudiantes': '''INSERT INTO prestamos_salas_estudiantes
+        (fecha_entrada, laboratorista, monitor, sala_id, estudiante_id, hora_salida, equipo_codigo, firma_estudiante, novedad)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+    'prestamos_salas_profesores': '''INSERT INTO prestamos_salas_profesores
+        (fecha_entrada, laboratorista, monitor, sala_id, profesor_id, hora_salida, firma_profesor, observaciones)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+    'prestamos_equipos_estudiantes': '''INSERT INTO prestamos_equipos_estudiantes
+        (fecha_entrega, fecha_devolucion, equipo_codigo, laboratorista_entrega, monitor_entrega, estudiante_id,
+         numero_estudiantes, sala_id, titulo_practica, estado, laboratorista_devolucion, monitor_devolucion, observaciones)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+    'prestamos_equipos_profesores': '''INSERT INTO prestamos_equipos_profesores
+        (fecha_entrega, fecha_devolucion, laboratorista_entrega, monitor_entrega, equipo_codigo, profesor_id,
+         sala_id, titulo_practica, estado, laboratorista_devolucion, monitor_devolucion, observaciones)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+}
+
+def _loans(conn, rng, counts, end, damaged):
+    open_items = [f'INV-{i:06d}' for i in range(counts['inventory']) if f'INV-{i:06d}' not in damaged]
+    rng.shuffle(open_items)
+    for table, share in LOAN_SPLIT.items():
+        count = int(counts['loans'] * share)
+        if table.startswith('prestamos_salas'):
+            rows = _room_loans(rng, table, count, counts, end)
+        else:
+            rows = _equipment_loans(rng, table, count, counts, end, open_items)
+        _insert(conn, LOAN_INSERTS[table], rows)
+
+    # The inventory triggers marked every lent item 'EN USO'; only the open loans keep it
+    conn.execute('''
+        UPDATE inventario SET estado = CASE
+            WHEN EXISTS (SELECT 1 FROM prestamos_equipos_estudiantes WHERE equipo_codigo = inventario.codigo
+                         AND fecha_devolucion IS NULL)
+              OR EXISTS (SELECT 1 FROM prestamos_equipos_profesores WHERE equipo_codigo = inventario.codigo
+                         AND fecha_devolucion IS NULL) THEN 'EN USO'
+            ELSE 'DISPONIBLE' END
+    ''')
+    conn.executemany("UPDATE inventario SET estado = 'DAÑADO' WHERE codigo = ?", [(codigo,) for codigo in sorted(damaged)])
+
+def build(path, scale='small', seed=42, end=None):
+    ''' Creates a new synthetic database at path (an existing file is replaced)
+    and returns the row counts used '''
+    counts = SCALES[scale] if isinstance(scale, str) else dict(scale)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    rng = random.Random(seed)
+    end = end or datetime.now().replace(microsecond=0)
+
+    db_manager = DatabaseManager(path)
+    conn = db_manager.get_connection()
+    try:
+        _people(conn, rng, counts)
+        damaged = _places(conn, rng, counts)
+        _loans(conn, rng, counts, end, damaged)
+        # The generated rows stand for history older than the change tracking
+        conn.execute('DELETE FROM cambios')
+        conn.commit()
+        conn.execute('ANALYZE')
+        conn.commit()
+    finally:
+        conn.close()
+        db_manager.close()
+    return counts
+
+def generate(directory, scale='small', seed=42, reuse=True):
+    ''' Returns the path of the synthetic database for a scale and seed inside
+    directory, building it only when there is no previous one '''
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'synthetic_{scale}_{seed}.db')
+    if not (reuse and os.path.exists(path)):
+        tmp_path = path + '.tmp'
+        build(tmp_path, scale, seed)
+        os.replace(tmp_path, path)
+    return path
+
+def copy_database(source, target):
+    ''' Copies a synthetic database so that a benchmark can write to it '''
+    shutil.copyfile(source, target)
+    return target
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=list(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', required=True, help='Path of the database to create')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = build(args.out, args.scale, args.seed)
+    print(f"Built {args.out} ({', '.join(f'{k}={v}' for k, v in counts.items())}) "
+          f'in {time.perf_counter() - start:.1f} s')
+
+if __name__ == '__main__':
+    main()
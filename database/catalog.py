@@ -0,0 +1,370 @@
+''' In-memory copy of the catalog tables (students, professors, inventory, room
+computers, rooms, staff, curricular projects and sedes) for the list views.
+
+Each table is loaded once into a column store: integer columns in array('q')
+(or a plain list once a row holds text in one) and text columns as lists of
+interned strings, plus a search key per row (the
+searched columns, lowercase and without accents) and a precomputed sort order.
+The get_all_* methods take the same arguments and return the same rows as the
+model methods, but filter and sort in memory, so "gonzalez" also finds
+"González".
+
+The copy follows the cambios log that the change tracking triggers fill on
+every write (model methods, imports and the loan triggers that change the
+inventory or room status alike): before answering, the cache compares the last
+change id with its watermark and re-reads only the keys changed since then.
+
+    catalog = get_catalog(db_manager)
+    catalog.get_all_students('gonzalez', project_filter_name='Ingeniería de Sistemas')
+'''
+import json
+import os
+import sys
+import threading
+import unicodedata
+from array import array
+from collections import namedtuple
+from .connection import DatabaseManager
+from .migrations import CURRENT_CHANGE_SQL
+
+# Stands for NULL in the integer columns
+NULL = -(1 << 63)
+
+# Share of a table changed at once above which it is read again whole
+RELOAD_SHARE = 0.5
+
+# key is the primary key, ints the integer columns, search the columns matched by
+# the search term and sort the columns of the listing order (None: sorted per query)
+TableSpec = namedtuple('TableSpec', ['key', 'columns', 'ints', 'search', 'sort'])
+
+CATALOG_TABLES = {
+    'estudiantes': TableSpec('codigo', ('codigo', 'nombre', 'cedula', 'proyecto_curricular_id'),
+                             ('codigo', 'cedula', 'proyecto_curricular_id'), ('codigo', 'nombre', 'cedula'), ('nombre',)),
+    'profesores': TableSpec('cedula', ('cedula', 'nombre', 'proyecto_curricular_id'),
+                            ('cedula', 'proyecto_curricular_id'), ('cedula', 'nombre'), ('nombre',)),
+    'inventario': TableSpec('codigo', ('codigo', 'marca_serie', 'documento_funcionario', 'nombre_funcionario',
+                                       'descripcion', 'contenido', 'estado', 'sede_id'),
+                            ('sede_id',), ('codigo', 'descripcion'), ('codigo',)),
+    'equipos': TableSpec('codigo', ('codigo', 'sala_id', 'numero_equipo', 'descripcion', 'estado', 'observaciones'),
+                         ('sala_id', 'numero_equipo', 'estado'), ('codigo', 'descripcion'), None),
+    'salas': TableSpec('id', ('id', 'codigo_interno', 'nombre', 'estado'), ('id',), ('codigo_interno', 'nombre'), ('nombre',)),
+    'personal_laboratorio': TableSpec('id', ('id', 'nombre', 'cargo'), ('id', 'cargo'), ('id', 'nombre'), ('nombre',)),
+    'proyectos_curriculares': TableSpec('id', ('id', 'nombre'), ('id',), ('nombre',), ('nombre',)),
+    'sedes': TableSpec('id', ('id', 'nombre'), ('id',), ('nombre',), ('nombre',)),
+}
+
+def fold_text(value):
+    ''' Lowercase text without accents, for searching and sorting ('Óscar' -> 'oscar').
+    None is the empty string '''
+    if value is None:
+        return ''
+    text = str(value)
+    if text.isascii():
+        return text.lower()
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c)).casefold()
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+class ColumnStore:
+    ''' The rows of one table as parallel columns. Rows have no fixed position: a
+    deleted row is replaced by the last one, and positions maps each key to its
+    current row '''
+    def __init__(self, spec):
+        self.spec = spec
+        self.columns = {name: array('q') if name in spec.ints else [] for name in spec.columns}
+        self.search_keys = []
+        self.sort_keys = []
+        self.positions = {}
+        self._order = None
+
+    def __len__(self):
+        return len(self.search_keys)
+
+    def _stored(self, name, value):
+        column = self.columns[name]
+        if isinstance(column, array):
+            if value is None:
+                return NULL
+            if type(value) is int and value != NULL:
+                return value
+            # Text in an integer column (e.g. typed by hand or left '' by a dialog): the
+            # column becomes a plain list, with None back in place of NULL
+            self.columns[name] = [None if v == NULL else v for v in column]
+        return _intern(value)
+
+    def _keys(self, row):
+        values = dict(zip(self.spec.columns, row))
+        # \x1f keeps a term from matching across two columns
+        search = '\x1f'.join(fold_text(values[name]) for name in self.spec.search)
+        sort = tuple(fold_text(values[name]) for name in self.spec.sort or ()) + (values[self.spec.key],)
+        return search, sort
+
+    def upsert(self, row):
+        key = row[self.spec.columns.index(self.spec.key)]
+        position = self.positions.get(key)
+        search, sort = self._keys(row)
+        if position is None:
+            self.positions[key] = len(self.search_keys)
+            for name, value in zip(self.spec.columns, row):
+                stored = self._stored(name, value)
+                self.columns[name].append(stored)
+            self.search_keys.append(search)
+            self.sort_keys.append(sort)
+        else:
+            for name, value in zip(self.spec.columns, row):
+                stored = self._stored(name, value)
+                self.columns[name][position] = stored
+            self.search_keys[position] = search
+            self.sort_keys[position] = sort
+        self._order = None
+
+    def remove(self, key):
+        position = self.positions.pop(key, None)
+        if position is None:
+            return
+        last = len(self.search_keys) - 1
+        if position != last:
+            for column in self.columns.values():
+                column[position] = column[last]
+            self.search_keys[position] = self.search_keys[last]
+            self.sort_keys[position] = self.sort_keys[last]
+            self.positions[self.columns[self.spec.key][position]] = position
+        for column in self.columns.values():
+            column.pop()
+        self.search_keys.pop()
+        self.sort_keys.pop()
+        self._order = None
+
+    def ordered(self):
+        ''' Row positions in listing order, sorted again only after a change '''
+        if self._order is None:
+            self._order = sorted(range(len(self.search_keys)), key=self.sort_keys.__getitem__)
+        return self._order
+
+    def matching(self, search_term, positions=None):
+        ''' Positions (in listing order, or in the order of positions) whose search key
+        contains the folded term '''
+        positions = self.ordered() if positions is None else positions
+        term = fold_text(search_term)
+        if not term:
+            return list(positions)
+        keys = self.search_keys
+        return [i for i in positions if term in keys[i]]
+
+    def values(self, name, positions):
+        ''' One column for the given rows, with None back in place of NULL '''
+        column = self.columns[name]
+        values = list(map(column.__getitem__, positions))
+        # The scan of the array is much cheaper than checking every value
+        if isinstance(column, array) and NULL in column:
+            return [None if v == NULL else v for v in values]
+        return values
+
+    def names(self):
+        ''' id -> nombre, for the small lookup tables '''
+        return dict(zip(self.columns['id'], self.columns['nombre']))
+
+class CatalogCache:
+    ''' The catalog tables of one database, loaded on first use and kept current
+    from the cambios log. Safe to use from the query worker threads '''
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager or DatabaseManager()
+        self._stores = {}
+        self._watermark = 0
+        self._lock = threading.RLock()
+
+    def _tables(self, *names):
+        ''' Brings the cache up to date and returns the stores of the given tables '''
+        conn = self.db_manager.get_connection()
+        try:
+            self._sync(conn)
+            for name in names:
+                if name not in self._stores:
+                    self._load(conn, name)
+        finally:
+            conn.close()
+        return [self._stores[name] for name in names]
+
+    def _load(self, conn, name):
+        spec = CATALOG_TABLES[name]
+        store = ColumnStore(spec)
+        for row in conn.execute(f'SELECT {", ".join(spec.columns)} FROM {name}'):
+            store.upsert(row)
+        self._stores[name] = store
+
+    def _sync(self, conn):
+        latest = conn.execute(CURRENT_CHANGE_SQL).fetchone()[0]
+        if latest == self._watermark:
+            return
+        if latest < self._watermark:
+            # The log was emptied or the file replaced: nothing to compare with
+            self._stores.clear()
+        elif self._stores:
+            loaded = list(self._stores)
+            changed = {}
+            rows = conn.execute(f'''
+                SELECT DISTINCT tabla, clave FROM cambios
+                WHERE id > ? AND id <= ? AND tabla IN ({", ".join("?" * len(loaded))})
+            ''', [self._watermark, latest] + loaded)
+            for table, key in rows:
+                changed.setdefault(table, []).append(key)
+            for table, keys in changed.items():
+                if len(keys) > len(self._stores[table]) * RELOAD_SHARE:
+                    self._load(conn, table)
+                else:
+                    self._refresh_keys(conn, table, keys)
+        self._watermark = latest
+
+    def _refresh_keys(self, conn, name, keys):
+        spec = CATALOG_TABLES[name]
+        store = self._stores[name]
+        found = set()
+        query = f'''
+            SELECT {", ".join(spec.columns)} FROM {name}
+            WHERE {spec.key} IN (SELECT value FROM json_each(?))
+        '''
+        key_index = spec.columns.index(spec.key)
+        for row in conn.execute(query, (json.dumps(keys),)):
+            store.upsert(row)
+            found.add(row[key_index])
+        for key in keys:
+            if key not in found:
+                store.remove(key)
+
+    def invalidate(self, name=None):
+        ''' Drops one table (or all of them); it is read again on its next use '''
+        with self._lock:
+            if name is None:
+                self._stores.clear()
+            else:
+                self._stores.pop(name, None)
+
+    @staticmethod
+    def _project_ids(projects, project_filter_name):
+        # Project names may repeat, every project with that name counts
+        return {id for id, nombre in projects.names().items() if nombre == project_filter_name}
+
+    def get_all_students(self, search_term='', project_filter_name=''):
+        with self._lock:
+            students, projects = self._tables('estudiantes', 'proyectos_curriculares')
+            positions = students.matching(search_term)
+            if project_filter_name:
+                wanted = self._project_ids(projects, project_filter_name)
+                project = students.columns['proyecto_curricular_id']
+                positions = [i for i in positions if project[i] in wanted]
+            names = projects.names()
+            return list(zip(students.values('codigo', positions), students.values('nombre', positions),
+                            students.values('cedula', positions),
+                            map(names.get, students.values('proyecto_curricular_id', positions))))
+
+    def get_all_profesores(self, search_term='', project_filter_name=''):
+        with self._lock:
+            professors, projects = self._tables('profesores', 'proyectos_curriculares')
+            positions = professors.matching(search_term)
+            if project_filter_name:
+                wanted = self._project_ids(projects, project_filter_name)
+                project = professors.columns['proyecto_curricular_id']
+                positions = [i for i in positions if project[i] in wanted]
+            names = projects.names()
+            return list(zip(professors.values('cedula', positions), professors.values('nombre', positions),
+                            map(names.get, professors.values('proyecto_curricular_id', positions))))
+
+    def get_all_equipment(self, search_term='', status_filter='', brand_serial_filter=''):
+        with self._lock:
+            inventory, sedes = self._tables('inventario', 'sedes')
+            positions = inventory.matching(search_term)
+            if status_filter:
+                estado = inventory.columns['estado']
+                positions = [i for i in positions if estado[i] == status_filter]
+            if brand_serial_filter:
+                brand = fold_text(brand_serial_filter)
+                marca = inventory.columns['marca_serie']
+                positions = [i for i in positions if brand in fold_text(marca[i])]
+            names = sedes.names()
+            responsables = [
+                # Like the || of SQL, a missing name or document leaves it empty
+                None if nombre is None or documento is None else f'{nombre} ({documento})'
+                for nombre, documento in zip(inventory.values('nombre_funcionario', positions),
+                                             inventory.values('documento_funcionario', positions))
+            ]
+            return list(zip(inventory.values('codigo', positions), inventory.values('marca_serie', positions),
+                            responsables, [names.get(id, 'N/A') for id in inventory.values('sede_id', positions)],
+                            inventory.values('descripcion', positions), inventory.values('contenido', positions),
+                            inventory.values('estado', positions)))
+
+    def get_all_equipos(self, search_term='', sala_filter_id=None, status_filter=None):
+        with self._lock:
+            equipos, rooms = self._tables('equipos', 'salas')
+            positions = equipos.matching(search_term, range(len(equipos)))
+            if sala_filter_id:
+                sala = equipos.columns['sala_id']
+                positions = [i for i in positions if sala[i] == sala_filter_id]
+            if status_filter is not None and status_filter != -1: # -1 for 'Todos'
+                estado = equipos.columns['estado']
+                positions = [i for i in positions if estado[i] == status_filter]
+            names = rooms.names()
+            salas = [names.get(id) for id in equipos.values('sala_id', positions)]
+            numbers = equipos.values('numero_equipo', positions)
+            # By room name and computer number, the rooms without a name first like in SQL
+            order = sorted(range(len(positions)), key=lambda n: (salas[n] is not None, fold_text(salas[n]),
+                                                                  numbers[n] is not None, numbers[n] or 0))
+            rows = list(zip(equipos.values('codigo', positions), salas, numbers, equipos.values('descripcion', positions),
+                            equipos.values('estado', positions), equipos.values('observaciones', positions)))
+            return [rows[n] for n in order]
+
+    def get_all_rooms_with_status(self, search_term=''):
+        with self._lock:
+            rooms, = self._tables('salas')
+            positions = rooms.matching(search_term)
+            estados = ['Ocupada' if estado == 'OCUPADA' else 'Disponible' for estado in rooms.values('estado', positions)]
+            return list(zip(rooms.values('id', positions), rooms.values('codigo_interno', positions),
+                            rooms.values('nombre', positions), estados))
+
+    def get_all_personal(self, search_term='', cargo_filter_name=''):
+        with self._lock:
+            staff, = self._tables('personal_laboratorio')
+            positions = staff.matching(search_term)
+            if cargo_filter_name and cargo_filter_name != 'Todos':
+                cargo = staff.columns['cargo']
+                # Like the model, every cargo other than 0 is a monitor
+                laboratorista = cargo_filter_name == 'Laboratorista'
+                positions = [i for i in positions if (cargo[i] == 0) == laboratorista]
+            return list(zip(staff.values('id', positions), staff.values('nombre', positions),
+                            staff.values('cargo', positions)))
+
+    def get_all_proyectos(self, search_term=''):
+        with self._lock:
+            projects, = self._tables('proyectos_curriculares')
+            positions = projects.matching(search_term)
+            return list(zip(projects.values('id', positions), projects.values('nombre', positions)))
+
+    def get_all_sedes(self, search_term=''):
+        with self._lock:
+            sedes, = self._tables('sedes')
+            positions = sedes.matching(search_term)
+            return list(zip(sedes.values('id', positions), sedes.values('nombre', positions)))
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+def get_catalog(db_manager=None):
+    ''' Returns the cache of the database of db_manager, shared by every view '''
+    db_manager = db_manager or DatabaseManager()
+    path = os.path.abspath(db_manager.db_path)
+    with _catalogs_lock:
+        catalog = _catalogs.get(path)
+        if catalog is None:
+            catalog = _catalogs[path] = CatalogCache(db_manager)
+        return catalog
+
+def get_catalog_watermark(db_path):
+    ''' Lowest change id that the loaded catalogs of db_path have read up to, or
+    None if none is loaded. The changes above it are still needed '''
+    path = os.path.abspath(db_path)
+    with _catalogs_lock:
+        catalog = _catalogs.get(path)
+    if catalog is None:
+        return None
+    with catalog._lock:
+        return catalog._watermark if catalog._stores else None
@@ -1,12 +1,335 @@
 import sqlite3
 import os
+import pathlib
 import sys
 import shutil
+import atexit
+import threading
+from .migrations import apply_migrations, get_schema_version
+from . import instrumentation
+
+# Max idle connections kept per thread. Nested model calls (e.g. a loan insert that
+# checks inventory availability) need more than one connection at a time
+DEFAULT_POOL_SIZE = 4
+
+# Pragmas applied to every new connection. 'default' lets the dashboard read while
+# the counter registers loans (WAL) and keeps hot pages in memory; 'safe' fsyncs
+# every commit; 'legacy' is the rollback journal the app used originally
+PRAGMA_PROFILES = {
+    'default': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16000, # Negative values are KiB, about 16 MB
+        'mmap_size': 64 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+        'foreign_keys': 'ON',
+    },
+    'safe': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -16000,
+        'mmap_size': 0,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+        'foreign_keys': 'ON',
+    },
+    'legacy': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'cache_size': -2000,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'busy_timeout': 5000,
+        'foreign_keys': 'ON',
+    },
+}
+
+# The profile can be switched without code changes, e.g. LAB_DB_PROFILE=safe
+DEFAULT_PROFILE = os.environ.get('LAB_DB_PROFILE', 'default')
+
+# Pragmas that change the database file, a read-only connection can't set them
+WRITE_PRAGMAS = ('journal_mode', 'synchronous')
+
+def apply_pragmas(conn, profile=DEFAULT_PROFILE, read_only=False):
+    ''' Applies a named pragma profile to a connection '''
+    if profile not in PRAGMA_PROFILES:
+        raise ValueError(f'Unknown pragma profile: {profile}')
+    for pragma, value in PRAGMA_PROFILES[profile].items():
+        if read_only and pragma in WRITE_PRAGMAS:
+            continue
+        conn.execute(f'PRAGMA {pragma} = {value}')
+
+class PooledConnection:
+    ''' Thin wrapper around a pooled sqlite3 connection. It behaves like the
+    real connection, but close() hands it back to the pool instead of closing it,
+    so the models can keep their usual get_connection() / close() pattern '''
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self.__dict__.get('_conn') is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return self.__getattr__('cursor')(*args, **kwargs)
+
+    def execute(self, *args, **kwargs):
+        return self.__getattr__('execute')(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return self.__getattr__('executemany')(*args, **kwargs)
+
+    def executescript(self, *args, **kwargs):
+        return self.__getattr__('executescript')(*args, **kwargs)
+
+    def commit(self):
+        return self.__getattr__('commit')()
+
+    def rollback(self):
+        return self.__getattr__('rollback')()
+
+    def close(self):
+        # Returning twice is harmless, the second call does nothing
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._conn is not None:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        self.close()
+        return False
+
+    def __del__(self):
+        # Methods that return early without closing still give the connection back
+        try:
+            self.close()
+        except Exception:
+            pass
+
+class _IdleConnections(list):
+    ''' Idle connections of one thread. When the thread finishes, its
+    thread-local storage is dropped and these connections are closed '''
+    def __init__(self, pool):
+        super().__init__()
+        self.pool = pool
+
+    def __del__(self):
+        for conn in self:
+            self.pool._discard(conn)
+
+class ConnectionPool:
+    ''' Per-thread pool of long-lived connections to a single database file.
+    Each thread reuses its own idle connections (sqlite3 connections must not be
+    shared between threads while in use), up to max_size idle ones per thread '''
+    def __init__(self, db_path, max_size=DEFAULT_POOL_SIZE, profile=DEFAULT_PROFILE):
+        if profile not in PRAGMA_PROFILES:
+            raise ValueError(f'Unknown pragma profile: {profile}')
+        self.db_path = db_path
+        self.max_size = max_size
+        self.profile = profile
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open = {} # id -> connection, for a clean shutdown
+        self._connect_hooks = []
+
+    def _idle(self):
+        idle = getattr(self._local, 'idle', None)
+        if idle is None:
+            idle = self._local.idle = _IdleConnections(self)
+        return idle
+
+    def _connect(self):
+        # Connections never cross threads while checked out, but the pool may close
+        # them from the main thread at shutdown
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        apply_pragmas(conn, self.profile)
+        for hook in self._connect_hooks:
+            hook(conn)
+        with self._lock:
+            self._open[id(conn)] = conn
+        return conn
+
+    def add_connect_hook(self, hook):
+        ''' Registers a callable that receives every connection opened from now on,
+        after its pragmas were applied (e.g. to install a trace callback) '''
+        self._connect_hooks.append(hook)
+
+    def _discard(self, conn):
+        with self._lock:
+            self._open.pop(id(conn), None)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        idle = self._idle()
+        while idle:
+            conn = idle.pop()
+            if self._is_healthy(conn):
+                return PooledConnection(self, conn)
+            self._discard(conn)
+        return PooledConnection(self, self._connect())
+
+    def release(self, conn):
+        try:
+            # Never leak an unfinished transaction to the next user of the connection
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+
+        idle = self._idle()
+        if len(idle) < self.max_size:
+            idle.append(conn)
+        else:
+            self._discard(conn)
+
+    def close_all(self):
+        ''' Closes every connection opened by this pool. Threads holding idle
+        references will notice on their next acquire and reconnect '''
+        with self._lock:
+            connections = list(self._open.values())
+            self._open.clear()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    @property
+    def open_connections(self):
+        with self._lock:
+            return len(self._open)
+
+# Pages copied per step by ReadSnapshot.backup, between two progress reports
+BACKUP_PAGES = 1024
+
+class _SnapshotConnection(PooledConnection):
+    ''' The connection of a ReadSnapshot as the models see it: close(), commit()
+    and rollback() leave the snapshot's transaction open for the next model call '''
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __del__(self):
+        pass
+
+class ReadSnapshot:
+    ''' Read-only view of the database frozen at the moment it is opened. It can be
+    passed to the models in place of a DatabaseManager: every get_connection()
+    returns the same read-only connection, inside one read transaction, so long
+    reports (e.g. the Excel export) see consistent data while the counter keeps
+    registering loans. With WAL the writers are never blocked by it.
+
+        with ReadSnapshot(db_manager.db_path) as snapshot:
+            StudentModel(snapshot).get_all_students()
+    '''
+    def __init__(self, db_path, profile=DEFAULT_PROFILE):
+        self.db_path = db_path
+        self.profile = profile
+        self._conn = None
+
+    def open(self):
+        uri = pathlib.Path(self.db_path).resolve().as_uri() + '?mode=ro'
+        # Opened by the thread that runs the report, but closed from wherever it ends
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        apply_pragmas(conn, self.profile, read_only=True)
+        # The snapshot starts with the first read of the transaction
+        conn.execute('BEGIN')
+        conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        self._conn = conn
+        return self
+
+    def get_connection(self):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError('The snapshot is not open.')
+        return _SnapshotConnection(None, self._conn)
+
+    def backup(self, target_path, pages=BACKUP_PAGES, progress=None):
+        ''' Copies the snapshot to a new database file with the backup API, pages at
+        a time. Since the snapshot keeps its read transaction, the copy is consistent
+        even if other connections write meanwhile. The copy uses a rollback journal
+        so that it is a single self-contained file '''
+        if self._conn is None:
+            raise sqlite3.ProgrammingError('The snapshot is not open.')
+        target = sqlite3.connect(target_path)
+        try:
+            self._conn.backup(target, pages=pages, progress=progress)
+            target.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            target.close()
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.rollback()
+            finally:
+                conn.close()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path, max_size=DEFAULT_POOL_SIZE, profile=DEFAULT_PROFILE):
+    ''' Returns the shared pool for a database file, creating it on first use.
+    The size and pragma profile of the first caller are the ones kept '''
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_path, max_size, profile)
+        return pool
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
+
+atexit.register(close_all_pools)
+
+# Database files already migrated by this process
+_migrated_paths = set()
+_migration_lock = threading.Lock()
 
 class DatabaseManager:
-    def __init__(self, db_name='uso_de_espacios.db'):
+    def __init__(self, db_name='uso_de_espacios.db', pool_size=DEFAULT_POOL_SIZE, profile=DEFAULT_PROFILE):
         self.db_name = db_name
         self.db_path = self._get_database_path()
+        # Every manager pointing to the same file shares one pool
+        self.pool = get_pool(self.db_path, pool_size, profile)
         self.init_database()
     
     def _get_database_path(self):
@@ -44,179 +367,39 @@ class DatabaseManager:
             return self.db_name # Keep it in the current directory for development
     
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        ''' Checks out a connection from the pool. Calling close() on it returns it '''
+        if instrumentation.settings.enabled:
+            return instrumentation.acquire(self.pool)
+        return self.pool.acquire()
+
+    def close(self):
+        ''' Closes all pooled connections to this database '''
+        self.pool.close_all()
     
     def init_database(self):
-        ''' Database schema for initialization '''
+        ''' Brings the schema up to date. The migrations run at most once per database
+        file and process; later managers for the same file skip schema work entirely.
+        Returns the migrations applied by this call '''
+        key = os.path.abspath(self.db_path)
+        with _migration_lock:
+            if key in _migrated_paths:
+                self.applied_migrations = []
+                return self.applied_migrations
+
+            conn = self.get_connection()
+            try:
+                self.applied_migrations = apply_migrations(conn)
+            finally:
+                conn.close()
+            _migrated_paths.add(key)
+
+        for migration in self.applied_migrations:
+            print(f'Applied migration {migration.version:03d}: {migration.name}')
+        return self.applied_migrations
+
+    def get_schema_version(self):
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Initialize the database if not created
-        cursor.executescript('''
-            -- Enable foreign key constraints
-            PRAGMA foreign_keys = ON;
-            
-            CREATE TABLE IF NOT EXISTS proyectos_curriculares (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL
-            );
-            
-            CREATE TABLE IF NOT EXISTS salas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                codigo_interno TEXT,
-                nombre TEXT NOT NULL,
-                estado TEXT NOT NULL DEFAULT 'DISPONIBLE' CHECK (estado IN ('DISPONIBLE', 'OCUPADA'))
-            );
-            
-            CREATE TABLE IF NOT EXISTS sedes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL
-            );
-            
-            CREATE TABLE IF NOT EXISTS personal_laboratorio (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL,
-                cargo INTEGER NOT NULL CHECK (cargo IN (0, 1))
-            );
-            
-            CREATE TABLE IF NOT EXISTS estudiantes (
-                codigo INTEGER PRIMARY KEY,
-                nombre TEXT,
-                cedula INTEGER,
-                proyecto_curricular_id INTEGER REFERENCES proyectos_curriculares(id)
-            );
-            
-            CREATE TABLE IF NOT EXISTS profesores (
-                cedula INTEGER PRIMARY KEY,
-                nombre TEXT,
-                proyecto_curricular_id INTEGER REFERENCES proyectos_curriculares(id)
-            );
-            
-            CREATE TABLE IF NOT EXISTS inventario (
-                codigo TEXT PRIMARY KEY,
-                marca_serie TEXT,
-                documento_funcionario INTEGER,
-                nombre_funcionario TEXT,
-                descripcion TEXT,
-                contenido TEXT,
-                estado TEXT NOT NULL CHECK (estado IN ('DISPONIBLE', 'DAÑADO', 'EN USO')),
-                sede_id INTEGER REFERENCES sedes(id)
-            );
-            
-            CREATE TABLE IF NOT EXISTS equipos (
-                codigo TEXT PRIMARY KEY,
-                sala_id INTEGER REFERENCES salas(id),
-                numero_equipo INTEGER,
-                descripcion TEXT,
-                estado INTEGER NOT NULL CHECK (estado IN (0, 1)),
-                observaciones TEXT
-            );
-            
-            CREATE TABLE IF NOT EXISTS prestamos_salas_profesores (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                fecha_entrada TIMESTAMP NOT NULL,
-                laboratorista INTEGER REFERENCES personal_laboratorio(id),
-                monitor INTEGER REFERENCES personal_laboratorio(id),
-                sala_id INTEGER REFERENCES salas(id) NOT NULL,
-                profesor_id INTEGER REFERENCES profesores(cedula) NOT NULL,
-                hora_salida TIME,
-                firma_profesor INTEGER,
-                observaciones TEXT
-            );
-            
-            CREATE TABLE IF NOT EXISTS prestamos_salas_estudiantes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                fecha_entrada TIMESTAMP NOT NULL,
-                laboratorista INTEGER REFERENCES personal_laboratorio(id),
-                monitor INTEGER REFERENCES personal_laboratorio(id),
-                sala_id INTEGER REFERENCES salas(id) NOT NULL,
-                estudiante_id INTEGER REFERENCES estudiantes(codigo) NOT NULL,
-                hora_salida TIME,
-                equipo_codigo TEXT REFERENCES equipos(codigo),
-                firma_estudiante INTEGER,
-                novedad TEXT
-            );
-            
-            CREATE TABLE IF NOT EXISTS prestamos_equipos_profesores (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                fecha_entrega TIMESTAMP NOT NULL,
-                fecha_devolucion TIMESTAMP,
-                laboratorista_entrega INTEGER REFERENCES personal_laboratorio(id),
-                monitor_entrega INTEGER REFERENCES personal_laboratorio(id),
-                equipo_codigo TEXT REFERENCES inventario(codigo) NOT NULL,
-                profesor_id INTEGER REFERENCES profesores(cedula) NOT NULL,
-                sala_id INTEGER REFERENCES salas(id),
-                titulo_practica TEXT,
-                estado INTEGER NOT NULL CHECK (estado IN (0, 1)),
-                laboratorista_devolucion INTEGER REFERENCES personal_laboratorio(id),
-                monitor_devolucion INTEGER REFERENCES personal_laboratorio(id),
-                documento_devolvente INTEGER,
-                observaciones TEXT
-            );
-            
-            CREATE TABLE IF NOT EXISTS prestamos_equipos_estudiantes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                fecha_entrega TIMESTAMP NOT NULL,
-                fecha_devolucion TIMESTAMP,
-                equipo_codigo TEXT REFERENCES inventario(codigo) NOT NULL,
-                laboratorista_entrega INTEGER REFERENCES personal_laboratorio(id),
-                monitor_entrega INTEGER REFERENCES personal_laboratorio(id),
-                estudiante_id INTEGER REFERENCES estudiantes(codigo) NOT NULL,
-                numero_estudiantes INTEGER,
-                sala_id INTEGER REFERENCES salas(id),
-                titulo_practica TEXT,
-                estado INTEGER NOT NULL CHECK (estado IN (0, 1)),
-                laboratorista_devolucion INTEGER REFERENCES personal_laboratorio(id),
-                monitor_devolucion INTEGER REFERENCES personal_laboratorio(id),
-                documento_devolvente INTEGER,
-                observaciones TEXT
-            );
-        ''')
-        
-        # Create Triggers
-        cursor.executescript('''
-            -- When loaning something for a professor, it is set to in use state
-            CREATE TRIGGER IF NOT EXISTS trg_prestamo_equipo_profesor
-                AFTER INSERT ON prestamos_equipos_profesores
-                FOR EACH ROW
-            BEGIN
-                UPDATE inventario 
-                SET estado = 'EN USO'
-                WHERE codigo = NEW.equipo_codigo;
-            END;
-            
-            -- When returning something for a professor, its state is set to available
-            CREATE TRIGGER IF NOT EXISTS trg_devolucion_equipo_profesor
-                AFTER UPDATE ON prestamos_equipos_profesores
-                FOR EACH ROW
-                WHEN NEW.fecha_devolucion IS NOT NULL AND OLD.fecha_devolucion IS NULL
-            BEGIN
-                UPDATE inventario 
-                SET estado = 'DISPONIBLE'
-                WHERE codigo = NEW.equipo_codigo;
-            END;
-            
-            -- When loaning something for a student, it is set to in use state
-            CREATE TRIGGER IF NOT EXISTS trg_prestamo_equipo_estudiante
-                AFTER INSERT ON prestamos_equipos_estudiantes
-                FOR EACH ROW
-            BEGIN
-                UPDATE inventario 
-                SET estado = 'EN USO'
-                WHERE codigo = NEW.equipo_codigo;
-            END;
-            
-            -- When returning something for a student, its state is set to available
-            CREATE TRIGGER IF NOT EXISTS trg_devolucion_equipo_estudiante
-                AFTER UPDATE ON prestamos_equipos_estudiantes
-                FOR EACH ROW
-                WHEN NEW.fecha_devolucion IS NOT NULL AND OLD.fecha_devolucion IS NULL
-            BEGIN
-                UPDATE inventario 
-                SET estado = 'DISPONIBLE'
-                WHERE codigo = NEW.equipo_codigo;
-            END;
-        ''')
-        
-        conn.commit()
-        conn.close()
\ No newline at end of file
+        try:
+            return get_schema_version(conn)
+        finally:
+            conn.close()
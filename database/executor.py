@@ -0,0 +1,63 @@
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Worker threads that run model calls. Each worker keeps its own pooled
+# connections (the pool is per thread), so two is enough for a search and a
+# write to run side by side without starving SQLite's single writer
+DEFAULT_WORKERS = 2
+
+class QueryExecutor:
+    ''' Runs model calls on background threads and returns futures, so the Tk
+    main loop never waits on SQLite. Calls submitted with a key supersede the
+    previous call with the same key: if it has not started yet it is cancelled
+    and never touches the database '''
+    def __init__(self, max_workers=DEFAULT_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db-query')
+        self._lock = threading.Lock()
+        self._latest = {} # key -> most recent future
+
+    def submit(self, fn, *args, key=None, **kwargs):
+        future = self._pool.submit(fn, *args, **kwargs)
+        if key is not None:
+            with self._lock:
+                previous = self._latest.get(key)
+                self._latest[key] = future
+            if previous is not None:
+                previous.cancel() # Only succeeds while it is still queued
+            future.add_done_callback(lambda f: self._forget(key, f))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._latest.get(key) is future:
+                del self._latest[key]
+
+    def cancel(self, key):
+        with self._lock:
+            future = self._latest.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    def shutdown(self, wait=False):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    ''' Returns the executor shared by every view, creating it on first use '''
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = QueryExecutor()
+        return _executor
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown()
+
+atexit.register(shutdown_executor)
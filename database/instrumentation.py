@@ -0,0 +1,314 @@
+''' Optional timing of the model methods and a slow-query log.
+
+Turned off by default. When it is off the models run exactly as before: the
+method wrappers only check a flag and DatabaseManager hands out the plain pooled
+connections. Settings come from the environment or from configure():
+
+    LAB_DB_INSTRUMENT=1        record timings for every model method
+    LAB_DB_SLOW_MS=100         statements slower than this go to the slow-query log
+    LAB_DB_SLOW_LOG=slow_queries.log
+    LAB_DB_EXPLAIN=1           add the EXPLAIN QUERY PLAN of slow statements
+
+For each model method it keeps the number of calls, total and max wall time,
+connection-acquire time, statements and rows. For each statement it measures the
+execute and fetch time together, the number of bound parameters and the rows
+returned.
+'''
+import os
+import atexit
+import logging
+import logging.handlers
+import threading
+import functools
+import time
+import sqlite3
+
+SLOW_LOG_MAX_BYTES = 1024 * 1024
+SLOW_LOG_BACKUPS = 3
+
+def _env_flag(name):
+    return os.environ.get(name, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+class _Settings:
+    def __init__(self):
+        self.enabled = _env_flag('LAB_DB_INSTRUMENT')
+        self.slow_ms = float(os.environ.get('LAB_DB_SLOW_MS', 100))
+        self.slow_log_path = os.environ.get('LAB_DB_SLOW_LOG', 'slow_queries.log')
+        self.explain = _env_flag('LAB_DB_EXPLAIN')
+
+settings = _Settings()
+
+_stats = {} # method name -> MethodStats
+_stats_lock = threading.Lock()
+_local = threading.local()
+_slow_logger = None
+
+class MethodStats:
+    __slots__ = ('calls', 'total_ms', 'max_ms', 'acquire_ms', 'statements', 'rows')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.acquire_ms = 0.0
+        self.statements = 0
+        self.rows = 0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+def configure(enabled=None, slow_ms=None, slow_log_path=None, explain=None):
+    ''' Changes the settings at runtime, e.g. from a config file. Arguments left
+    as None keep their current value '''
+    if enabled is not None:
+        settings.enabled = enabled
+    if slow_ms is not None:
+        settings.slow_ms = slow_ms
+    if slow_log_path is not None and slow_log_path != settings.slow_log_path:
+        settings.slow_log_path = slow_log_path
+        _close_slow_logger()
+    if explain is not None:
+        settings.explain = explain
+
+def is_enabled():
+    return settings.enabled
+
+def _get_slow_logger():
+    global _slow_logger
+    if _slow_logger is None:
+        logger = logging.getLogger('database.slow_queries')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        handler = logging.handlers.RotatingFileHandler(settings.slow_log_path, maxBytes=SLOW_LOG_MAX_BYTES,
+                                                       backupCount=SLOW_LOG_BACKUPS, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        logger.addHandler(handler)
+        _slow_logger = logger
+    return _slow_logger
+
+def _close_slow_logger():
+    global _slow_logger
+    if _slow_logger is not None:
+        for handler in list(_slow_logger.handlers):
+            _slow_logger.removeHandler(handler)
+            handler.close()
+        _slow_logger = None
+
+def _current_method():
+    stack = getattr(_local, 'methods', None)
+    return stack[-1] if stack else '<no method>'
+
+def _method_stats(name):
+    stats = _stats.get(name)
+    if stats is None:
+        with _stats_lock:
+            stats = _stats.setdefault(name, MethodStats())
+    return stats
+
+def instrumented(cls):
+    ''' Class decorator for the models: every public method is timed under
+    "Class.method" while instrumentation is on '''
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith('_') or not callable(value):
+            continue
+        setattr(cls, attr, _timed(f'{cls.__name__}.{attr}', value))
+    return cls
+
+def _timed(name, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if not settings.enabled:
+            return method(*args, **kwargs)
+        stack = getattr(_local, 'methods', None)
+        if stack is None:
+            stack = _local.methods = []
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            stack.pop()
+            stats = _method_stats(name)
+            with _stats_lock:
+                stats.calls += 1
+                stats.total_ms += elapsed
+                stats.max_ms = max(stats.max_ms, elapsed)
+    return wrapper
+
+class _Statement:
+    __slots__ = ('method', 'sql', 'params', 'param_count', 'rows', 'elapsed_ms', 'many')
+
+    def __init__(self, method, sql, params, many=False):
+        self.method = method
+        self.sql = sql
+        self.params = params
+        self.many = many
+        if many:
+            self.param_count = None
+        else:
+            self.param_count = len(params) if params is not None else 0
+        self.rows = 0
+        self.elapsed_ms = 0.0
+
+class InstrumentedCursor:
+    ''' Cursor wrapper that adds the execute and fetch time of each statement '''
+    def __init__(self, conn, cursor):
+        self._conn = conn
+        self._cursor = cursor
+        self._statement = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def _run(self, method, sql, params, many=False):
+        statement = _Statement(_current_method(), sql, params, many)
+        start = time.perf_counter()
+        try:
+            if params is None:
+                method(sql)
+            else:
+                method(sql, params)
+        finally:
+            statement.elapsed_ms = (time.perf_counter() - start) * 1000
+            if many:
+                statement.rows = max(self._cursor.rowcount, 0)
+            self._statement = statement
+            self._conn._statements.append(statement)
+        return self
+
+    def execute(self, sql, params=None):
+        return self._run(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._run(self._cursor.executemany, sql, seq_of_params, many=True)
+
+    def _fetch(self, fetch, *args):
+        start = time.perf_counter()
+        result = fetch(*args)
+        if self._statement is not None:
+            self._statement.elapsed_ms += (time.perf_counter() - start) * 1000
+            if isinstance(result, list):
+                self._statement.rows += len(result)
+            elif result is not None:
+                self._statement.rows += 1
+        return result
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._fetch(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+class InstrumentedConnection:
+    ''' Wraps a pooled connection. The statements it ran are reported when it is
+    closed, which is when the models are done fetching from it '''
+    def __init__(self, pooled, acquire_ms):
+        self._pooled = pooled
+        self._statements = []
+        self._method = _current_method()
+        stats = _method_stats(self._method)
+        with _stats_lock:
+            stats.acquire_ms += acquire_ms
+
+    def __getattr__(self, name):
+        return getattr(self._pooled, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self, self._pooled.cursor(*args, **kwargs))
+
+    def execute(self, sql, params=None):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def _report(self):
+        statements, self._statements = self._statements, []
+        for statement in statements:
+            stats = _method_stats(statement.method)
+            with _stats_lock:
+                stats.statements += 1
+                stats.rows += statement.rows
+            if statement.elapsed_ms >= settings.slow_ms:
+                self._log_slow(statement)
+
+    def _log_slow(self, statement):
+        sql = ' '.join(statement.sql.split())
+        params = 'executemany' if statement.many else f'{statement.param_count} params'
+        message = (f'{statement.elapsed_ms:.1f} ms  {statement.method}  '
+                   f'{params}, {statement.rows} rows  {sql}')
+        if settings.explain and not statement.many:
+            plan = self._explain(statement)
+            if plan:
+                message += '\n' + plan
+        try:
+            _get_slow_logger().info(message)
+        except OSError as e:
+            print(f'Error writing slow query log: {e}')
+
+    def _explain(self, statement):
+        try:
+            args = (statement.params,) if statement.params is not None else ()
+            plan = self._pooled.execute(f'EXPLAIN QUERY PLAN {statement.sql}', *args).fetchall()
+            return '\n'.join(f'    {row[3]}' for row in plan)
+        except sqlite3.Error as e:
+            return f'    (no plan: {e})'
+
+    def close(self):
+        if self._statements:
+            self._report()
+        self._pooled.close()
+
+    def __enter__(self):
+        self._pooled.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._statements:
+            self._report()
+        return self._pooled.__exit__(exc_type, exc, tb)
+
+def acquire(pool):
+    ''' Checks out a connection from the pool, timing the checkout '''
+    start = time.perf_counter()
+    pooled = pool.acquire()
+    return InstrumentedConnection(pooled, (time.perf_counter() - start) * 1000)
+
+def get_stats():
+    ''' Per-method statistics recorded so far '''
+    with _stats_lock:
+        return {name: stats.as_dict() for name, stats in _stats.items()}
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+def format_stats():
+    ''' Table of the recorded methods, slowest total first '''
+    rows = sorted(get_stats().items(), key=lambda item: item[1]['total_ms'], reverse=True)
+    lines = [f"{'method':<50} {'calls':>6} {'total ms':>10} {'max ms':>9} {'acquire ms':>11} {'stmts':>6} {'rows':>8}"]
+    for name, s in rows:
+        lines.append(f"{name:<50} {s['calls']:>6} {s['total_ms']:>10.1f} {s['max_ms']:>9.1f} "
+                     f"{s['acquire_ms']:>11.2f} {s['statements']:>6} {s['rows']:>8}")
+    return '\n'.join(lines)
+
+def _write_summary():
+    if settings.enabled and _stats:
+        try:
+            _get_slow_logger().info('Per-method summary\n' + format_stats())
+        except OSError:
+            pass
+    _close_slow_logger()
+
+atexit.register(_write_summary)
@@ -0,0 +1,677 @@
+''' Ordered schema migrations. The version of a database file is kept in
+PRAGMA user_version; each migration runs once, inside its own transaction,
+together with the bump of that version '''
+import sqlite3
+from collections import namedtuple
+
+Migration = namedtuple('Migration', ['version', 'name', 'script'])
+
+# Tables whose changes are recorded in the cambios log, with their primary key
+TRACKED_TABLES = {
+    'proyectos_curriculares': 'id',
+    'sedes': 'id',
+    'personal_laboratorio': 'id',
+    'estudiantes': 'codigo',
+    'profesores': 'cedula',
+    'salas': 'id',
+    'inventario': 'codigo',
+    'equipos': 'codigo',
+    'prestamos_salas_estudiantes': 'id',
+    'prestamos_salas_profesores': 'id',
+    'prestamos_equipos_estudiantes': 'id',
+    'prestamos_equipos_profesores': 'id',
+}
+
+# Accented letters of the Spanish names and what they fold to. SQLite's lower()
+# only knows ASCII, so both cases are listed
+FOLDED_CHARACTERS = {
+    'á': 'a', 'é': 'e', 'í': 'i', 'ó': 'o', 'ú': 'u', 'ü': 'u', 'ñ': 'n',
+    'Á': 'a', 'É': 'e', 'Í': 'i', 'Ó': 'o', 'Ú': 'u', 'Ü': 'u', 'Ñ': 'n',
+}
+
+_FOLD_TABLE = str.maketrans({**{chr(c): chr(c + 32) for c in range(ord('A'), ord('Z') + 1)}, **FOLDED_CHARACTERS})
+
+def folded_sql(column):
+    ''' SQL expression of a column lowercased and without accents. Plain built-in
+    functions, so the generated columns that use it can be written by any client '''
+    expression = f'lower({column})'
+    for accented, plain in FOLDED_CHARACTERS.items():
+        expression = f"replace({expression}, '{accented}', '{plain}')"
+    return expression
+
+def fold_search_term(term):
+    ''' A search term folded the way folded_sql folds the columns ('Núñez' -> 'nunez') '''
+    return term.translate(_FOLD_TABLE) if term else term
+
+# Id of the last change logged. Once the log was pruned empty it falls back to the
+# AUTOINCREMENT counter, so the watermarks never go back
+CURRENT_CHANGE_SQL = '''
+    SELECT COALESCE((SELECT MAX(id) FROM cambios),
+                    (SELECT seq FROM sqlite_sequence WHERE name = 'cambios'), 0)
+'''
+
+def _change_log_triggers(tables):
+    # One trigger per table and operation. An update that changes the key is logged
+    # as the deletion of the old key plus the update of the new one
+    triggers = []
+    for table, key in tables.items():
+        triggers.append(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_cambios_{table}_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO cambios (tabla, clave, operacion) VALUES ('{table}', NEW.{key}, 'I');
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_cambios_{table}_update AFTER UPDATE ON {table}
+        BEGIN
+            INSERT INTO cambios (tabla, clave, operacion)
+            SELECT '{table}', OLD.{key}, 'D' WHERE OLD.{key} IS NOT NEW.{key};
+            INSERT INTO cambios (tabla, clave, operacion) VALUES ('{table}', NEW.{key}, 'U');
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_cambios_{table}_delete AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO cambios (tabla, clave, operacion) VALUES ('{table}', OLD.{key}, 'D');
+        END;''')
+    return '\n'.join(triggers)
+
+MIGRATIONS = [
+    # Tables and inventory status triggers of the original schema. Existing databases
+    # (user_version 0) already have them, so every statement is IF NOT EXISTS
+    Migration(1, 'initial_schema', '''
+        CREATE TABLE IF NOT EXISTS proyectos_curriculares (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL
+        );
+        
+        CREATE TABLE IF NOT EXISTS salas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            codigo_interno TEXT,
+            nombre TEXT NOT NULL,
+            estado TEXT NOT NULL DEFAULT 'DISPONIBLE' CHECK (estado IN ('DISPONIBLE', 'OCUPADA'))
+        );
+        
+        CREATE TABLE IF NOT EXISTS sedes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL
+        );
+        
+        CREATE TABLE IF NOT EXISTS personal_laboratorio (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            cargo INTEGER NOT NULL CHECK (cargo IN (0, 1))
+        );
+        
+        CREATE TABLE IF NOT EXISTS estudiantes (
+            codigo INTEGER PRIMARY KEY,
+            nombre TEXT,
+            cedula INTEGER,
+            proyecto_curricular_id INTEGER REFERENCES proyectos_curriculares(id)
+        );
+        
+        CREATE TABLE IF NOT EXISTS profesores (
+            cedula INTEGER PRIMARY KEY,
+            nombre TEXT,
+            proyecto_curricular_id INTEGER REFERENCES proyectos_curriculares(id)
+        );
+        
+        CREATE TABLE IF NOT EXISTS inventario (
+            codigo TEXT PRIMARY KEY,
+            marca_serie TEXT,
+            documento_funcionario INTEGER,
+            nombre_funcionario TEXT,
+            descripcion TEXT,
+            contenido TEXT,
+            estado TEXT NOT NULL CHECK (estado IN ('DISPONIBLE', 'DAÑADO', 'EN USO')),
+            sede_id INTEGER REFERENCES sedes(id)
+        );
+        
+        CREATE TABLE IF NOT EXISTS equipos (
+            codigo TEXT PRIMARY KEY,
+            sala_id INTEGER REFERENCES salas(id),
+            numero_equipo INTEGER,
+            descripcion TEXT,
+            estado INTEGER NOT NULL CHECK (estado IN (0, 1)),
+            observaciones TEXT
+        );
+        
+        CREATE TABLE IF NOT EXISTS prestamos_salas_profesores (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha_entrada TIMESTAMP NOT NULL,
+            laboratorista INTEGER REFERENCES personal_laboratorio(id),
+            monitor INTEGER REFERENCES personal_laboratorio(id),
+            sala_id INTEGER REFERENCES salas(id) NOT NULL,
+            profesor_id INTEGER REFERENCES profesores(cedula) NOT NULL,
+            hora_salida TIME,
+            firma_profesor INTEGER,
+            observaciones TEXT
+        );
+        
+        CREATE TABLE IF NOT EXISTS prestamos_salas_estudiantes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha_entrada TIMESTAMP NOT NULL,
+            laboratorista INTEGER REFERENCES personal_laboratorio(id),
+            monitor INTEGER REFERENCES personal_laboratorio(id),
+            sala_id INTEGER REFERENCES salas(id) NOT NULL,
+            estudiante_id INTEGER REFERENCES estudiantes(codigo) NOT NULL,
+            hora_salida TIME,
+            equipo_codigo TEXT REFERENCES equipos(codigo),
+            firma_estudiante INTEGER,
+            novedad TEXT
+        );
+        
+        CREATE TABLE IF NOT EXISTS prestamos_equipos_profesores (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha_entrega TIMESTAMP NOT NULL,
+            fecha_devolucion TIMESTAMP,
+            laboratorista_entrega INTEGER REFERENCES personal_laboratorio(id),
+            monitor_entrega INTEGER REFERENCES personal_laboratorio(id),
+            equipo_codigo TEXT REFERENCES inventario(codigo) NOT NULL,
+            profesor_id INTEGER REFERENCES profesores(cedula) NOT NULL,
+            sala_id INTEGER REFERENCES salas(id),
+            titulo_practica TEXT,
+            estado INTEGER NOT NULL CHECK (estado IN (0, 1)),
+            laboratorista_devolucion INTEGER REFERENCES personal_laboratorio(id),
+            monitor_devolucion INTEGER REFERENCES personal_laboratorio(id),
+            documento_devolvente INTEGER,
+            observaciones TEXT
+        );
+        
+        CREATE TABLE IF NOT EXISTS prestamos_equipos_estudiantes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha_entrega TIMESTAMP NOT NULL,
+            fecha_devolucion TIMESTAMP,
+            equipo_codigo TEXT REFERENCES inventario(codigo) NOT NULL,
+            laboratorista_entrega INTEGER REFERENCES personal_laboratorio(id),
+            monitor_entrega INTEGER REFERENCES personal_laboratorio(id),
+            estudiante_id INTEGER REFERENCES estudiantes(codigo) NOT NULL,
+            numero_estudiantes INTEGER,
+            sala_id INTEGER REFERENCES salas(id),
+            titulo_practica TEXT,
+            estado INTEGER NOT NULL CHECK (estado IN (0, 1)),
+            laboratorista_devolucion INTEGER REFERENCES personal_laboratorio(id),
+            monitor_devolucion INTEGER REFERENCES personal_laboratorio(id),
+            documento_devolvente INTEGER,
+            observaciones TEXT
+        );
+        
+        -- When loaning something for a professor, it is set to in use state
+        CREATE TRIGGER IF NOT EXISTS trg_prestamo_equipo_profesor
+            AFTER INSERT ON prestamos_equipos_profesores
+            FOR EACH ROW
+        BEGIN
+            UPDATE inventario 
+            SET estado = 'EN USO'
+            WHERE codigo = NEW.equipo_codigo;
+        END;
+        
+        -- When returning something for a professor, its state is set to available
+        CREATE TRIGGER IF NOT EXISTS trg_devolucion_equipo_profesor
+            AFTER UPDATE ON prestamos_equipos_profesores
+            FOR EACH ROW
+            WHEN NEW.fecha_devolucion IS NOT NULL AND OLD.fecha_devolucion IS NULL
+        BEGIN
+            UPDATE inventario 
+            SET estado = 'DISPONIBLE'
+            WHERE codigo = NEW.equipo_codigo;
+        END;
+        
+        -- When loaning something for a student, it is set to in use state
+        CREATE TRIGGER IF NOT EXISTS trg_prestamo_equipo_estudiante
+            AFTER INSERT ON prestamos_equipos_estudiantes
+            FOR EACH ROW
+        BEGIN
+            UPDATE inventario 
+            SET estado = 'EN USO'
+            WHERE codigo = NEW.equipo_codigo;
+        END;
+        
+        -- When returning something for a student, its state is set to available
+        CREATE TRIGGER IF NOT EXISTS trg_devolucion_equipo_estudiante
+            AFTER UPDATE ON prestamos_equipos_estudiantes
+            FOR EACH ROW
+            WHEN NEW.fecha_devolucion IS NOT NULL AND OLD.fecha_devolucion IS NULL
+        BEGIN
+            UPDATE inventario 
+            SET estado = 'DISPONIBLE'
+            WHERE codigo = NEW.equipo_codigo;
+        END;
+    '''),
+
+    # Indexes for the loan history filters, the foreign keys checked when people,
+    # rooms or equipment are deleted, and the lookups done by the loan forms.
+    # The partial indexes only hold open loans, which is what the dashboard and the
+    # room status columns ask for, so they stay small as the history grows
+    Migration(2, 'loan_and_lookup_indexes', '''
+        CREATE INDEX IF NOT EXISTS idx_pse_sala ON prestamos_salas_estudiantes(sala_id);
+        CREATE INDEX IF NOT EXISTS idx_pse_estudiante ON prestamos_salas_estudiantes(estudiante_id);
+        CREATE INDEX IF NOT EXISTS idx_pse_equipo ON prestamos_salas_estudiantes(equipo_codigo);
+        CREATE INDEX IF NOT EXISTS idx_pse_fecha ON prestamos_salas_estudiantes(fecha_entrada);
+        CREATE INDEX IF NOT EXISTS idx_pse_abiertos ON prestamos_salas_estudiantes(sala_id)
+            WHERE hora_salida IS NULL;
+        CREATE INDEX IF NOT EXISTS idx_pse_abiertos_fecha ON prestamos_salas_estudiantes(fecha_entrada)
+            WHERE hora_salida IS NULL;
+
+        CREATE INDEX IF NOT EXISTS idx_psp_sala ON prestamos_salas_profesores(sala_id);
+        CREATE INDEX IF NOT EXISTS idx_psp_profesor ON prestamos_salas_profesores(profesor_id);
+        CREATE INDEX IF NOT EXISTS idx_psp_fecha ON prestamos_salas_profesores(fecha_entrada);
+        CREATE INDEX IF NOT EXISTS idx_psp_abiertos ON prestamos_salas_profesores(sala_id)
+            WHERE hora_salida IS NULL;
+        CREATE INDEX IF NOT EXISTS idx_psp_abiertos_fecha ON prestamos_salas_profesores(fecha_entrada)
+            WHERE hora_salida IS NULL;
+
+        CREATE INDEX IF NOT EXISTS idx_pee_estudiante ON prestamos_equipos_estudiantes(estudiante_id);
+        CREATE INDEX IF NOT EXISTS idx_pee_equipo ON prestamos_equipos_estudiantes(equipo_codigo);
+        CREATE INDEX IF NOT EXISTS idx_pee_fecha ON prestamos_equipos_estudiantes(fecha_entrega);
+        CREATE INDEX IF NOT EXISTS idx_pee_abiertos ON prestamos_equipos_estudiantes(fecha_entrega)
+            WHERE fecha_devolucion IS NULL;
+
+        CREATE INDEX IF NOT EXISTS idx_pep_profesor ON prestamos_equipos_profesores(profesor_id);
+        CREATE INDEX IF NOT EXISTS idx_pep_equipo ON prestamos_equipos_profesores(equipo_codigo);
+        CREATE INDEX IF NOT EXISTS idx_pep_fecha ON prestamos_equipos_profesores(fecha_entrega);
+        CREATE INDEX IF NOT EXISTS idx_pep_devolucion ON prestamos_equipos_profesores(fecha_devolucion)
+            WHERE fecha_devolucion IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_pep_abiertos ON prestamos_equipos_profesores(fecha_entrega)
+            WHERE fecha_devolucion IS NULL;
+
+        CREATE INDEX IF NOT EXISTS idx_estudiantes_cedula ON estudiantes(cedula);
+        CREATE INDEX IF NOT EXISTS idx_estudiantes_nombre ON estudiantes(nombre);
+        CREATE INDEX IF NOT EXISTS idx_profesores_nombre ON profesores(nombre);
+        CREATE INDEX IF NOT EXISTS idx_salas_codigo_interno ON salas(codigo_interno);
+        CREATE INDEX IF NOT EXISTS idx_salas_nombre ON salas(nombre);
+        CREATE INDEX IF NOT EXISTS idx_equipos_sala_numero ON equipos(sala_id, numero_equipo);
+        CREATE INDEX IF NOT EXISTS idx_inventario_estado ON inventario(estado, codigo);
+    '''),
+
+    # Full-text indexes for the people and inventory searches. The trigram tokenizer
+    # matches any substring of 3+ characters, codes and cedulas included. They are
+    # external content tables (nothing is stored twice) kept in sync by triggers
+    Migration(3, 'fts_search', '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS estudiantes_fts USING fts5(
+            codigo, nombre, cedula,
+            content='estudiantes', content_rowid='codigo', tokenize='trigram'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trg_estudiantes_fts_insert
+            AFTER INSERT ON estudiantes
+        BEGIN
+            INSERT INTO estudiantes_fts (rowid, codigo, nombre, cedula)
+            VALUES (NEW.codigo, NEW.codigo, NEW.nombre, NEW.cedula);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_estudiantes_fts_delete
+            AFTER DELETE ON estudiantes
+        BEGIN
+            INSERT INTO estudiantes_fts (estudiantes_fts, rowid, codigo, nombre, cedula)
+            VALUES ('delete', OLD.codigo, OLD.codigo, OLD.nombre, OLD.cedula);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_estudiantes_fts_update
+            AFTER UPDATE OF codigo, nombre, cedula ON estudiantes
+        BEGIN
+            INSERT INTO estudiantes_fts (estudiantes_fts, rowid, codigo, nombre, cedula)
+            VALUES ('delete', OLD.codigo, OLD.codigo, OLD.nombre, OLD.cedula);
+            INSERT INTO estudiantes_fts (rowid, codigo, nombre, cedula)
+            VALUES (NEW.codigo, NEW.codigo, NEW.nombre, NEW.cedula);
+        END;
+
+        CREATE VIRTUAL TABLE IF NOT EXISTS profesores_fts USING fts5(
+            cedula, nombre,
+            content='profesores', content_rowid='cedula', tokenize='trigram'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trg_profesores_fts_insert
+            AFTER INSERT ON profesores
+        BEGIN
+            INSERT INTO profesores_fts (rowid, cedula, nombre)
+            VALUES (NEW.cedula, NEW.cedula, NEW.nombre);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_profesores_fts_delete
+            AFTER DELETE ON profesores
+        BEGIN
+            INSERT INTO profesores_fts (profesores_fts, rowid, cedula, nombre)
+            VALUES ('delete', OLD.cedula, OLD.cedula, OLD.nombre);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_profesores_fts_update
+            AFTER UPDATE OF cedula, nombre ON profesores
+        BEGIN
+            INSERT INTO profesores_fts (profesores_fts, rowid, cedula, nombre)
+            VALUES ('delete', OLD.cedula, OLD.cedula, OLD.nombre);
+            INSERT INTO profesores_fts (rowid, cedula, nombre)
+            VALUES (NEW.cedula, NEW.cedula, NEW.nombre);
+        END;
+
+        -- Loans change the estado of inventory rows all day, only the searched
+        -- columns are watched so those updates don't touch the index
+        CREATE VIRTUAL TABLE IF NOT EXISTS inventario_fts USING fts5(
+            codigo, descripcion,
+            content='inventario', tokenize='trigram'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trg_inventario_fts_insert
+            AFTER INSERT ON inventario
+        BEGIN
+            INSERT INTO inventario_fts (rowid, codigo, descripcion)
+            VALUES (NEW.rowid, NEW.codigo, NEW.descripcion);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_inventario_fts_delete
+            AFTER DELETE ON inventario
+        BEGIN
+            INSERT INTO inventario_fts (inventario_fts, rowid, codigo, descripcion)
+            VALUES ('delete', OLD.rowid, OLD.codigo, OLD.descripcion);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_inventario_fts_update
+            AFTER UPDATE OF codigo, descripcion ON inventario
+        BEGIN
+            INSERT INTO inventario_fts (inventario_fts, rowid, codigo, descripcion)
+            VALUES ('delete', OLD.rowid, OLD.codigo, OLD.descripcion);
+            INSERT INTO inventario_fts (rowid, codigo, descripcion)
+            VALUES (NEW.rowid, NEW.codigo, NEW.descripcion);
+        END;
+
+        -- Index the rows that existed before this migration
+        INSERT INTO estudiantes_fts (estudiantes_fts) VALUES ('rebuild');
+        INSERT INTO profesores_fts (profesores_fts) VALUES ('rebuild');
+        INSERT INTO inventario_fts (inventario_fts) VALUES ('rebuild');
+    '''),
+
+    # Room occupancy kept on salas itself: the number of open loans of the room and
+    # the estado derived from it, maintained by triggers on both room loan tables.
+    # A loan is open while hora_salida IS NULL. RoomModel.rebuild_occupancy()
+    # recomputes both columns from the loan history if they ever drift
+    Migration(4, 'room_occupancy', '''
+        ALTER TABLE salas ADD COLUMN prestamos_activos INTEGER NOT NULL DEFAULT 0;
+
+        CREATE TRIGGER IF NOT EXISTS trg_ocupacion_sala_estudiante_insert
+            AFTER INSERT ON prestamos_salas_estudiantes
+            FOR EACH ROW
+            WHEN NEW.hora_salida IS NULL
+        BEGIN
+            UPDATE salas
+            SET prestamos_activos = prestamos_activos + 1, estado = 'OCUPADA'
+            WHERE id = NEW.sala_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_ocupacion_sala_estudiante_update
+            AFTER UPDATE OF hora_salida, sala_id ON prestamos_salas_estudiantes
+            FOR EACH ROW
+        BEGIN
+            UPDATE salas
+            SET prestamos_activos = prestamos_activos - 1,
+                estado = CASE WHEN prestamos_activos - 1 > 0 THEN 'OCUPADA' ELSE 'DISPONIBLE' END
+            WHERE id = OLD.sala_id AND OLD.hora_salida IS NULL;
+            UPDATE salas
+            SET prestamos_activos = prestamos_activos + 1, estado = 'OCUPADA'
+            WHERE id = NEW.sala_id AND NEW.hora_salida IS NULL;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_ocupacion_sala_estudiante_delete
+            AFTER DELETE ON prestamos_salas_estudiantes
+            FOR EACH ROW
+            WHEN OLD.hora_salida IS NULL
+        BEGIN
+            UPDATE salas
+            SET prestamos_activos = prestamos_activos - 1,
+                estado = CASE WHEN prestamos_activos - 1 > 0 THEN 'OCUPADA' ELSE 'DISPONIBLE' END
+            WHERE id = OLD.sala_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_ocupacion_sala_profesor_insert
+            AFTER INSERT ON prestamos_salas_profesores
+            FOR EACH ROW
+            WHEN NEW.hora_salida IS NULL
+        BEGIN
+            UPDATE salas
+            SET prestamos_activos = prestamos_activos + 1, estado = 'OCUPADA'
+            WHERE id = NEW.sala_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_ocupacion_sala_profesor_update
+            AFTER UPDATE OF hora_salida, sala_id ON prestamos_salas_profesores
+            FOR EACH ROW
+        BEGIN
+            UPDATE salas
+            SET prestamos_activos = prestamos_activos - 1,
+                estado = CASE WHEN prestamos_activos - 1 > 0 THEN 'OCUPADA' ELSE 'DISPONIBLE' END
+            WHERE id = OLD.sala_id AND OLD.hora_salida IS NULL;
+            UPDATE salas
+            SET prestamos_activos = prestamos_activos + 1, estado = 'OCUPADA'
+            WHERE id = NEW.sala_id AND NEW.hora_salida IS NULL;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_ocupacion_sala_profesor_delete
+            AFTER DELETE ON prestamos_salas_profesores
+            FOR EACH ROW
+            WHEN OLD.hora_salida IS NULL
+        BEGIN
+            UPDATE salas
+            SET prestamos_activos = prestamos_activos - 1,
+                estado = CASE WHEN prestamos_activos - 1 > 0 THEN 'OCUPADA' ELSE 'DISPONIBLE' END
+            WHERE id = OLD.sala_id;
+        END;
+
+        -- Loans that were already open when the columns were added
+        UPDATE salas
+        SET prestamos_activos = (
+                SELECT COUNT(*) FROM prestamos_salas_estudiantes
+                WHERE sala_id = salas.id AND hora_salida IS NULL
+            ) + (
+                SELECT COUNT(*) FROM prestamos_salas_profesores
+                WHERE sala_id = salas.id AND hora_salida IS NULL
+            );
+        UPDATE salas SET estado = CASE WHEN prestamos_activos > 0 THEN 'OCUPADA' ELSE 'DISPONIBLE' END;
+    '''),
+
+    # Sort key of the loan history views: open loans first, then the most recent.
+    # abierto is a virtual generated column (computed on read, nothing is stored in
+    # the rows) so that it can lead an index that also serves keyset pagination
+    Migration(5, 'loan_history_order', '''
+        ALTER TABLE prestamos_salas_estudiantes
+            ADD COLUMN abierto INTEGER GENERATED ALWAYS AS (hora_salida IS NULL) VIRTUAL;
+        ALTER TABLE prestamos_salas_profesores
+            ADD COLUMN abierto INTEGER GENERATED ALWAYS AS (hora_salida IS NULL) VIRTUAL;
+        ALTER TABLE prestamos_equipos_estudiantes
+            ADD COLUMN abierto INTEGER GENERATED ALWAYS AS (fecha_devolucion IS NULL) VIRTUAL;
+        ALTER TABLE prestamos_equipos_profesores
+            ADD COLUMN abierto INTEGER GENERATED ALWAYS AS (fecha_devolucion IS NULL) VIRTUAL;
+
+        CREATE INDEX IF NOT EXISTS idx_pse_historial ON prestamos_salas_estudiantes(abierto, fecha_entrada);
+        CREATE INDEX IF NOT EXISTS idx_psp_historial ON prestamos_salas_profesores(abierto, fecha_entrada);
+        CREATE INDEX IF NOT EXISTS idx_pee_historial ON prestamos_equipos_estudiantes(abierto, fecha_entrega);
+        CREATE INDEX IF NOT EXISTS idx_pep_historial ON prestamos_equipos_profesores(abierto, fecha_entrega);
+    '''),
+
+    # Change tracking for the incremental export. Every insert, update and delete on
+    # the tracked tables adds a row to cambios; its id is the watermark that the
+    # exports store in exportaciones. clave has no declared type so the keys keep
+    # their own (integer codes and text inventory codes). The entries already
+    # exported are deleted after each incremental export (see write_incremental)
+    Migration(6, 'change_log', '''
+        CREATE TABLE IF NOT EXISTS cambios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabla TEXT NOT NULL,
+            clave NOT NULL,
+            operacion TEXT NOT NULL CHECK (operacion IN ('I', 'U', 'D')),
+            fecha TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_cambios_tabla ON cambios(tabla, id);
+
+        CREATE TABLE IF NOT EXISTS exportaciones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            desde_cambio INTEGER NOT NULL,
+            hasta_cambio INTEGER NOT NULL,
+            archivo TEXT
+        );
+    ''' + _change_log_triggers(TRACKED_TABLES)),
+
+    # The equipment loan triggers only mark the item EN USO for open loans. Loans
+    # inserted already returned (the legacy history import) leave the inventory
+    # as it is, like the room occupancy triggers do for closed room loans
+    Migration(7, 'open_loan_triggers', '''
+        DROP TRIGGER IF EXISTS trg_prestamo_equipo_profesor;
+        CREATE TRIGGER trg_prestamo_equipo_profesor
+            AFTER INSERT ON prestamos_equipos_profesores
+            FOR EACH ROW
+            WHEN NEW.fecha_devolucion IS NULL
+        BEGIN
+            UPDATE inventario
+            SET estado = 'EN USO'
+            WHERE codigo = NEW.equipo_codigo;
+        END;
+
+        DROP TRIGGER IF EXISTS trg_prestamo_equipo_estudiante;
+        CREATE TRIGGER trg_prestamo_equipo_estudiante
+            AFTER INSERT ON prestamos_equipos_estudiantes
+            FOR EACH ROW
+            WHEN NEW.fecha_devolucion IS NULL
+        BEGIN
+            UPDATE inventario
+            SET estado = 'EN USO'
+            WHERE codigo = NEW.equipo_codigo;
+        END;
+    '''),
+
+    # Accent and case insensitive searches. The names (and the inventory
+    # descriptions) get a folded copy as a virtual generated column, indexed for the
+    # ordered short searches; the trigram indexes are rebuilt over the folded copy,
+    # so 'nunez' finds 'Núñez'. The update triggers still watch nombre, since a
+    # generated column can't be named in UPDATE OF
+    Migration(8, 'folded_search', f'''
+        ALTER TABLE estudiantes
+            ADD COLUMN nombre_busqueda TEXT GENERATED ALWAYS AS ({folded_sql('nombre')}) VIRTUAL;
+        ALTER TABLE profesores
+            ADD COLUMN nombre_busqueda TEXT GENERATED ALWAYS AS ({folded_sql('nombre')}) VIRTUAL;
+        ALTER TABLE inventario
+            ADD COLUMN descripcion_busqueda TEXT GENERATED ALWAYS AS ({folded_sql('descripcion')}) VIRTUAL;
+
+        CREATE INDEX IF NOT EXISTS idx_estudiantes_nombre_busqueda ON estudiantes(nombre_busqueda);
+        CREATE INDEX IF NOT EXISTS idx_profesores_nombre_busqueda ON profesores(nombre_busqueda);
+
+        DROP TRIGGER IF EXISTS trg_estudiantes_fts_insert;
+        DROP TRIGGER IF EXISTS trg_estudiantes_fts_delete;
+        DROP TRIGGER IF EXISTS trg_estudiantes_fts_update;
+        DROP TABLE IF EXISTS estudiantes_fts;
+        CREATE VIRTUAL TABLE estudiantes_fts USING fts5(
+            codigo, nombre_busqueda, cedula,
+            content='estudiantes', content_rowid='codigo', tokenize='trigram'
+        );
+
+        CREATE TRIGGER trg_estudiantes_fts_insert
+            AFTER INSERT ON estudiantes
+        BEGIN
+            INSERT INTO estudiantes_fts (rowid, codigo, nombre_busqueda, cedula)
+            VALUES (NEW.codigo, NEW.codigo, NEW.nombre_busqueda, NEW.cedula);
+        END;
+
+        CREATE TRIGGER trg_estudiantes_fts_delete
+            AFTER DELETE ON estudiantes
+        BEGIN
+            INSERT INTO estudiantes_fts (estudiantes_fts, rowid, codigo, nombre_busqueda, cedula)
+            VALUES ('delete', OLD.codigo, OLD.codigo, OLD.nombre_busqueda, OLD.cedula);
+        END;
+
+        CREATE TRIGGER trg_estudiantes_fts_update
+            AFTER UPDATE OF codigo, nombre, cedula ON estudiantes
+        BEGIN
+            INSERT INTO estudiantes_fts (estudiantes_fts, rowid, codigo, nombre_busqueda, cedula)
+            VALUES ('delete', OLD.codigo, OLD.codigo, OLD.nombre_busqueda, OLD.cedula);
+            INSERT INTO estudiantes_fts (rowid, codigo, nombre_busqueda, cedula)
+            VALUES (NEW.codigo, NEW.codigo, NEW.nombre_busqueda, NEW.cedula);
+        END;
+
+        DROP TRIGGER IF EXISTS trg_profesores_fts_insert;
+        DROP TRIGGER IF EXISTS trg_profesores_fts_delete;
+        DROP TRIGGER IF EXISTS trg_profesores_fts_update;
+        DROP TABLE IF EXISTS profesores_fts;
+        CREATE VIRTUAL TABLE profesores_fts USING fts5(
+            cedula, nombre_busqueda,
+            content='profesores', content_rowid='cedula', tokenize='trigram'
+        );
+
+        CREATE TRIGGER trg_profesores_fts_insert
+            AFTER INSERT ON profesores
+        BEGIN
+            INSERT INTO profesores_fts (rowid, cedula, nombre_busqueda)
+            VALUES (NEW.cedula, NEW.cedula, NEW.nombre_busqueda);
+        END;
+
+        CREATE TRIGGER trg_profesores_fts_delete
+            AFTER DELETE ON profesores
+        BEGIN
+            INSERT INTO profesores_fts (profesores_fts, rowid, cedula, nombre_busqueda)
+            VALUES ('delete', OLD.cedula, OLD.cedula, OLD.nombre_busqueda);
+        END;
+
+        CREATE TRIGGER trg_profesores_fts_update
+            AFTER UPDATE OF cedula, nombre ON profesores
+        BEGIN
+            INSERT INTO profesores_fts (profesores_fts, rowid, cedula, nombre_busqueda)
+            VALUES ('delete', OLD.cedula, OLD.cedula, OLD.nombre_busqueda);
+            INSERT INTO profesores_fts (rowid, cedula, nombre_busqueda)
+            VALUES (NEW.cedula, NEW.cedula, NEW.nombre_busqueda);
+        END;
+
+        DROP TRIGGER IF EXISTS trg_inventario_fts_insert;
+        DROP TRIGGER IF EXISTS trg_inventario_fts_delete;
+        DROP TRIGGER IF EXISTS trg_inventario_fts_update;
+        DROP TABLE IF EXISTS inventario_fts;
+        CREATE VIRTUAL TABLE inventario_fts USING fts5(
+            codigo, descripcion_busqueda,
+            content='inventario', tokenize='trigram'
+        );
+
+        CREATE TRIGGER trg_inventario_fts_insert
+            AFTER INSERT ON inventario
+        BEGIN
+            INSERT INTO inventario_fts (rowid, codigo, descripcion_busqueda)
+            VALUES (NEW.rowid, NEW.codigo, NEW.descripcion_busqueda);
+        END;
+
+        CREATE TRIGGER trg_inventario_fts_delete
+            AFTER DELETE ON inventario
+        BEGIN
+            INSERT INTO inventario_fts (inventario_fts, rowid, codigo, descripcion_busqueda)
+            VALUES ('delete', OLD.rowid, OLD.codigo, OLD.descripcion_busqueda);
+        END;
+
+        CREATE TRIGGER trg_inventario_fts_update
+            AFTER UPDATE OF codigo, descripcion ON inventario
+        BEGIN
+            INSERT INTO inventario_fts (inventario_fts, rowid, codigo, descripcion_busqueda)
+            VALUES ('delete', OLD.rowid, OLD.codigo, OLD.descripcion_busqueda);
+            INSERT INTO inventario_fts (rowid, codigo, descripcion_busqueda)
+            VALUES (NEW.rowid, NEW.codigo, NEW.descripcion_busqueda);
+        END;
+
+        INSERT INTO estudiantes_fts (estudiantes_fts) VALUES ('rebuild');
+        INSERT INTO profesores_fts (profesores_fts) VALUES ('rebuild');
+        INSERT INTO inventario_fts (inventario_fts) VALUES ('rebuild');
+    '''),
+]
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def apply_migrations(conn, migrations=MIGRATIONS):
+    ''' Applies, in order, every migration newer than the schema version of the
+    database and returns the list of migrations applied (empty if up to date) '''
+    applied = []
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if migration.version <= get_schema_version(conn):
+            continue
+        try:
+            conn.executescript(
+                f'BEGIN IMMEDIATE;\n{migration.script}\n'
+                f'PRAGMA user_version = {migration.version};\nCOMMIT;'
+            )
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.rollback()
+            # Another instance of the app may have migrated the file meanwhile
+            if get_schema_version(conn) >= migration.version:
+                continue
+            raise
+        applied.append(migration)
+    return applied
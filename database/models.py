@@ -1,28 +1,326 @@
+import json
 import sqlite3
+from collections import namedtuple
 from .connection import DatabaseManager
+from .migrations import TRACKED_TABLES, CURRENT_CHANGE_SQL, fold_search_term
+from .instrumentation import instrumented
+
+# The trigram tokenizer can't match terms shorter than 3 characters
+FTS_MIN_TERM_LENGTH = 3
+
+def fts_phrase(term):
+    ''' Quotes a search term, folded like the indexed columns, as a single FTS5
+    phrase, which the trigram tokenizer matches as a substring. Returns None when
+    the term is too short for the index, and the caller falls back to LIKE '''
+    if not term or len(term) < FTS_MIN_TERM_LENGTH:
+        return None
+    return '"' + fold_search_term(term).replace('"', '""') + '"'
+
+def folded_like(term):
+    ''' LIKE pattern for the folded (*_busqueda) columns '''
+    return f'%{fold_search_term(term)}%'
+
+# Rows per page of the loan history views
+HISTORY_PAGE_SIZE = 100
+
+# Rows fetched at a time when a whole history is streamed (e.g. to Excel)
+HISTORY_CHUNK_SIZE = 2000
+
+# Result of StudentModel.sync_students: lists of rows per kind of change, the
+# number of roster rows that match the table, and whether the changes were written
+RosterDiff = namedtuple('RosterDiff', ['inserts', 'filled', 'updates', 'departures', 'unchanged', 'applied'])
+
+# The student or professor half of a loan history query, with its filters.
+# columns is the SELECT list, from_clause the FROM with its joins
+HistoryPart = namedtuple('HistoryPart', ['loan_type', 'alias', 'columns', 'from_clause', 'where', 'params'])
+
+def history_query(parts, date_column, cursor=None, limit=None):
+    ''' Merges the halves of a loan history into one UNION ALL query sorted by
+    SQLite: open loans first, then date, loan type and id, all descending. Each
+    half also selects its abierto column (the first sort key) as the last column.
+    cursor is the sort key of the last row already read, for keyset pagination '''
+    selects, params = [], []
+    for part in parts:
+        where, part_params = list(part.where), list(part.params)
+        if cursor is not None:
+            abierto, fecha, loan_type, loan_id = cursor
+            keys = f'{part.alias}.abierto, {part.alias}.{date_column}'
+            if part.loan_type == loan_type:
+                where.append(f'({keys}, {part.alias}.id) < (?, ?, ?)')
+                part_params.extend([abierto, fecha, loan_id])
+            else:
+                # Rows with the same (abierto, date) are ordered by loan_type, descending
+                operator = '<=' if part.loan_type < loan_type else '<'
+                where.append(f'({keys}) {operator} (?, ?)')
+                part_params.extend([abierto, fecha])
+        select = f'{part.columns}, {part.alias}.abierto {part.from_clause}'
+        if where:
+            select += ' WHERE ' + ' AND '.join(where)
+        selects.append(select)
+        params.extend(part_params)
+
+    # The loan id goes by position, 'id' alone is ambiguous among the joined tables
+    query = ' UNION ALL '.join(selects)
+    query += f' ORDER BY abierto DESC, {date_column} DESC, loan_type DESC, 1 DESC'
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+    return query, params
+
+def history_count_query(parts):
+    ''' Single query adding up the rows of every half of a loan history '''
+    counts, params = [], []
+    for part in parts:
+        count = f'SELECT COUNT(*) {part.from_clause}'
+        if part.where:
+            count += ' WHERE ' + ' AND '.join(part.where)
+        counts.append(f'({count})')
+        params.extend(part.params)
+    return 'SELECT ' + (' + '.join(counts) or '0'), params
+
+def fetch_history_page(db_manager, parts, date_column, date_index, type_index, page_size, cursor=None):
+    ''' Runs a loan history query and returns (rows, next_cursor). Rows keep the
+    layout of the SELECT list (the abierto sort column is dropped). next_cursor is
+    None on the last page; page_size None reads everything '''
+    conn = db_manager.get_connection()
+    db_cursor = conn.cursor()
+    try:
+        # One extra row tells whether there is a next page
+        limit = page_size + 1 if page_size is not None else None
+        query, params = history_query(parts, date_column, cursor, limit)
+        db_cursor.execute(query, params)
+        rows = db_cursor.fetchall()
+    except sqlite3.Error as e:
+        print(f'Database error on loan history fetch: {e}')
+        return [], None
+    finally:
+        conn.close()
+
+    next_cursor = None
+    if page_size is not None and len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = (last[-1], last[date_index], last[type_index], last[0])
+    return [row[:-1] for row in rows], next_cursor
+
+def iter_history(db_manager, parts, date_column, chunk_size=HISTORY_CHUNK_SIZE):
+    ''' Streams a whole loan history in chunks of up to chunk_size rows, same order
+    and layout as fetch_history_page. Only one chunk is in memory at a time, and
+    the single query reads one consistent snapshot of the tables '''
+    conn = db_manager.get_connection()
+    db_cursor = conn.cursor()
+    try:
+        query, params = history_query(parts, date_column)
+        db_cursor.execute(query, params)
+        while True:
+            rows = db_cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [row[:-1] for row in rows]
+    except sqlite3.Error as e:
+        print(f'Database error on loan history stream: {e}')
+    finally:
+        db_cursor.close()
+        conn.close()
+
+def count_history(db_manager, parts):
+    conn = db_manager.get_connection()
+    try:
+        query, params = history_count_query(parts)
+        return conn.execute(query, params).fetchone()[0]
+    except sqlite3.Error as e:
+        print(f'Database error on loan history count: {e}')
+        return 0
+    finally:
+        conn.close()
 
+def bulk_insert(db_manager, table, columns, batches):
+    ''' Inserts batches of rows (tuples in the order of columns, the key first)
+    with executemany, all in one transaction. Rows whose key already exists are
+    left alone. Returns (inserted, existing keys); on error nothing is inserted '''
+    key = columns[0]
+    insert = (f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))}) '
+              f'ON CONFLICT({key}) DO NOTHING')
+    # The keys of a whole batch are checked in one query, as a JSON array
+    lookup = f'SELECT {key} FROM {table} WHERE {key} IN (SELECT value FROM json_each(?))'
+    conn = db_manager.get_connection()
+    inserted = 0
+    existing = []
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        for batch in batches:
+            if not batch:
+                continue
+            found = {row[0] for row in conn.execute(lookup, (json.dumps([row[0] for row in batch]),))}
+            new_rows = [row for row in batch if row[0] not in found]
+            existing.extend(row[0] for row in batch if row[0] in found)
+            conn.executemany(insert, new_rows)
+            inserted += len(new_rows)
+        conn.commit()
+        return inserted, existing
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f'Database error on bulk insert into {table}: {e}')
+        raise
+    finally:
+        conn.close()
+
+# Loan tables filled by the legacy history import, by kind of loan and person: the
+# table, its person and start date columns, and the columns that take the staged
+# values of historial_legado. Legacy loans are always closed (estado 0)
+LEGACY_LOAN_INSERTS = {
+    ('salas', 'estudiante'): ('prestamos_salas_estudiantes', 'estudiante_id', 'fecha_entrada',
+        'fecha_entrada, hora_salida, sala_id, estudiante_id, equipo_codigo, laboratorista, monitor, novedad',
+        'fecha, fin, sala_id, estudiante, equipo, laboratorista, monitor, observaciones'),
+    ('salas', 'profesor'): ('prestamos_salas_profesores', 'profesor_id', 'fecha_entrada',
+        'fecha_entrada, hora_salida, sala_id, profesor_id, laboratorista, monitor, observaciones',
+        'fecha, fin, sala_id, profesor, laboratorista, monitor, observaciones'),
+    ('equipos', 'estudiante'): ('prestamos_equipos_estudiantes', 'estudiante_id', 'fecha_entrega',
+        'fecha_entrega, fecha_devolucion, estado, sala_id, estudiante_id, equipo_codigo, '
+        'laboratorista_entrega, monitor_entrega, titulo_practica, observaciones',
+        'fecha, fin, 0, sala_id, estudiante, equipo, laboratorista, monitor, titulo, observaciones'),
+    ('equipos', 'profesor'): ('prestamos_equipos_profesores', 'profesor_id', 'fecha_entrega',
+        'fecha_entrega, fecha_devolucion, estado, sala_id, profesor_id, equipo_codigo, '
+        'laboratorista_entrega, monitor_entrega, titulo_practica, observaciones',
+        'fecha, fin, 0, sala_id, profesor, equipo, laboratorista, monitor, titulo, observaciones'),
+}
+
+def import_loan_history(db_manager, kind, batches):
+    ''' Loads legacy loans of kind 'salas' or 'equipos' in one transaction. Each row
+    of the batches is (linea, fecha, fin, estudiante, profesor, sala_id, equipo,
+    laboratorista, monitor, titulo, observaciones) with exactly one of estudiante
+    or profesor; fin, always set, is the hora_salida of room loans and the
+    fecha_devolucion of equipment loans. The rows are staged in a temp table, without
+    locking the database, and resolved with set-based statements in one write
+    transaction: people not registered are created blank, loans already in the
+    history are skipped and, for equipment loans, codes missing from the inventory
+    are returned as (linea, codigo) instead of loaded. Returns (inserted, duplicates,
+    students created, professors created, missing equipment) '''
+    conn = db_manager.get_connection()
+    try:
+        conn.execute('''
+            CREATE TEMP TABLE historial_legado (
+                linea INTEGER PRIMARY KEY,
+                fecha TEXT NOT NULL,
+                fin TEXT,
+                estudiante INTEGER,
+                profesor INTEGER,
+                sala_id INTEGER,
+                equipo TEXT,
+                laboratorista INTEGER,
+                monitor INTEGER,
+                titulo TEXT,
+                observaciones TEXT
+            )
+        ''')
+        # Staging only writes the temp database: the file is parsed and validated
+        # while the counter keeps registering loans
+        for batch in batches:
+            conn.executemany('INSERT INTO temp.historial_legado VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', batch)
+        conn.commit()
+
+        conn.execute('BEGIN IMMEDIATE')
+        if kind == 'equipos':
+            missing = conn.execute('''
+                SELECT linea, equipo FROM temp.historial_legado h
+                WHERE NOT EXISTS (SELECT 1 FROM inventario WHERE codigo = h.equipo)
+                ORDER BY linea
+            ''').fetchall()
+            conn.execute('DELETE FROM temp.historial_legado WHERE linea IN (SELECT value FROM json_each(?))',
+                         (json.dumps([linea for linea, _ in missing]),))
+        else:
+            # The computer of a room loan is optional, an unknown one is just dropped
+            missing = []
+            conn.execute('''
+                UPDATE temp.historial_legado SET equipo = NULL
+                WHERE equipo IS NOT NULL AND NOT EXISTS (SELECT 1 FROM equipos WHERE codigo = equipo)
+            ''')
+
+        duplicates = 0
+        for person in ('estudiante', 'profesor'):
+            table, person_column, date_column, _, _ = LEGACY_LOAN_INSERTS[kind, person]
+            # A loan of the same person starting at the same time was loaded before
+            duplicates += max(conn.execute(f'''
+                DELETE FROM temp.historial_legado
+                WHERE {person} IS NOT NULL AND EXISTS (
+                    SELECT 1 FROM {table} p
+                    WHERE p.{person_column} = historial_legado.{person}
+                    AND p.{date_column} = historial_legado.fecha
+                )
+            ''').rowcount, 0)
+
+        # People not registered yet are created blank, the roster import fills them later
+        students_created = max(conn.execute('''
+            INSERT INTO estudiantes (codigo)
+            SELECT DISTINCT estudiante FROM temp.historial_legado WHERE estudiante IS NOT NULL
+            ON CONFLICT(codigo) DO NOTHING
+        ''').rowcount, 0)
+        professors_created = max(conn.execute('''
+            INSERT INTO profesores (cedula)
+            SELECT DISTINCT profesor FROM temp.historial_legado WHERE profesor IS NOT NULL
+            ON CONFLICT(cedula) DO NOTHING
+        ''').rowcount, 0)
+
+        inserted = 0
+        for person in ('estudiante', 'profesor'):
+            table, _, _, columns, values = LEGACY_LOAN_INSERTS[kind, person]
+            inserted += max(conn.execute(f'''
+                INSERT INTO {table} ({columns})
+                SELECT {values} FROM temp.historial_legado
+                WHERE {person} IS NOT NULL
+                ORDER BY fecha
+            ''').rowcount, 0)
+        conn.commit()
+        return inserted, duplicates, students_created, professors_created, missing
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f'Database error on loan history import: {e}')
+        raise
+    finally:
+        conn.execute('DROP TABLE IF EXISTS temp.historial_legado')
+        conn.close()
+
+@instrumented
 class StudentModel:
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager or DatabaseManager()
 
     # Lists all the students
     def get_all_students(self, search_term='', project_filter_name=''):
         conn = self.db_manager.get_connection()
         cursor = conn.cursor()
         
-        query = '''
-            SELECT e.codigo, e.nombre, e.cedula, pc.nombre as proyecto_nombre
-            FROM estudiantes e
-            LEFT JOIN proyectos_curriculares pc ON e.proyecto_curricular_id = pc.id
-            WHERE (CAST(e.codigo AS TEXT) LIKE ? OR e.nombre LIKE ? OR CAST(e.cedula AS TEXT) LIKE ?)
-        '''
-        params = [f'%{search_term}%', f'%{search_term}%', f'%{search_term}%']
-        
+        columns = 'SELECT e.codigo, e.nombre, e.cedula, pc.nombre as proyecto_nombre'
+        match = fts_phrase(search_term)
+        if match:
+            # Ranked substring search through the trigram index
+            query = f'''
+                {columns}
+                FROM estudiantes_fts
+                JOIN estudiantes e ON e.codigo = estudiantes_fts.rowid
+                LEFT JOIN proyectos_curriculares pc ON e.proyecto_curricular_id = pc.id
+                WHERE estudiantes_fts MATCH ?
+            '''
+            params = [match]
+            order_by = ' ORDER BY estudiantes_fts.rank, e.nombre_busqueda ASC'
+        else:
+            query = f'''
+                {columns}
+                FROM estudiantes e
+                LEFT JOIN proyectos_curriculares pc ON e.proyecto_curricular_id = pc.id
+                WHERE 1 = 1
+            '''
+            params = []
+            if search_term:
+                query += ' AND (CAST(e.codigo AS TEXT) LIKE ? OR e.nombre_busqueda LIKE ? OR CAST(e.cedula AS TEXT) LIKE ?)'
+                params.extend([f'%{search_term}%', folded_like(search_term), f'%{search_term}%'])
+            order_by = ' ORDER BY e.nombre_busqueda ASC'
+
         if project_filter_name:
             query += ' AND pc.nombre = ?'
             params.append(project_filter_name)
 
-        query += ' ORDER BY e.nombre ASC'
+        query += order_by
         cursor.execute(query, params)
         students = cursor.fetchall()
         conn.close()
@@ -44,13 +342,23 @@ class StudentModel:
     def get_students_by_partial_query(self, query):
         conn = self.db_manager.get_connection()
         cursor = conn.cursor()
-        search_query = f'%{query}%'
-        cursor.execute('''
-            SELECT codigo, nombre, cedula FROM estudiantes 
-            WHERE CAST(codigo AS TEXT) LIKE ? OR nombre LIKE ? OR CAST(cedula AS TEXT) LIKE ?
-            ORDER BY nombre ASC 
-            LIMIT 10
-        ''', (search_query, search_query, search_query))
+        match = fts_phrase(query)
+        if match:
+            cursor.execute('''
+                SELECT e.codigo, e.nombre, e.cedula FROM estudiantes_fts
+                JOIN estudiantes e ON e.codigo = estudiantes_fts.rowid
+                WHERE estudiantes_fts MATCH ?
+                ORDER BY estudiantes_fts.rank, e.nombre_busqueda ASC
+                LIMIT 10
+            ''', (match,))
+        else:
+            search_query = f'%{query}%'
+            cursor.execute('''
+                SELECT codigo, nombre, cedula FROM estudiantes 
+                WHERE CAST(codigo AS TEXT) LIKE ? OR nombre_busqueda LIKE ? OR CAST(cedula AS TEXT) LIKE ?
+                ORDER BY nombre_busqueda ASC 
+                LIMIT 10
+            ''', (search_query, folded_like(query), search_query))
         items = cursor.fetchall()
         conn.close()
         return items
@@ -71,6 +379,107 @@ class StudentModel:
         finally:
             conn.close()
 
+    # Bulk version of add_student for the roster import: batches of
+    # (codigo, nombre, cedula, proyecto_id), one transaction. Returns (inserted, existing codes)
+    def import_students(self, batches):
+        return bulk_insert(self.db_manager, 'estudiantes',
+                           ['codigo', 'nombre', 'cedula', 'proyecto_curricular_id'], batches)
+
+    def sync_students(self, batches, apply=False):
+        ''' Compares a full semester roster, given as batches of (codigo, nombre,
+        cedula, proyecto_id), with the students table. The roster is loaded into a
+        temporary table and the differences come from set-based queries:
+            inserts     codes that are not registered
+            filled      blank students (created during a loan) that the roster completes
+            updates     students whose name, cedula or project changed
+            departures  named students missing from the roster; they are only
+                        reported, their loans still point to them
+        A missing cedula or project in the roster keeps the registered one. With
+        apply=True the inserts, fills and updates are written with one
+        INSERT ... ON CONFLICT DO UPDATE in a single transaction. Returns a RosterDiff '''
+        conn = self.db_manager.get_connection()
+        try:
+            conn.execute('DROP TABLE IF EXISTS temp.roster_estudiantes')
+            conn.execute('''
+                CREATE TEMP TABLE roster_estudiantes (
+                    codigo INTEGER PRIMARY KEY,
+                    nombre TEXT,
+                    cedula INTEGER,
+                    proyecto_curricular_id INTEGER
+                )
+            ''')
+            for batch in batches:
+                conn.executemany('INSERT OR REPLACE INTO temp.roster_estudiantes VALUES (?, ?, ?, ?)', batch)
+            conn.commit()
+
+            # The diff and the upsert see the same data: with apply the write lock is
+            # taken before comparing
+            conn.execute('BEGIN IMMEDIATE' if apply else 'BEGIN')
+            inserts = conn.execute('''
+                SELECT r.codigo, r.nombre, r.cedula, r.proyecto_curricular_id
+                FROM temp.roster_estudiantes r
+                WHERE NOT EXISTS (SELECT 1 FROM estudiantes e WHERE e.codigo = r.codigo)
+                ORDER BY r.codigo
+            ''').fetchall()
+            filled = conn.execute('''
+                SELECT r.codigo, r.nombre, r.cedula, r.proyecto_curricular_id
+                FROM temp.roster_estudiantes r
+                JOIN estudiantes e ON e.codigo = r.codigo
+                WHERE e.nombre IS NULL
+                ORDER BY r.codigo
+            ''').fetchall()
+            updates = conn.execute('''
+                SELECT e.codigo,
+                       e.nombre, r.nombre,
+                       e.cedula, COALESCE(r.cedula, e.cedula),
+                       e.proyecto_curricular_id, COALESCE(r.proyecto_curricular_id, e.proyecto_curricular_id)
+                FROM temp.roster_estudiantes r
+                JOIN estudiantes e ON e.codigo = r.codigo
+                WHERE e.nombre IS NOT NULL
+                AND (e.nombre IS NOT r.nombre
+                     OR e.cedula IS NOT COALESCE(r.cedula, e.cedula)
+                     OR e.proyecto_curricular_id IS NOT COALESCE(r.proyecto_curricular_id, e.proyecto_curricular_id))
+                ORDER BY e.codigo
+            ''').fetchall()
+            departures = conn.execute('''
+                SELECT e.codigo, e.nombre, e.cedula, e.proyecto_curricular_id
+                FROM estudiantes e
+                WHERE e.nombre IS NOT NULL
+                AND NOT EXISTS (SELECT 1 FROM temp.roster_estudiantes r WHERE r.codigo = e.codigo)
+                ORDER BY e.codigo
+            ''').fetchall()
+            unchanged = conn.execute('SELECT COUNT(*) FROM temp.roster_estudiantes').fetchone()[0] \
+                - len(inserts) - len(filled) - len(updates)
+
+            if apply:
+                # The WHERE of the update skips the unchanged rows, so they are not rewritten
+                conn.execute('''
+                    INSERT INTO estudiantes (codigo, nombre, cedula, proyecto_curricular_id)
+                    SELECT codigo, nombre, cedula, proyecto_curricular_id
+                    FROM temp.roster_estudiantes WHERE true
+                    ON CONFLICT(codigo) DO UPDATE SET
+                        nombre = excluded.nombre,
+                        cedula = COALESCE(excluded.cedula, estudiantes.cedula),
+                        proyecto_curricular_id = COALESCE(excluded.proyecto_curricular_id,
+                                                          estudiantes.proyecto_curricular_id)
+                    WHERE estudiantes.nombre IS NOT excluded.nombre
+                    OR estudiantes.cedula IS NOT COALESCE(excluded.cedula, estudiantes.cedula)
+                    OR estudiantes.proyecto_curricular_id IS NOT COALESCE(excluded.proyecto_curricular_id,
+                                                                         estudiantes.proyecto_curricular_id)
+                ''')
+                conn.commit()
+            else:
+                conn.rollback()
+            return RosterDiff(inserts, filled, updates, departures, unchanged, apply)
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.rollback()
+            print(f'Database error on roster sync: {e}')
+            raise
+        finally:
+            conn.execute('DROP TABLE IF EXISTS temp.roster_estudiantes')
+            conn.close()
+
     # Insert a student with code but no data, when a code is no found in a loan
     def add_blank_student(self, codigo):
         conn = self.db_manager.get_connection()
@@ -126,28 +535,46 @@ class StudentModel:
         conn.close()
         return projects
 
+@instrumented
 class ProfesorModel:
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager or DatabaseManager()
     
     def get_all_profesores(self, search_term='', project_filter_name=''):
         conn = self.db_manager.get_connection()
         cursor = conn.cursor()
         
-        query = '''
-            SELECT p.cedula, p.nombre, pc.nombre as proyecto_nombre
-            FROM profesores p
-            LEFT JOIN proyectos_curriculares pc ON p.proyecto_curricular_id = pc.id
-            WHERE (CAST(p.cedula AS TEXT) LIKE ? OR p.nombre LIKE ?)
-        '''
-        # Cedula is primary key, usually not searched with LIKE unless its a partial string search
-        params = [f'%{search_term}%', f'%{search_term}%']
-        
+        columns = 'SELECT p.cedula, p.nombre, pc.nombre as proyecto_nombre'
+        match = fts_phrase(search_term)
+        if match:
+            # Ranked substring search through the trigram index, partial cedulas included
+            query = f'''
+                {columns}
+                FROM profesores_fts
+                JOIN profesores p ON p.cedula = profesores_fts.rowid
+                LEFT JOIN proyectos_curriculares pc ON p.proyecto_curricular_id = pc.id
+                WHERE profesores_fts MATCH ?
+            '''
+            params = [match]
+            order_by = ' ORDER BY profesores_fts.rank, p.nombre_busqueda ASC'
+        else:
+            query = f'''
+                {columns}
+                FROM profesores p
+                LEFT JOIN proyectos_curriculares pc ON p.proyecto_curricular_id = pc.id
+                WHERE 1 = 1
+            '''
+            params = []
+            if search_term:
+                query += ' AND (CAST(p.cedula AS TEXT) LIKE ? OR p.nombre_busqueda LIKE ?)'
+                params.extend([f'%{search_term}%', folded_like(search_term)])
+            order_by = ' ORDER BY p.nombre_busqueda ASC'
+
         if project_filter_name:
             query += ' AND pc.nombre = ?'
             params.append(project_filter_name)
-        
-        query += ' ORDER BY p.nombre ASC'
+
+        query += order_by
         cursor.execute(query, params)
         profesores = cursor.fetchall()
         conn.close()
@@ -168,13 +595,23 @@ class ProfesorModel:
     def get_professors_by_partial_query(self, query):
         conn = self.db_manager.get_connection()
         cursor = conn.cursor()
-        search_query = f'%{query}%'
-        cursor.execute('''
-            SELECT cedula, nombre FROM profesores 
-            WHERE CAST(cedula AS TEXT) LIKE ? OR nombre LIKE ?
-            ORDER BY nombre ASC 
-            LIMIT 10
-        ''', (search_query, search_query))
+        match = fts_phrase(query)
+        if match:
+            cursor.execute('''
+                SELECT p.cedula, p.nombre FROM profesores_fts
+                JOIN profesores p ON p.cedula = profesores_fts.rowid
+                WHERE profesores_fts MATCH ?
+                ORDER BY profesores_fts.rank, p.nombre_busqueda ASC
+                LIMIT 10
+            ''', (match,))
+        else:
+            search_query = f'%{query}%'
+            cursor.execute('''
+                SELECT cedula, nombre FROM profesores 
+                WHERE CAST(cedula AS TEXT) LIKE ? OR nombre_busqueda LIKE ?
+                ORDER BY nombre_busqueda ASC 
+                LIMIT 10
+            ''', (search_query, folded_like(query)))
         items = cursor.fetchall()
         conn.close()
         return items
@@ -195,6 +632,12 @@ class ProfesorModel:
         finally:
             conn.close()
     
+    # Bulk version of add_profesor for the roster import: batches of
+    # (cedula, nombre, proyecto_id), one transaction. Returns (inserted, existing cedulas)
+    def import_profesores(self, batches):
+        return bulk_insert(self.db_manager, 'profesores',
+                           ['cedula', 'nombre', 'proyecto_curricular_id'], batches)
+
     # Adds a professor with only the ID number. Other fields are null.
     def add_blank_profesor(self, cedula):
         conn = self.db_manager.get_connection()
@@ -250,29 +693,22 @@ class ProfesorModel:
         conn.close()
         return projects
 
+@instrumented
 class RoomModel:
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager or DatabaseManager()
     
     # Lists if a room is occupied or available depending to loans
     def get_all_rooms_with_status(self):
         conn = self.db_manager.get_connection()
         cursor = conn.cursor()
+        # estado is kept up to date by the room loan triggers
         cursor.execute('''
             SELECT 
                 s.id,
                 s.codigo_interno, 
                 s.nombre,
-                CASE 
-                    WHEN EXISTS (
-                        SELECT 1 FROM prestamos_salas_profesores psp
-                        WHERE psp.sala_id = s.id AND psp.hora_salida IS NULL
-                    ) OR EXISTS (
-                        SELECT 1 FROM prestamos_salas_estudiantes pse
-                        WHERE pse.sala_id = s.id AND pse.hora_salida IS NULL
-                    ) THEN 'Ocupada'
-                    ELSE 'Disponible'
-                END as estado
+                CASE WHEN s.estado = 'OCUPADA' THEN 'Ocupada' ELSE 'Disponible' END as estado
             FROM salas s
             ORDER BY s.nombre ASC
         ''')
@@ -288,18 +724,44 @@ class RoomModel:
         cursor.execute('''
             SELECT s.id, s.nombre
             FROM salas s
-            WHERE NOT EXISTS (
-                SELECT 1 FROM prestamos_salas_profesores psp
-                WHERE psp.sala_id = s.id AND psp.hora_salida IS NULL
-            ) AND NOT EXISTS (
-                SELECT 1 FROM prestamos_salas_estudiantes pse
-                WHERE pse.sala_id = s.id AND pse.hora_salida IS NULL
-            )
+            WHERE s.prestamos_activos = 0
             ORDER BY s.nombre ASC
         ''')
         rooms = cursor.fetchall()
         conn.close()
         return rooms
+
+    # Recomputes the open loan counter and estado of every room from the loan
+    # history. The triggers keep them right; this repairs them if they drift
+    # (e.g. after editing the database by hand). Returns the rooms corrected
+    def rebuild_occupancy(self):
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                UPDATE salas
+                SET prestamos_activos = conteo.total,
+                    estado = CASE WHEN conteo.total > 0 THEN 'OCUPADA' ELSE 'DISPONIBLE' END
+                FROM (
+                    SELECT s.id,
+                           (SELECT COUNT(*) FROM prestamos_salas_estudiantes pse
+                            WHERE pse.sala_id = s.id AND pse.hora_salida IS NULL) +
+                           (SELECT COUNT(*) FROM prestamos_salas_profesores psp
+                            WHERE psp.sala_id = s.id AND psp.hora_salida IS NULL) AS total
+                    FROM salas s
+                ) AS conteo
+                WHERE conteo.id = salas.id
+                  AND (salas.prestamos_activos != conteo.total
+                       OR salas.estado != CASE WHEN conteo.total > 0 THEN 'OCUPADA' ELSE 'DISPONIBLE' END)
+            ''')
+            corrected = cursor.rowcount
+            conn.commit()
+            return corrected
+        except sqlite3.Error as e:
+            print(f'Error rebuilding room occupancy: {e}')
+            return None
+        finally:
+            conn.close()
     
     # Fetches all rooms with their ID and name, suitable for foreign key relations
     def get_all_rooms_with_id_for_dropdown(self):
@@ -309,6 +771,15 @@ class RoomModel:
         rooms = cursor.fetchall()
         conn.close()
         return rooms
+
+    # Fetches the id, internal code and name of every room, to match rooms named in imported files
+    def get_room_keys(self):
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, codigo_interno, nombre FROM salas')
+        rooms = cursor.fetchall()
+        conn.close()
+        return rooms
         
     def get_room_by_code(self, codigo):
         conn = self.db_manager.get_connection()
@@ -357,26 +828,47 @@ class RoomModel:
         finally:
             conn.close()
 
+@instrumented
 class InventoryModel:
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager or DatabaseManager()
     
     # Filters by status and serial
     def get_all_equipment(self, search_term='', status_filter='', brand_serial_filter=''):
         conn = self.db_manager.get_connection()
         cursor = conn.cursor()
         
-        query = '''
+        columns = '''
             SELECT i.codigo, i.marca_serie, 
                    i.nombre_funcionario || ' (' || CAST(i.documento_funcionario AS TEXT) || ')' as responsable, 
                    COALESCE(s.nombre, 'N/A') as ubicacion_sede,
                    i.descripcion, i.contenido, i.estado
-            FROM inventario i
-            LEFT JOIN sedes s ON i.sede_id = s.id
-            WHERE (i.codigo LIKE ? OR i.descripcion LIKE ?)
         '''
-        params = [f'%{search_term}%', f'%{search_term}%']
-        
+        match = fts_phrase(search_term)
+        if match:
+            # Ranked substring search through the trigram index
+            query = f'''
+                {columns}
+                FROM inventario_fts
+                JOIN inventario i ON i.rowid = inventario_fts.rowid
+                LEFT JOIN sedes s ON i.sede_id = s.id
+                WHERE inventario_fts MATCH ?
+            '''
+            params = [match]
+            order_by = ' ORDER BY inventario_fts.rank, i.codigo ASC'
+        else:
+            query = f'''
+                {columns}
+                FROM inventario i
+                LEFT JOIN sedes s ON i.sede_id = s.id
+                WHERE 1 = 1
+            '''
+            params = []
+            if search_term:
+                query += ' AND (i.codigo LIKE ? OR i.descripcion_busqueda LIKE ?)'
+                params.extend([f'%{search_term}%', folded_like(search_term)])
+            order_by = ' ORDER BY i.codigo ASC'
+
         if status_filter:
             query += ' AND i.estado = ?'
             params.append(status_filter)
@@ -384,7 +876,7 @@ class InventoryModel:
             query += ' AND i.marca_serie LIKE ?'
             params.append(f'%{brand_serial_filter}%')
 
-        query += ' ORDER BY i.codigo ASC'
+        query += order_by
         cursor.execute(query, params)
         equipment = cursor.fetchall()
         conn.close()
@@ -422,6 +914,68 @@ class InventoryModel:
         finally:
             conn.close()
     
+    # Bulk version of add_equipment / update_equipment for the inventory import
+    def import_equipment(self, batches):
+        ''' Upserts batches of (codigo, marca_serie, documento_funcionario,
+        nombre_funcionario, descripcion, contenido, sede_id) in one transaction.
+        New items start DISPONIBLE; registered ones keep their status and, when a
+        value is missing in the file, their current value. Items EN USO are on loan
+        and are not touched. Returns (inserted, updated, unchanged, codes en uso) '''
+        lookup = '''
+            SELECT codigo, estado FROM inventario
+            WHERE codigo IN (SELECT value FROM json_each(?))
+        '''
+        # The WHERE of the update skips the items in use and the rows that would not
+        # change, so they are not rewritten
+        upsert = '''
+            INSERT INTO inventario (codigo, marca_serie, documento_funcionario, nombre_funcionario,
+                                    descripcion, contenido, sede_id, estado)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'DISPONIBLE')
+            ON CONFLICT(codigo) DO UPDATE SET
+                marca_serie = COALESCE(excluded.marca_serie, marca_serie),
+                documento_funcionario = COALESCE(excluded.documento_funcionario, documento_funcionario),
+                nombre_funcionario = COALESCE(excluded.nombre_funcionario, nombre_funcionario),
+                descripcion = COALESCE(excluded.descripcion, descripcion),
+                contenido = COALESCE(excluded.contenido, contenido),
+                sede_id = COALESCE(excluded.sede_id, sede_id)
+            WHERE estado != 'EN USO'
+            AND (marca_serie IS NOT COALESCE(excluded.marca_serie, marca_serie)
+                 OR documento_funcionario IS NOT COALESCE(excluded.documento_funcionario, documento_funcionario)
+                 OR nombre_funcionario IS NOT COALESCE(excluded.nombre_funcionario, nombre_funcionario)
+                 OR descripcion IS NOT COALESCE(excluded.descripcion, descripcion)
+                 OR contenido IS NOT COALESCE(excluded.contenido, contenido)
+                 OR sede_id IS NOT COALESCE(excluded.sede_id, sede_id))
+        '''
+        conn = self.db_manager.get_connection()
+        inserted = updated = unchanged = 0
+        in_use = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for batch in batches:
+                if not batch:
+                    continue
+                states = dict(conn.execute(lookup, (json.dumps([row[0] for row in batch]),)).fetchall())
+                rows = []
+                for row in batch:
+                    if states.get(row[0]) == 'EN USO':
+                        in_use.append(row[0])
+                    else:
+                        rows.append(row)
+                # rowcount sums the rows written directly by each statement, not the triggers
+                written = max(conn.executemany(upsert, rows).rowcount, 0) if rows else 0
+                new = sum(1 for row in rows if row[0] not in states)
+                inserted += new
+                updated += written - new
+                unchanged += len(rows) - written
+            conn.commit()
+            return inserted, updated, unchanged, in_use
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f'Database error on inventory import: {e}')
+            raise
+        finally:
+            conn.close()
+
     # Adds an equipment with only the code and a 'DISPONIBLE' status
     def add_blank_equipment(self, codigo):
         conn = self.db_manager.get_connection()
@@ -535,9 +1089,10 @@ class InventoryModel:
         finally:
             conn.close()
 
+@instrumented
 class PersonalLaboratorioModel:
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager or DatabaseManager()
     
     # Retrieves all staff with text-based roles for exporting
     def get_all_personal_for_export(self):
@@ -641,9 +1196,10 @@ class PersonalLaboratorioModel:
         conn.close()
         return personal
 
+@instrumented
 class RoomLoanModel:
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager or DatabaseManager()
 
     # Generates a loan for a student
     def add_loan_student(self, fecha_entrada, laboratorista_id, monitor_id, sala_id, estudiante_id, equipo_codigo, observaciones):
@@ -682,11 +1238,9 @@ class RoomLoanModel:
 
     ''' Fetches all room loans with comprehensive filtering capabilities.
     - sala_filter_id: Filters by a specific room ID. '''
-    def get_room_loans(self, search_term='', user_type_filter='Todos', status_filter='Todos', date_filter=None, sala_filter_id=None):
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        
-        student_query = '''
+    # Student and professor halves of the room loan history, with the filters applied
+    def _room_loan_parts(self, search_term='', user_type_filter='Todos', status_filter='Todos', date_filter=None, sala_filter_id=None):
+        student_columns = '''
             SELECT pse.id, 'Estudiante' as tipo_usuario, e.nombre as usuario_nombre, s.nombre as sala_nombre, 
                    pse.fecha_entrada, pse.hora_salida, pl_lab.nombre as laboratorista, pl_mon.nombre as monitor, 
                    pse.novedad as observaciones, pse.estudiante_id as usuario_id, 'student' as loan_type, 
@@ -694,6 +1248,8 @@ class RoomLoanModel:
                    CASE WHEN pse.hora_salida IS NULL THEN 'En Préstamo' ELSE 'Finalizado' END as estado_prestamo,
                    pse.firma_estudiante,
                    pse.equipo_codigo
+        '''
+        student_from = '''
             FROM prestamos_salas_estudiantes pse
             JOIN estudiantes e ON pse.estudiante_id = e.codigo
             JOIN salas s ON pse.sala_id = s.id
@@ -701,7 +1257,7 @@ class RoomLoanModel:
             LEFT JOIN personal_laboratorio pl_lab ON pse.laboratorista = pl_lab.id
             LEFT JOIN personal_laboratorio pl_mon ON pse.monitor = pl_mon.id
         '''
-        professor_query = '''
+        professor_columns = '''
             SELECT psp.id, 'Profesor' as tipo_usuario, p.nombre as usuario_nombre, s.nombre as sala_nombre,
                    psp.fecha_entrada, psp.hora_salida, pl_lab.nombre as laboratorista, pl_mon.nombre as monitor, 
                    psp.observaciones, psp.profesor_id as usuario_id, 'professor' as loan_type, 
@@ -709,6 +1265,8 @@ class RoomLoanModel:
                    CASE WHEN psp.hora_salida IS NULL THEN 'En Préstamo' ELSE 'Finalizado' END as estado_prestamo,
                    psp.firma_profesor,
                    NULL as equipo_codigo
+        '''
+        professor_from = '''
             FROM prestamos_salas_profesores psp
             JOIN profesores p ON psp.profesor_id = p.cedula
             JOIN salas s ON psp.sala_id = s.id
@@ -723,21 +1281,26 @@ class RoomLoanModel:
 
         if search_term:
             search_like = f'%{search_term}%'
-            student_where.append('(e.nombre LIKE ? OR CAST(e.cedula AS TEXT) LIKE ? OR CAST(e.codigo AS TEXT) LIKE ? OR s.nombre LIKE ? OR CAST(eq.numero_equipo AS TEXT) LIKE ? OR pse.equipo_codigo LIKE ?)')
-            professor_where.append('(p.nombre LIKE ? OR CAST(p.cedula AS TEXT) LIKE ? OR s.nombre LIKE ?)')
-            student_params.extend([search_like, search_like, search_like, search_like, search_like, search_like])
-            professor_params.extend([search_like, search_like, search_like])
-
-        status_map = {'En Préstamo': 'IS NULL', 'Finalizado': 'IS NOT NULL'}
+            # People names through their folded copy, so accents and case don't matter
+            student_where.append('(e.nombre_busqueda LIKE ? OR CAST(e.cedula AS TEXT) LIKE ? OR CAST(e.codigo AS TEXT) LIKE ? OR s.nombre LIKE ? OR CAST(eq.numero_equipo AS TEXT) LIKE ? OR pse.equipo_codigo LIKE ?)')
+            professor_where.append('(p.nombre_busqueda LIKE ? OR CAST(p.cedula AS TEXT) LIKE ? OR s.nombre LIKE ?)')
+            student_params.extend([folded_like(search_term), search_like, search_like, search_like, search_like, search_like])
+            professor_params.extend([folded_like(search_term), search_like, search_like])
+
+        # abierto is hora_salida IS NULL, stored in the history index
+        status_map = {'En Préstamo': 1, 'Finalizado': 0}
         if status_filter in status_map:
-            student_where.append(f'pse.hora_salida {status_map[status_filter]}')
-            professor_where.append(f'psp.hora_salida {status_map[status_filter]}')
+            student_where.append('pse.abierto = ?')
+            professor_where.append('psp.abierto = ?')
+            student_params.append(status_map[status_filter])
+            professor_params.append(status_map[status_filter])
         
         if date_filter:
-            student_where.append('DATE(pse.fecha_entrada) = ?')
-            professor_where.append('DATE(psp.fecha_entrada) = ?')
-            student_params.append(date_filter)
-            professor_params.append(date_filter)
+            # A range instead of DATE(fecha_entrada) = ? so the date index can be used
+            student_where.append("pse.fecha_entrada >= ? AND pse.fecha_entrada < DATE(?, '+1 day')")
+            professor_where.append("psp.fecha_entrada >= ? AND psp.fecha_entrada < DATE(?, '+1 day')")
+            student_params.extend([date_filter, date_filter])
+            professor_params.extend([date_filter, date_filter])
 
         if sala_filter_id:
             student_where.append('pse.sala_id = ?')
@@ -745,32 +1308,39 @@ class RoomLoanModel:
             student_params.append(sala_filter_id)
             professor_params.append(sala_filter_id)
 
-        if student_where:
-            student_query += ' WHERE ' + ' AND '.join(student_where)
-        if professor_where:
-            professor_query += ' WHERE ' + ' AND '.join(professor_where)
-
-        queries_to_run = []
+        student_part = HistoryPart('student', 'pse', student_columns, student_from, student_where, student_params)
+        professor_part = HistoryPart('professor', 'psp', professor_columns, professor_from, professor_where, professor_params)
         if user_type_filter == 'Estudiante':
-            queries_to_run.append((student_query, student_params))
+            return [student_part]
         elif user_type_filter == 'Profesor':
-            queries_to_run.append((professor_query, professor_params))
+            return [professor_part]
         else: # 'Todos'
-            queries_to_run.append((student_query, student_params))
-            queries_to_run.append((professor_query, professor_params))
-
-        all_loans = []
-        for query, params in queries_to_run:
-            try:
-                cursor.execute(query, params)
-                all_loans.extend(cursor.fetchall())
-            except sqlite3.Error as e:
-                print(f'Database error on room loan fetch: {e}')
+            return [student_part, professor_part]
 
-        conn.close()
-        # Ordenar primero por estado (activos primero) y luego por fecha_entrada (más reciente primero)
-        all_loans.sort(key=lambda x: (x[5] is not None, x[4]), reverse=False)
-        return all_loans
+    # Every room loan matching the filters: active loans first, then the most recent
+    def get_room_loans(self, search_term='', user_type_filter='Todos', status_filter='Todos', date_filter=None, sala_filter_id=None):
+        parts = self._room_loan_parts(search_term, user_type_filter, status_filter, date_filter, sala_filter_id)
+        loans, _ = fetch_history_page(self.db_manager, parts, 'fecha_entrada', 4, 10, page_size=None)
+        return loans
+
+    # One page of the room loan history, in the same order as get_room_loans.
+    # Returns (loans, next_cursor); pass next_cursor back to get the following page,
+    # it is None once there are no more rows
+    def get_room_loans_page(self, search_term='', user_type_filter='Todos', status_filter='Todos', date_filter=None,
+                            sala_filter_id=None, page_size=HISTORY_PAGE_SIZE, cursor=None):
+        parts = self._room_loan_parts(search_term, user_type_filter, status_filter, date_filter, sala_filter_id)
+        return fetch_history_page(self.db_manager, parts, 'fecha_entrada', 4, 10, page_size, cursor)
+
+    # The whole room loan history in chunks of rows, for exports
+    def iter_room_loans(self, search_term='', user_type_filter='Todos', status_filter='Todos', date_filter=None,
+                        sala_filter_id=None, chunk_size=HISTORY_CHUNK_SIZE):
+        parts = self._room_loan_parts(search_term, user_type_filter, status_filter, date_filter, sala_filter_id)
+        return iter_history(self.db_manager, parts, 'fecha_entrada', chunk_size)
+
+    # Number of room loans matching the filters
+    def count_room_loans(self, search_term='', user_type_filter='Todos', status_filter='Todos', date_filter=None, sala_filter_id=None):
+        parts = self._room_loan_parts(search_term, user_type_filter, status_filter, date_filter, sala_filter_id)
+        return count_history(self.db_manager, parts)
 
     # Fetches a specific room loan
     def get_room_loan_details(self, loan_id, loan_type):
@@ -871,10 +1441,11 @@ class RoomLoanModel:
         finally:
             conn.close()
 
+@instrumented
 class EquipmentLoanModel:
-    def __init__(self):
-        self.db_manager = DatabaseManager()
-        self.inventory_model = InventoryModel()  # Agregamos referencia al modelo de inventario
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager or DatabaseManager()
+        self.inventory_model = InventoryModel(self.db_manager)  # Agregamos referencia al modelo de inventario
 
     def add_loan_student(self, fecha_entrega, equipo_codigo, laboratorista_entrega_id, monitor_entrega_id,
                          estudiante_id, numero_estudiantes, sala_id, titulo_practica, observaciones):
@@ -934,14 +1505,9 @@ class EquipmentLoanModel:
         finally:
             conn.close()
 
-    def get_equipment_loans(self, search_term='', user_type_filter='Todos', status_filter='Todos'):
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        
-        queries = []
-        
-        # Base student query with all necessary joins
-        student_base_query = '''
+    # Student and professor halves of the equipment loan history, with the filters applied
+    def _equipment_loan_parts(self, search_term='', user_type_filter='Todos', status_filter='Todos'):
+        student_columns = '''
             SELECT pee.id, 'Estudiante' as tipo_usuario, e.nombre as usuario_nombre, inv.descripcion as equipo_desc,
                    pee.fecha_entrega, pee.fecha_devolucion, 
                    pl_ent.nombre as laboratorista_entrega, pm_ent.nombre as monitor_entrega,
@@ -949,6 +1515,8 @@ class EquipmentLoanModel:
                    pee.titulo_practica, CASE pee.estado WHEN 1 THEN 'En Préstamo' ELSE 'Devuelto' END as estado_prestamo,
                    pee.observaciones, pee.estudiante_id as usuario_id, 'student' as loan_type, pee.equipo_codigo, pee.sala_id,
                    pee.documento_devolvente as firma
+        '''
+        student_from = '''
             FROM prestamos_equipos_estudiantes pee
             JOIN estudiantes e ON pee.estudiante_id = e.codigo
             JOIN inventario inv ON pee.equipo_codigo = inv.codigo
@@ -957,9 +1525,8 @@ class EquipmentLoanModel:
             LEFT JOIN personal_laboratorio pl_dev ON pee.laboratorista_devolucion = pl_dev.id
             LEFT JOIN personal_laboratorio pm_dev ON pee.monitor_devolucion = pm_dev.id
         '''
-        
-        # Base professor query with all necessary joins
-        professor_base_query = '''
+
+        professor_columns = '''
             SELECT pep.id, 'Profesor' as tipo_usuario, p.nombre as usuario_nombre, inv.descripcion as equipo_desc,
                    pep.fecha_entrega, pep.fecha_devolucion,
                    pl_ent.nombre as laboratorista_entrega, pm_ent.nombre as monitor_entrega,
@@ -967,6 +1534,8 @@ class EquipmentLoanModel:
                    pep.titulo_practica, CASE pep.estado WHEN 1 THEN 'En Préstamo' ELSE 'Devuelto' END as estado_prestamo,
                    pep.observaciones, pep.profesor_id as usuario_id, 'professor' as loan_type, pep.equipo_codigo, pep.sala_id,
                    pep.documento_devolvente as firma
+        '''
+        professor_from = '''
             FROM prestamos_equipos_profesores pep
             JOIN profesores p ON pep.profesor_id = p.cedula
             JOIN inventario inv ON pep.equipo_codigo = inv.codigo
@@ -975,62 +1544,63 @@ class EquipmentLoanModel:
             LEFT JOIN personal_laboratorio pl_dev ON pep.laboratorista_devolucion = pl_dev.id
             LEFT JOIN personal_laboratorio pm_dev ON pep.monitor_devolucion = pm_dev.id
         '''
-        
-        # Dynamically build WHERE clauses based on filters
-        student_where_clauses = []
-        professor_where_clauses = []
+
+        student_where = []
+        professor_where = []
         student_params = []
         professor_params = []
 
         if search_term:
             search_like = f'%{search_term}%'
-            student_where_clauses.append('(e.nombre LIKE ? OR CAST(e.cedula AS TEXT) LIKE ? OR CAST(e.codigo AS TEXT) LIKE ? OR inv.descripcion LIKE ? OR inv.codigo LIKE ? OR pee.titulo_practica LIKE ?)')
-            professor_where_clauses.append('(p.nombre LIKE ? OR CAST(p.cedula AS TEXT) LIKE ? OR inv.descripcion LIKE ? OR inv.codigo LIKE ? OR pep.titulo_practica LIKE ?)')
-            student_params.extend([search_like, search_like, search_like, search_like, search_like, search_like])
-            professor_params.extend([search_like, search_like, search_like, search_like, search_like])
-
+            folded = folded_like(search_term)
+            # Names and descriptions through their folded copy, so accents and case don't matter
+            student_where.append('(e.nombre_busqueda LIKE ? OR CAST(e.cedula AS TEXT) LIKE ? OR CAST(e.codigo AS TEXT) LIKE ? OR inv.descripcion_busqueda LIKE ? OR inv.codigo LIKE ? OR pee.titulo_practica LIKE ?)')
+            professor_where.append('(p.nombre_busqueda LIKE ? OR CAST(p.cedula AS TEXT) LIKE ? OR inv.descripcion_busqueda LIKE ? OR inv.codigo LIKE ? OR pep.titulo_practica LIKE ?)')
+            student_params.extend([folded, search_like, search_like, folded, search_like, search_like])
+            professor_params.extend([folded, search_like, folded, search_like, search_like])
+
+        # abierto is fecha_devolucion IS NULL, stored in the history index; estado
+        # follows it (the return sets both)
         status_map = {'En Préstamo': 1, 'Devuelto': 0}
         if status_filter in status_map:
             status_val = status_map[status_filter]
-            student_where_clauses.append('pee.estado = ?')
-            professor_where_clauses.append('pep.estado = ?')
+            student_where.append('pee.abierto = ?')
+            professor_where.append('pep.abierto = ?')
             student_params.append(status_val)
             professor_params.append(status_val)
-        
-        # Construct the final queries with WHERE clauses if they exist
-        student_query = student_base_query
-        if student_where_clauses:
-            student_query += ' WHERE ' + ' AND '.join(student_where_clauses)
-
-        professor_query = professor_base_query
-        if professor_where_clauses:
-            professor_query += ' WHERE ' + ' AND '.join(professor_where_clauses)
-            
-        # Decide which queries to execute based on the user type filter
+
+        student_part = HistoryPart('student', 'pee', student_columns, student_from, student_where, student_params)
+        professor_part = HistoryPart('professor', 'pep', professor_columns, professor_from, professor_where, professor_params)
         if user_type_filter == 'Estudiante':
-            queries.append((student_query, student_params))
+            return [student_part]
         elif user_type_filter == 'Profesor':
-            queries.append((professor_query, professor_params))
+            return [professor_part]
         else:  # 'Todos'
-            queries.append((student_query, student_params))
-            queries.append((professor_query, professor_params))
-
-        all_loans = []
-        for query, param_list in queries:
-            try:
-                cursor.execute(query, param_list)
-                all_loans.extend(cursor.fetchall())
-            except sqlite3.Error as e:
-                print(f'Database error: {e}')
-                print(f'Query: {query}')
-                print(f'Params: {param_list}')
-                
-        conn.close()
-        
-        # Ordenar primero por estado (activos primero) y luego por fecha_entrega (más reciente primero)
-        all_loans.sort(key=lambda x: (x[5] is not None, x[4] or ''), reverse=False)
-        
-        return all_loans
+            return [student_part, professor_part]
+
+    # Every equipment loan matching the filters: pending returns first, then the most recent
+    def get_equipment_loans(self, search_term='', user_type_filter='Todos', status_filter='Todos'):
+        parts = self._equipment_loan_parts(search_term, user_type_filter, status_filter)
+        loans, _ = fetch_history_page(self.db_manager, parts, 'fecha_entrega', 4, 14, page_size=None)
+        return loans
+
+    # One page of the equipment loan history, in the same order as get_equipment_loans.
+    # Returns (loans, next_cursor); next_cursor is None on the last page
+    def get_equipment_loans_page(self, search_term='', user_type_filter='Todos', status_filter='Todos',
+                                 page_size=HISTORY_PAGE_SIZE, cursor=None):
+        parts = self._equipment_loan_parts(search_term, user_type_filter, status_filter)
+        return fetch_history_page(self.db_manager, parts, 'fecha_entrega', 4, 14, page_size, cursor)
+
+    # The whole equipment loan history in chunks of rows, for exports
+    def iter_equipment_loans(self, search_term='', user_type_filter='Todos', status_filter='Todos',
+                             chunk_size=HISTORY_CHUNK_SIZE):
+        parts = self._equipment_loan_parts(search_term, user_type_filter, status_filter)
+        return iter_history(self.db_manager, parts, 'fecha_entrega', chunk_size)
+
+    # Number of equipment loans matching the filters
+    def count_equipment_loans(self, search_term='', user_type_filter='Todos', status_filter='Todos'):
+        parts = self._equipment_loan_parts(search_term, user_type_filter, status_filter)
+        return count_history(self.db_manager, parts)
 
     def get_equipment_loan_details(self, loan_id, loan_type):
         conn = self.db_manager.get_connection()
@@ -1167,11 +1737,12 @@ class EquipmentLoanModel:
         finally:
             conn.close()
 
+@instrumented
 class EquiposModel:
     ''' Manages database operations for the 'equipos' table, which represents
     equipment located within specific rooms (salas) '''
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager or DatabaseManager()
     
     # Retrieves all room equipment with text-based status for exporting
     def get_all_equipos_for_export(self):
@@ -1307,9 +1878,10 @@ class EquiposModel:
         finally:
             conn.close()
 
+@instrumented
 class ProyectosCurricularesModel:
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager or DatabaseManager()
 
     def get_all_proyectos(self, search_term=''):
         conn = self.db_manager.get_connection()
@@ -1363,9 +1935,10 @@ class ProyectosCurricularesModel:
         finally:
             conn.close()
 
+@instrumented
 class SedesModel:
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager or DatabaseManager()
 
     # Retrieves all campus locations (sedes), with an optional search filter.
     def get_all_sedes(self, search_term=''):
@@ -1419,26 +1992,18 @@ class SedesModel:
         finally:
             conn.close()
 
+@instrumented
 class DashboardModel:
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager or DatabaseManager()
 
     def get_room_metrics(self):
         conn = self.db_manager.get_connection()
         cursor = conn.cursor()
         try:
-            cursor.execute('SELECT COUNT(*) FROM salas')
-            total_rooms = cursor.fetchone()[0]
-            cursor.execute('''
-                SELECT COUNT(DISTINCT sala_id) FROM (
-                    SELECT sala_id FROM prestamos_salas_profesores 
-                    WHERE hora_salida IS NULL
-                    UNION
-                    SELECT sala_id FROM prestamos_salas_estudiantes 
-                    WHERE hora_salida IS NULL
-                )
-            ''')
-            occupied_rooms = cursor.fetchone()[0]
+            # Occupancy is maintained on salas by the room loan triggers
+            cursor.execute('SELECT COUNT(*), COALESCE(SUM(prestamos_activos > 0), 0) FROM salas')
+            total_rooms, occupied_rooms = cursor.fetchone()
             available_rooms = total_rooms - occupied_rooms
             return {
                 'total': total_rooms,
@@ -1556,4 +2121,113 @@ class DashboardModel:
                 'review': review_equipment
             }
         finally:
-            conn.close()
\ No newline at end of file
+            conn.close()
+
+@instrumented
+class ChangeLogModel:
+    ''' Reads the cambios log kept by the change tracking triggers, for the
+    incremental export. A watermark is the id of the last change included '''
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager or DatabaseManager()
+
+    def _key(self, table):
+        # Table names go into the SQL, only the tracked ones are accepted
+        if table not in TRACKED_TABLES:
+            raise ValueError(f'Table {table!r} is not tracked')
+        return TRACKED_TABLES[table]
+
+    def get_current_change(self):
+        conn = self.db_manager.get_connection()
+        try:
+            return conn.execute(CURRENT_CHANGE_SQL).fetchone()[0]
+        finally:
+            conn.close()
+
+    # Watermark of the last incremental export, or None if there was none
+    def get_last_export(self):
+        conn = self.db_manager.get_connection()
+        try:
+            return conn.execute('SELECT MAX(hasta_cambio) FROM exportaciones').fetchone()[0]
+        finally:
+            conn.close()
+
+    def record_export(self, since, until, archivo=None):
+        conn = self.db_manager.get_connection()
+        try:
+            conn.execute(
+                'INSERT INTO exportaciones (desde_cambio, hasta_cambio, archivo) VALUES (?, ?, ?)',
+                (since, until, archivo)
+            )
+            conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f'Error recording export: {e}')
+            return False
+        finally:
+            conn.close()
+
+    # Deletes the changes up to the watermark until, already exported. Returns the
+    # number of entries removed, or None on error
+    def prune_changes(self, until):
+        conn = self.db_manager.get_connection()
+        try:
+            removed = conn.execute('DELETE FROM cambios WHERE id <= ?', (until,)).rowcount
+            conn.commit()
+            return removed
+        except sqlite3.Error as e:
+            print(f'Error pruning the change log: {e}')
+            return None
+        finally:
+            conn.close()
+
+    # Stored columns of a table, without the generated ones
+    def get_columns(self, table):
+        self._key(table)
+        conn = self.db_manager.get_connection()
+        try:
+            return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+        finally:
+            conn.close()
+
+    def _stream(self, query, params, chunk_size):
+        conn = self.db_manager.get_connection()
+        db_cursor = conn.cursor()
+        try:
+            db_cursor.execute(query, params)
+            while True:
+                rows = db_cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            db_cursor.close()
+            conn.close()
+
+    def iter_rows(self, table, chunk_size=HISTORY_CHUNK_SIZE):
+        ''' Streams every row of a table, in key order '''
+        key = self._key(table)
+        columns = ', '.join(self.get_columns(table))
+        return self._stream(f'SELECT {columns} FROM {table} ORDER BY {key}', (), chunk_size)
+
+    def iter_changed_rows(self, table, since, until, chunk_size=HISTORY_CHUNK_SIZE):
+        ''' Streams the current version of the rows inserted or updated after the
+        watermark since, up to until. Rows deleted meanwhile are not there '''
+        key = self._key(table)
+        columns = ', '.join(self.get_columns(table))
+        query = f'''
+            SELECT {columns} FROM {table}
+            WHERE {key} IN (SELECT clave FROM cambios WHERE tabla = ? AND id > ? AND id <= ?)
+            ORDER BY {key}
+        '''
+        return self._stream(query, (table, since, until), chunk_size)
+
+    def iter_deleted_keys(self, table, since, until, chunk_size=HISTORY_CHUNK_SIZE):
+        ''' Streams the keys changed after since, up to until, that no longer exist '''
+        key = self._key(table)
+        query = f'''
+            SELECT DISTINCT clave FROM cambios c
+            WHERE tabla = ? AND id > ? AND id <= ?
+            AND NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{key} = c.clave)
+            ORDER BY clave
+        '''
+        return self._stream(query, (table, since, until), chunk_size)
@@ -0,0 +1,400 @@
+''' Query plan check for the models. Runs the model methods against a scratch
+database, captures every statement they send to SQLite and checks its
+EXPLAIN QUERY PLAN: the indexes each call is expected to use must appear, and no
+loan table may be read with a full table scan unless the call lists the whole
+history on purpose. Every public method of the models needs at least one entry
+in _model_calls, the check fails for the ones left out.
+
+Usage: python -m database.query_plans
+'''
+import inspect
+import os
+import re
+import sys
+import sqlite3
+import tempfile
+from .connection import DatabaseManager
+from . import models as models_module
+from .models import (StudentModel, ProfesorModel, RoomModel, InventoryModel, PersonalLaboratorioModel,
+                     RoomLoanModel, EquipmentLoanModel, EquiposModel, ProyectosCurricularesModel,
+                     SedesModel, DashboardModel, ChangeLogModel, import_loan_history)
+
+# Loan tables and the aliases the models give them
+LOAN_TABLES = {
+    'prestamos_salas_estudiantes', 'prestamos_salas_profesores',
+    'prestamos_equipos_estudiantes', 'prestamos_equipos_profesores',
+    'pse', 'psp', 'pee', 'pep',
+}
+
+# Statements worth explaining. Trigger bodies (-- TRIGGER), pragmas and the
+# pool health check are left out
+PLANNED_STATEMENT = re.compile(r'^\s*(SELECT|WITH|UPDATE|DELETE|INSERT)\b', re.IGNORECASE)
+HEALTH_CHECK = 'SELECT 1'
+# The staging tables of the imports are replayed on the EXPLAIN connection, the
+# temp schema is private to each connection
+TEMP_TABLE = re.compile(r'^\s*CREATE TEMP TABLE\b', re.IGNORECASE)
+
+# Model methods that send no statement worth explaining (only a pragma)
+UNPLANNED_METHODS = {'ChangeLogModel.get_columns'}
+
+# (name, call, indexes the plan must use, full scan of a loan table allowed)
+def _model_calls(m):
+    return [
+        ('StudentModel.get_all_students', lambda: m['students'].get_all_students('Pérez'),
+         {'estudiantes_fts'}, False),
+        ('ProfesorModel.get_all_profesores', lambda: m['profesores'].get_all_profesores('200'),
+         {'profesores_fts'}, False),
+        ('InventoryModel.get_all_equipment', lambda: m['inventory'].get_all_equipment('Osci'),
+         {'inventario_fts'}, False),
+        ('StudentModel.get_student_by_code_or_id', lambda: m['students'].get_student_by_code_or_id(1001),
+         {'idx_estudiantes_cedula'}, False),
+        ('StudentModel.get_students_by_partial_query', lambda: m['students'].get_students_by_partial_query('An'),
+         {'idx_estudiantes_nombre_busqueda'}, False),
+        ('StudentModel.get_students_by_partial_query (fts)', lambda: m['students'].get_students_by_partial_query('Ana'),
+         {'estudiantes_fts'}, False),
+        ('StudentModel.delete_student', lambda: m['students'].delete_student(-1),
+         set(), False),
+        ('ProfesorModel.get_professor_by_id', lambda: m['profesores'].get_professor_by_id(2001),
+         set(), False),
+        ('ProfesorModel.get_professors_by_partial_query', lambda: m['profesores'].get_professors_by_partial_query('Lu'),
+         {'idx_profesores_nombre_busqueda'}, False),
+        ('ProfesorModel.get_professors_by_partial_query (fts)', lambda: m['profesores'].get_professors_by_partial_query('Luis'),
+         {'profesores_fts'}, False),
+        ('RoomModel.get_all_rooms_with_status', lambda: m['rooms'].get_all_rooms_with_status(),
+         {'idx_salas_nombre'}, False),
+        ('RoomModel.get_available_rooms_for_dropdown', lambda: m['rooms'].get_available_rooms_for_dropdown(),
+         {'idx_salas_nombre'}, False),
+        ('RoomModel.rebuild_occupancy', lambda: m['rooms'].rebuild_occupancy(),
+         {'idx_pse_abiertos', 'idx_psp_abiertos'}, False),
+        ('RoomModel.get_room_by_code', lambda: m['rooms'].get_room_by_code('S-01'),
+         {'idx_salas_codigo_interno'}, False),
+        ('RoomModel.update_room', lambda: m['rooms'].update_room('S-99', 'Sin cambios'),
+         {'idx_salas_codigo_interno'}, False),
+        ('InventoryModel.get_equipment_by_code', lambda: m['inventory'].get_equipment_by_code('INV-1'),
+         {'sqlite_autoindex_inventario_1'}, False),
+        ('InventoryModel.get_available_equipment_for_dropdown', lambda: m['inventory'].get_available_equipment_for_dropdown(),
+         {'idx_inventario_estado'}, False),
+        ('InventoryModel.get_equipment_by_partial_code', lambda: m['inventory'].get_equipment_by_partial_code('INV'),
+         {'idx_inventario_estado'}, False),
+        ('EquiposModel.get_equipo_by_identifier', lambda: m['equipos'].get_equipo_by_identifier(1, numero_equipo=1),
+         {'idx_equipos_sala_numero'}, False),
+        ('RoomLoanModel.get_room_loans (sala)', lambda: m['room_loans'].get_room_loans(sala_filter_id=1),
+         {'idx_pse_sala', 'idx_psp_sala'}, False),
+        ('RoomLoanModel.get_room_loans (fecha)', lambda: m['room_loans'].get_room_loans(date_filter='2024-03-01'),
+         {'idx_pse_fecha', 'idx_psp_fecha'}, False),
+        ('RoomLoanModel.get_room_loans (en préstamo)', lambda: m['room_loans'].get_room_loans(status_filter='En Préstamo'),
+         {'idx_pse_historial', 'idx_psp_historial'}, False),
+        ('RoomLoanModel.get_room_loans (todos)', lambda: m['room_loans'].get_room_loans(),
+         set(), True),
+        ('RoomLoanModel.get_room_loans (búsqueda)', lambda: m['room_loans'].get_room_loans(search_term='Ana'),
+         set(), True),
+        ('RoomLoanModel.get_room_loans_page', lambda: m['room_loans'].get_room_loans_page(page_size=50),
+         {'idx_pse_historial', 'idx_psp_historial'}, False),
+        ('RoomLoanModel.get_room_loans_page (cursor)', lambda: m['room_loans'].get_room_loans_page(
+            page_size=50, cursor=(0, '2024-03-01 10:00:00', 'professor', 1)),
+         {'idx_pse_historial', 'idx_psp_historial'}, False),
+        ('RoomLoanModel.count_room_loans (en préstamo)', lambda: m['room_loans'].count_room_loans(status_filter='En Préstamo'),
+         {'idx_pse_historial', 'idx_psp_historial'}, False),
+        ('RoomLoanModel.get_room_loan_details', lambda: m['room_loans'].get_room_loan_details(1, 'student'),
+         set(), False),
+        ('EquipmentLoanModel.get_equipment_loans', lambda: m['equipment_loans'].get_equipment_loans(),
+         set(), True),
+        ('EquipmentLoanModel.get_equipment_loans_page', lambda: m['equipment_loans'].get_equipment_loans_page(
+            page_size=50, cursor=(0, '2024-03-01 10:00:00', 'professor', 1)),
+         {'idx_pee_historial', 'idx_pep_historial'}, False),
+        ('EquipmentLoanModel.get_equipment_loan_details', lambda: m['equipment_loans'].get_equipment_loan_details(1, 'professor'),
+         set(), False),
+        ('DashboardModel.get_room_metrics', lambda: m['dashboard'].get_room_metrics(),
+         set(), False),
+        ('DashboardModel.get_equipment_metrics', lambda: m['dashboard'].get_equipment_metrics(),
+         {'idx_inventario_estado'}, False),
+        ('DashboardModel.get_active_loans', lambda: m['dashboard'].get_active_loans(),
+         {'idx_pee_abiertos', 'idx_pep_abiertos', 'idx_pse_abiertos_fecha', 'idx_psp_abiertos_fecha'}, False),
+        ('DashboardModel.get_alerts', lambda: m['dashboard'].get_alerts(),
+         {'idx_inventario_estado', 'idx_pep_devolucion'}, False),
+
+        ('StudentModel.get_curriculum_projects', lambda: m['students'].get_curriculum_projects(),
+         set(), False),
+        ('StudentModel.add_student', lambda: m['students'].add_student(1002, 'Carlos Ruiz', 56, 1),
+         set(), False),
+        ('StudentModel.import_students', lambda: m['students'].import_students([[(1003, 'Marta Díaz', 57, 1)]]),
+         set(), False),
+        ('StudentModel.sync_students', lambda: m['students'].sync_students(
+            [[(1001, 'Ana Pérez', 55, 1), (1002, 'Carlos Ruiz', 58, None), (1004, 'Eva Luna', None, 1)]], apply=True),
+         set(), False),
+        ('StudentModel.add_blank_student', lambda: m['students'].add_blank_student(1005),
+         set(), False),
+        ('StudentModel.update_student', lambda: m['students'].update_student(1005, 'Iván Mora', 59, 1),
+         set(), False),
+        ('ProfesorModel.get_curriculum_projects', lambda: m['profesores'].get_curriculum_projects(),
+         set(), False),
+        ('ProfesorModel.add_profesor', lambda: m['profesores'].add_profesor(2002, 'Sara Vega', 1),
+         set(), False),
+        ('ProfesorModel.import_profesores', lambda: m['profesores'].import_profesores([[(2003, 'Raúl Paz', 1)]]),
+         set(), False),
+        ('ProfesorModel.add_blank_profesor', lambda: m['profesores'].add_blank_profesor(2004),
+         set(), False),
+        ('ProfesorModel.update_profesor', lambda: m['profesores'].update_profesor(2004, 'Nora Gil', 1),
+         set(), False),
+        ('ProfesorModel.delete_profesor', lambda: m['profesores'].delete_profesor(-1),
+         set(), False),
+        ('RoomModel.get_all_rooms_with_id_for_dropdown', lambda: m['rooms'].get_all_rooms_with_id_for_dropdown(),
+         {'idx_salas_nombre'}, False),
+        ('RoomModel.get_room_keys', lambda: m['rooms'].get_room_keys(),
+         set(), False),
+        ('RoomModel.add_room', lambda: m['rooms'].add_room('S-03', 'Laboratorio 3'),
+         set(), False),
+        ('RoomModel.delete_room', lambda: m['rooms'].delete_room('S-03'),
+         {'idx_salas_codigo_interno'}, False),
+        ('InventoryModel.add_equipment', lambda: m['inventory'].add_equipment(
+            'INV-3', 'Fluke', 55, 'Ana', 'Fuente', '', 'DISPONIBLE', 1),
+         set(), False),
+        ('InventoryModel.import_equipment', lambda: m['inventory'].import_equipment(
+            [[('INV-3', 'Fluke 2', None, None, None, None, None), ('INV-4', None, None, None, 'Generador', None, 1)]]),
+         {'sqlite_autoindex_inventario_1'}, False),
+        ('InventoryModel.add_blank_equipment', lambda: m['inventory'].add_blank_equipment('INV-5'),
+         set(), False),
+        ('InventoryModel.update_equipment', lambda: m['inventory'].update_equipment(
+            'INV-5', None, None, None, 'Protoboard', None, 'DISPONIBLE', 1),
+         {'sqlite_autoindex_inventario_1'}, False),
+        ('InventoryModel.get_all_equipment_for_dropdown', lambda: m['inventory'].get_all_equipment_for_dropdown(),
+         {'sqlite_autoindex_inventario_1'}, False),
+        ('InventoryModel.get_sedes', lambda: m['inventory'].get_sedes(),
+         set(), False),
+        ('InventoryModel.check_equipment_availability', lambda: m['inventory'].check_equipment_availability('INV-1'),
+         {'sqlite_autoindex_inventario_1'}, False),
+        ('InventoryModel.update_equipment_status', lambda: m['inventory'].update_equipment_status('INV-2', 'DAÑADO'),
+         {'sqlite_autoindex_inventario_1'}, False),
+        ('InventoryModel.delete_equipment', lambda: m['inventory'].delete_equipment('INV-5'),
+         {'sqlite_autoindex_inventario_1'}, False),
+        ('PersonalLaboratorioModel.get_all_personal_for_export', lambda: m['personal'].get_all_personal_for_export(),
+         set(), False),
+        ('PersonalLaboratorioModel.get_cargos', lambda: m['personal'].get_cargos(),
+         set(), False),
+        ('PersonalLaboratorioModel.get_all_personal', lambda: m['personal'].get_all_personal('Lab', 'Laboratorista'),
+         set(), False),
+        ('PersonalLaboratorioModel.get_laboratoristas', lambda: m['personal'].get_laboratoristas(),
+         set(), False),
+        ('PersonalLaboratorioModel.get_monitores', lambda: m['personal'].get_monitores(),
+         set(), False),
+        ('PersonalLaboratorioModel.add_personal', lambda: m['personal'].add_personal('Auxiliar', 1),
+         set(), False),
+        ('PersonalLaboratorioModel.update_personal', lambda: m['personal'].update_personal(3, 'Auxiliar', 0),
+         set(), False),
+        ('PersonalLaboratorioModel.delete_personal', lambda: m['personal'].delete_personal(3),
+         set(), False),
+        ('EquiposModel.get_all_equipos_for_export', lambda: m['equipos'].get_all_equipos_for_export(),
+         set(), False),
+        ('EquiposModel.get_all_equipos', lambda: m['equipos'].get_all_equipos('PC'),
+         set(), False),
+        ('EquiposModel.get_all_equipos (sala)', lambda: m['equipos'].get_all_equipos(sala_filter_id=1, status_filter=1),
+         {'idx_equipos_sala_numero'}, False),
+        ('EquiposModel.get_equipo_by_code', lambda: m['equipos'].get_equipo_by_code('PC-1'),
+         {'sqlite_autoindex_equipos_1'}, False),
+        ('EquiposModel.add_equipo', lambda: m['equipos'].add_equipo('PC-2', 1, 2, 'PC', 1, ''),
+         set(), False),
+        ('EquiposModel.update_equipo', lambda: m['equipos'].update_equipo('PC-2', 1, 2, 'PC portátil', 1, ''),
+         {'sqlite_autoindex_equipos_1'}, False),
+        ('EquiposModel.delete_equipo', lambda: m['equipos'].delete_equipo('PC-2'),
+         {'sqlite_autoindex_equipos_1'}, False),
+        ('ProyectosCurricularesModel.get_all_proyectos', lambda: m['proyectos'].get_all_proyectos('Ing'),
+         set(), False),
+        ('ProyectosCurricularesModel.add_proyecto', lambda: m['proyectos'].add_proyecto('Ingeniería Industrial'),
+         set(), False),
+        ('ProyectosCurricularesModel.update_proyecto', lambda: m['proyectos'].update_proyecto(2, 'Ingeniería de Sistemas'),
+         set(), False),
+        ('ProyectosCurricularesModel.delete_proyecto', lambda: m['proyectos'].delete_proyecto(2),
+         set(), False),
+        ('SedesModel.get_all_sedes', lambda: m['sedes'].get_all_sedes('Sede'),
+         set(), False),
+        ('SedesModel.add_sede', lambda: m['sedes'].add_sede('Sede Norte'),
+         set(), False),
+        ('SedesModel.update_sede', lambda: m['sedes'].update_sede(2, 'Sede Sur'),
+         set(), False),
+        ('SedesModel.delete_sede', lambda: m['sedes'].delete_sede(2),
+         set(), False),
+
+        # Loan life cycle: the counter opens a loan, closes it and it is corrected or deleted
+        ('RoomLoanModel.add_loan_student', lambda: m['room_loans'].add_loan_student(
+            '2024-03-02 08:00:00', 1, 2, 2, 1002, None, ''),
+         set(), False),
+        ('RoomLoanModel.add_loan_professor', lambda: m['room_loans'].add_loan_professor(
+            '2024-03-02 09:00:00', 1, 2, 2, 2002, ''),
+         set(), False),
+        ('RoomLoanModel.update_room_loan_exit', lambda: m['room_loans'].update_room_loan_exit(
+            2, 'student', '10:00:00', 'Sin novedad'),
+         set(), False),
+        ('RoomLoanModel.update_room_loan', lambda: m['room_loans'].update_room_loan(
+            2, 'professor', {'hora_salida': '11:00:00'}),
+         set(), False),
+        ('RoomLoanModel.iter_room_loans', lambda: list(m['room_loans'].iter_room_loans(chunk_size=1)),
+         set(), True),
+        ('RoomLoanModel.delete_loan', lambda: m['room_loans'].delete_loan(2, 'student'),
+         set(), False),
+        ('EquipmentLoanModel.add_loan_student', lambda: m['equipment_loans'].add_loan_student(
+            '2024-03-02 08:00:00', 'INV-1', 1, 2, 1002, 3, 1, 'Osciladores', ''),
+         {'sqlite_autoindex_inventario_1'}, False),
+        ('EquipmentLoanModel.add_loan_professor', lambda: m['equipment_loans'].add_loan_professor(
+            '2024-03-02 09:00:00', 'INV-3', 1, 2, 2002, 1, 'Filtros', ''),
+         {'sqlite_autoindex_inventario_1'}, False),
+        ('EquipmentLoanModel.count_equipment_loans', lambda: m['equipment_loans'].count_equipment_loans(),
+         set(), True),
+        ('EquipmentLoanModel.count_equipment_loans (en préstamo)',
+         lambda: m['equipment_loans'].count_equipment_loans(status_filter='En Préstamo'),
+         {'idx_pee_historial', 'idx_pep_historial'}, False),
+        ('EquipmentLoanModel.iter_equipment_loans', lambda: list(m['equipment_loans'].iter_equipment_loans(chunk_size=1)),
+         set(), True),
+        ('EquipmentLoanModel.update_equipment_loan_return', lambda: m['equipment_loans'].update_equipment_loan_return(
+            1, 'student', '2024-03-02 10:00:00', 1, 2, 'Completo'),
+         {'sqlite_autoindex_inventario_1'}, False),
+        ('EquipmentLoanModel.update_equipment_loan', lambda: m['equipment_loans'].update_equipment_loan(
+            2, 'professor', {'titulo_practica': 'Filtros activos'}),
+         set(), False),
+        ('EquipmentLoanModel.delete_loan', lambda: m['equipment_loans'].delete_loan(2, 'professor'),
+         {'sqlite_autoindex_inventario_1'}, False),
+        ('import_loan_history', lambda: import_loan_history(m['rooms'].db_manager, 'salas', [[
+            (1, '2023-05-02 08:00:00', '10:00:00', 1001, None, 1, 'PC-1', 1, 2, None, None),
+            (2, '2023-05-02 09:00:00', '11:00:00', None, 2005, 2, None, 1, 2, None, None),
+        ]]),
+         {'idx_pse_fecha', 'idx_psp_fecha'}, False),
+
+        ('ChangeLogModel.get_current_change', lambda: m['changes'].get_current_change(),
+         set(), False),
+        ('ChangeLogModel.get_last_export', lambda: m['changes'].get_last_export(),
+         set(), False),
+        ('ChangeLogModel.get_columns', lambda: m['changes'].get_columns('estudiantes'),
+         set(), False),
+        ('ChangeLogModel.iter_rows', lambda: list(m['changes'].iter_rows('estudiantes')),
+         set(), False),
+        ('ChangeLogModel.iter_changed_rows', lambda: list(m['changes'].iter_changed_rows('inventario', 0, 1000)),
+         {'idx_cambios_tabla', 'sqlite_autoindex_inventario_1'}, False),
+        ('ChangeLogModel.iter_deleted_keys', lambda: list(m['changes'].iter_deleted_keys('inventario', 0, 1000)),
+         {'idx_cambios_tabla', 'sqlite_autoindex_inventario_1'}, False),
+        ('ChangeLogModel.record_export', lambda: m['changes'].record_export(0, 1000),
+         set(), False),
+        ('ChangeLogModel.prune_changes', lambda: m['changes'].prune_changes(1000),
+         set(), False),
+    ]
+
+def _unregistered_methods(calls):
+    ''' Public methods of the models without a registered call: a new query has to
+    come with its entry in _model_calls '''
+    registered = {name.split(' (')[0] for name, _, _, _ in calls}
+    missing = []
+    for cls_name, cls in vars(models_module).items():
+        if not (isinstance(cls, type) and cls.__module__ == models_module.__name__
+                and 'db_manager' in inspect.signature(cls).parameters):
+            continue
+        for attr, value in vars(cls).items():
+            if not attr.startswith('_') and callable(value) and f'{cls_name}.{attr}' not in registered:
+                missing.append(f'{cls_name}.{attr}')
+    return missing
+
+def _seed(conn):
+    conn.executescript('''
+        INSERT INTO proyectos_curriculares (id, nombre) VALUES (1, 'Ingeniería Electrónica');
+        INSERT INTO salas (id, codigo_interno, nombre) VALUES (1, 'S-01', 'Laboratorio 1'), (2, 'S-02', 'Laboratorio 2');
+        INSERT INTO sedes (id, nombre) VALUES (1, 'Sede Principal');
+        INSERT INTO personal_laboratorio (id, nombre, cargo) VALUES (1, 'Laboratorista', 0), (2, 'Monitor', 1);
+        INSERT INTO estudiantes (codigo, nombre, cedula, proyecto_curricular_id) VALUES (1001, 'Ana Pérez', 55, 1);
+        INSERT INTO profesores (cedula, nombre, proyecto_curricular_id) VALUES (2001, 'Luis Gómez', 1);
+        INSERT INTO inventario (codigo, descripcion, estado, sede_id) VALUES ('INV-1', 'Osciloscopio', 'DISPONIBLE', 1),
+                                                                            ('INV-2', 'Multímetro', 'DAÑADO', 1);
+        INSERT INTO equipos (codigo, sala_id, numero_equipo, descripcion, estado) VALUES ('PC-1', 1, 1, 'PC', 1);
+        INSERT INTO prestamos_salas_estudiantes (fecha_entrada, laboratorista, monitor, sala_id, estudiante_id, equipo_codigo)
+            VALUES ('2024-03-01 08:00:00', 1, 2, 1, 1001, 'PC-1');
+        INSERT INTO prestamos_salas_profesores (fecha_entrada, laboratorista, monitor, sala_id, profesor_id, hora_salida)
+            VALUES ('2024-03-01 10:00:00', 1, 2, 2, 2001, '12:00:00');
+        INSERT INTO prestamos_equipos_profesores (fecha_entrega, fecha_devolucion, equipo_codigo, profesor_id, estado, observaciones)
+            VALUES ('2024-03-01 10:00:00', '2024-03-01 12:00:00', 'INV-1', 2001, 0, 'Revisar sonda');
+    ''')
+    conn.commit()
+
+def _plan(conn, statement):
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {statement}')]
+
+def _full_loan_scans(details):
+    scans = []
+    for detail in details:
+        match = re.match(r'SCAN (\w+)(.*)', detail)
+        if match and match.group(1) in LOAN_TABLES and 'INDEX' not in match.group(2):
+            scans.append(detail)
+    return scans
+
+def check_query_plans(verbose=True):
+    ''' Runs every registered model call and returns the list of problems found
+    (empty when every plan uses the expected indexes) '''
+    problems = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_manager = DatabaseManager(os.path.join(tmp_dir, 'query_plans.db'))
+        conn = db_manager.get_connection()
+        _seed(conn)
+        conn.close()
+
+        statements = []
+        db_manager.pool.add_connect_hook(lambda c: c.set_trace_callback(statements.append))
+        # Reconnect so that every connection from here on is traced
+        db_manager.close()
+
+        models = {
+            'students': StudentModel(db_manager),
+            'profesores': ProfesorModel(db_manager),
+            'rooms': RoomModel(db_manager),
+            'inventory': InventoryModel(db_manager),
+            'equipos': EquiposModel(db_manager),
+            'room_loans': RoomLoanModel(db_manager),
+            'equipment_loans': EquipmentLoanModel(db_manager),
+            'dashboard': DashboardModel(db_manager),
+            'personal': PersonalLaboratorioModel(db_manager),
+            'proyectos': ProyectosCurricularesModel(db_manager),
+            'sedes': SedesModel(db_manager),
+            'changes': ChangeLogModel(db_manager),
+        }
+        calls = _model_calls(models)
+        for method in _unregistered_methods(calls):
+            problems.append(f'{method}: no entry in _model_calls')
+
+        explain_conn = sqlite3.connect(db_manager.db_path)
+        try:
+            for name, call, expected, full_scan_ok in calls:
+                statements.clear()
+                call()
+                for statement in statements:
+                    if TEMP_TABLE.match(statement):
+                        explain_conn.execute(statement)
+                planned = [s for s in statements if PLANNED_STATEMENT.match(s) and s.strip() != HEALTH_CHECK]
+                details = []
+                for statement in planned:
+                    details.extend(_plan(explain_conn, statement))
+                for (table,) in explain_conn.execute("SELECT name FROM temp.sqlite_master WHERE type = 'table'").fetchall():
+                    explain_conn.execute(f'DROP TABLE temp.{table}')
+
+                call_problems = []
+                used = ' '.join(details)
+                for index in sorted(expected):
+                    if not re.search(rf'\b{index}\b', used):
+                        call_problems.append(f'{name}: does not use {index}')
+                if not full_scan_ok:
+                    for detail in _full_loan_scans(details):
+                        call_problems.append(f'{name}: full scan ({detail})')
+                if not planned and name not in UNPLANNED_METHODS:
+                    call_problems.append(f'{name}: no statements captured')
+
+                if verbose:
+                    print(f"{'OK  ' if not call_problems else 'FAIL'} {name}")
+                    for detail in details:
+                        print(f'       {detail}')
+                problems.extend(call_problems)
+        finally:
+            explain_conn.close()
+            db_manager.close()
+    return problems
+
+if __name__ == '__main__':
+    problems = check_query_plans()
+    if problems:
+        print('\nQuery plan problems:')
+        for problem in problems:
+            print(f'  {problem}')
+        sys.exit(1)
+    print('\nAll query plans use the expected indexes')
@@ -1,3 +1,4 @@
+import multiprocessing
 import customtkinter as ctk
 from views.inicio_view import MainWindow
 
@@ -9,4 +10,6 @@ def main():
     app.mainloop()
 
 if __name__ == "__main__":
+    # The export renders its sheets in worker processes, also from the frozen .exe
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
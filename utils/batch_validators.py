@@ -0,0 +1,113 @@
+import re
+from datetime import datetime
+from itertools import compress
+from operator import not_
+
+# Column-wise versions of the rules in utils.validators, for the bulk imports. Each
+# function takes a whole column (a list of strings) and returns a list of booleans,
+# True where the value is valid. Plain digits, the common case, are accepted with
+# str.isdecimal() (the digits int() takes) and only the rest go through the compiled
+# patterns; the dates are checked with the datetime constructor instead of strptime
+
+_INTEGER = re.compile(r'\s*[+-]?\d+\s*')
+_POSITIVE_INTEGER = re.compile(r'\s*\+?0*[1-9]\d*\s*')
+
+# Regular expressions for the strftime directives of the date and time formats in use
+_DIRECTIVES = {
+    'Y': r'(?P<year>\d{4})',
+    'm': r'(?P<month>\d{1,2})',
+    'd': r'(?P<day>\d{1,2})',
+    'H': r'(?P<hour>\d{1,2})',
+    'M': r'(?P<minute>\d{1,2})',
+    'S': r'(?P<second>\d{1,2})',
+}
+
+def _format_pattern(fmt):
+    """Compiled pattern of a strftime format, or None if it uses other directives."""
+    parts = re.split(r'%(.)', fmt)
+    directives = parts[1::2]
+    if len(set(directives)) < len(directives) or not set(directives) <= _DIRECTIVES.keys():
+        return None
+    pattern = []
+    for index, part in enumerate(parts):
+        pattern.append(_DIRECTIVES[part] if index % 2 else re.escape(part))
+    return re.compile(''.join(pattern))
+
+def not_empty(values):
+    """Column version of is_not_empty."""
+    return [bool(value and value.strip()) for value in values]
+
+def integers(values):
+    """Column version of is_integer."""
+    match = _INTEGER.fullmatch
+    return [value.isdecimal() or bool(value and match(value)) for value in values]
+
+def positive_integers(values):
+    """Column version of is_positive_integer."""
+    match = _POSITIVE_INTEGER.fullmatch
+    return [(value.isdecimal() and value.lstrip('0') != '') or bool(value and match(value)) for value in values]
+
+def valid_codes(values, length=None):
+    """Column version of is_valid_code."""
+    return [bool(value and value.strip() and value.isalnum() and (length is None or len(value) == length))
+            for value in values]
+
+def valid_ids(values, length=11):
+    """Column version of is_valid_id: an integer of length characters."""
+    match = _INTEGER.fullmatch
+    return [len(value) == length and (value.isdecimal() or bool(match(value))) for value in values]
+
+def valid_datetimes(values, fmt='%Y-%m-%d %H:%M:%S'):
+    """
+    Column version of is_valid_datetime_format. The values are matched against a
+    pattern built from fmt and the numbers checked by building the datetime, so
+    dates like 2023-02-30 are rejected as strptime does. Formats with directives
+    other than %Y %m %d %H %M %S fall back to strptime.
+    """
+    pattern = _format_pattern(fmt)
+    if pattern is None:
+        return [_strptime_ok(value, fmt) for value in values]
+    match = pattern.fullmatch
+    valid = []
+    for value in values:
+        found = match(value) if value else None
+        if found is None:
+            valid.append(False)
+            continue
+        parts = found.groupdict()
+        try:
+            datetime(int(parts.get('year', 1900)), int(parts.get('month', 1)), int(parts.get('day', 1)),
+                     int(parts.get('hour', 0)), int(parts.get('minute', 0)), int(parts.get('second', 0)))
+            valid.append(True)
+        except ValueError:
+            valid.append(False)
+    return valid
+
+def valid_times(values, fmt='%H:%M:%S'):
+    """Column version of is_valid_time_format."""
+    return valid_datetimes(values, fmt)
+
+def _strptime_ok(value, fmt):
+    try:
+        datetime.strptime(value, fmt)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def optional(values, valid):
+    """A mask that also accepts the empty values, for the columns that may be left blank."""
+    return [ok or not value for value, ok in zip(values, valid)]
+
+def first_problems(checks, count):
+    """
+    Combines the checks of a batch of count rows, each one (valid mask, field,
+    message), into a list with None for the rows that passed all of them and
+    (field, message) of the first failed check for the others. Only the invalid
+    rows of each mask are visited.
+    """
+    problems = [None] * count
+    for valid, field, message in checks:
+        for index in compress(range(count), map(not_, valid)):
+            if problems[index] is None:
+                problems[index] = (field, message)
+    return problems
@@ -1,92 +1,512 @@
 # Create a new file: utils/exporter.py
-import pandas as pd
-from tkinter import filedialog, messagebox
+import os
+import io
+import sys
+import csv
+import gzip
+import json
+import time
+import pickle
+import shutil
+import threading
+import multiprocessing
+import zipfile
+import tempfile
+import unicodedata
+from datetime import datetime
+from collections import namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, wait
+from openpyxl import Workbook
+from tkinter import filedialog
+from database.connection import DatabaseManager, ReadSnapshot
 from database.models import (
     StudentModel, ProfesorModel, RoomModel, InventoryModel, EquiposModel,
     PersonalLaboratorioModel, RoomLoanModel, EquipmentLoanModel,
-    ProyectosCurricularesModel, SedesModel
+    ProyectosCurricularesModel, SedesModel, ChangeLogModel
 )
+from database.migrations import TRACKED_TABLES
+from database.catalog import get_catalog_watermark
 
-def export_database_to_excel():
+# Rows read from the loan tables at a time while streaming them to the workbook
+EXPORT_CHUNK_SIZE = 2000
+
+# Rows between two progress reports (and checks for a cancel request)
+PROGRESS_EVERY = 1000
+
+# zlib level of the CSV and JSON lines dumps; 1 is several times faster than the default
+COMPRESS_LEVEL = 1
+
+# Processes rendering sheets in parallel. 1 reads every sheet in this process from a
+# single snapshot; more (or None, one per core and at most one per sheet) is opt-in
+EXPORT_WORKERS = 1
+
+# One sheet of the export: its title, the column headers and a callable returning
+# an iterable of row chunks. drop_column is the index of an internal column
+# (the loan type of the histories) that is not written, or None. count is a
+# callable returning the number of rows, for the progress of the long sheets
+ExportSheet = namedtuple('ExportSheet', ['title', 'columns', 'chunks', 'drop_column', 'count'],
+                         defaults=[None])
+
+class ExportCancelled(Exception):
+    pass
+
+ROOM_LOAN_COLUMNS = ['ID', 'Tipo Usuario', 'Usuario', 'Sala', 'Fecha Entrada', 'Hora Salida', 'Laboratorista', 'Monitor',
+                     'Observaciones', 'ID Usuario', 'loan_type', 'Num. Equipo', 'Estado Préstamo', 'Firma', 'Código Equipo']
+EQUIPMENT_LOAN_COLUMNS = ['ID', 'Tipo Usuario', 'Usuario', 'Equipo', 'Fecha Entrega', 'Fecha Devolución', 'Lab. Entrega',
+                          'Monitor Entrega', 'Lab. Devolución', 'Monitor Devolución', 'Práctica', 'Estado', 'Observaciones',
+                          'ID Usuario', 'loan_type', 'Código Equipo', 'ID Sala', 'Firma']
+
+def export_sheets(db_manager=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Returns the sheets of the database export, in order. The catalogs are small and
+    come in a single chunk; the loan histories are streamed chunk by chunk.
+    """
+    def single(fetch):
+        return lambda: [fetch()]
+
+    return [
+        ExportSheet('Proyectos Curriculares', ['ID', 'Nombre del Proyecto'],
+                    single(ProyectosCurricularesModel(db_manager).get_all_proyectos), None),
+        ExportSheet('Sedes', ['ID', 'Nombre de la Sede'],
+                    single(SedesModel(db_manager).get_all_sedes), None),
+        ExportSheet('Personal Laboratorio', ['ID', 'Nombre', 'Cargo'],
+                    single(PersonalLaboratorioModel(db_manager).get_all_personal_for_export), None),
+        ExportSheet('Estudiantes', ['Código', 'Nombre', 'Cédula', 'Proyecto Curricular'],
+                    single(StudentModel(db_manager).get_all_students), None),
+        ExportSheet('Profesores', ['Cédula', 'Nombre', 'Proyecto Curricular'],
+                    single(ProfesorModel(db_manager).get_all_profesores), None),
+        ExportSheet('Salas', ['ID', 'Código Interno', 'Nombre', 'Estado Actual'],
+                    single(RoomModel(db_manager).get_all_rooms_with_status), None),
+        ExportSheet('Inventario General', ['Código', 'Marca/Serie', 'Responsable', 'Sede', 'Descripción', 'Contenido', 'Estado'],
+                    single(InventoryModel(db_manager).get_all_equipment), None),
+        ExportSheet('Equipos en Salas', ['Código', 'Sala', 'Num. Equipo', 'Descripción', 'Estado', 'Observaciones'],
+                    single(EquiposModel(db_manager).get_all_equipos_for_export), None),
+        ExportSheet('Préstamos de Salas', ROOM_LOAN_COLUMNS,
+                    lambda: RoomLoanModel(db_manager).iter_room_loans(chunk_size=chunk_size),
+                    ROOM_LOAN_COLUMNS.index('loan_type'),
+                    RoomLoanModel(db_manager).count_room_loans),
+        ExportSheet('Préstamos de Equipos', EQUIPMENT_LOAN_COLUMNS,
+                    lambda: EquipmentLoanModel(db_manager).iter_equipment_loans(chunk_size=chunk_size),
+                    EQUIPMENT_LOAN_COLUMNS.index('loan_type'),
+                    EquipmentLoanModel(db_manager).count_equipment_loans),
+    ]
+
+def sheet_rows(sheet):
+    """Yields the header and then every row of a sheet, without its internal column."""
+    drop = sheet.drop_column
+    if drop is None:
+        yield list(sheet.columns)
+        for chunk in sheet.chunks():
+            yield from chunk
+    else:
+        yield sheet.columns[:drop] + sheet.columns[drop + 1:]
+        for chunk in sheet.chunks():
+            for row in chunk:
+                yield row[:drop] + row[drop + 1:]
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where it can't be read."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return round(counters.PeakWorkingSetSize / (1024 * 1024), 1)
+    except (AttributeError, OSError):
+        pass
+    return None
+
+def sheet_slug(title):
+    """File and table name for a sheet title: 'Préstamos de Salas' -> 'prestamos_de_salas'."""
+    plain = unicodedata.normalize('NFKD', title).encode('ascii', 'ignore').decode('ascii')
+    return '_'.join(plain.lower().replace('/', ' ').replace('.', ' ').split())
+
+def _check_cancel(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise ExportCancelled()
+
+def tracked_sheets(sheets, rows_per_sheet, progress=None, cancel_event=None):
     """
-    Handles fetching data from all database tables and exporting it
-    to a single Excel file with multiple sheets.
+    Yields (sheet, rows) for each sheet, rows being the header and then every row.
+    This is what all the formats share: while a writer consumes the rows they are
+    counted into rows_per_sheet, reported to progress and checked for a cancel.
+
+    progress, if given, is called as progress(sheet_index, sheet_count, title,
+    rows_written, rows_total) at the start of each sheet and every PROGRESS_EVERY
+    rows (rows_total is None when unknown). Setting cancel_event stops the export
+    with ExportCancelled.
+    """
+    def rows(index, sheet, total):
+        rows = sheet_rows(sheet)
+        yield next(rows) # The header is not counted
+        count = 0
+        for row in rows:
+            yield row
+            count += 1
+            if count % PROGRESS_EVERY == 0:
+                _check_cancel(cancel_event)
+                if progress:
+                    progress(index, len(sheets), sheet.title, count, total)
+        rows_per_sheet[sheet.title] = count
+
+    for index, sheet in enumerate(sheets):
+        total = sheet.count() if sheet.count else None
+        if progress:
+            progress(index, len(sheets), sheet.title, 0, total)
+        yield sheet, rows(index, sheet, total)
+        _check_cancel(cancel_event)
+
+@contextmanager
+def atomic_path(file_path):
+    """
+    Yields a temporary path next to file_path that replaces it once the block ends
+    without errors, so a cancelled or failed export leaves no half-written file.
+    """
+    tmp_path = file_path + '.part'
+    try:
+        yield tmp_path
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _export_stats(rows_per_sheet, start, file_path):
+    seconds = time.perf_counter() - start
+    total_rows = sum(rows_per_sheet.values()) if rows_per_sheet is not None else None
+    return {
+        'rows': rows_per_sheet or {},
+        'total_rows': total_rows,
+        'seconds': round(seconds, 2),
+        'rows_per_second': round(total_rows / seconds) if total_rows is not None and seconds > 0 else None,
+        'size_mb': round(os.path.getsize(file_path) / (1024 * 1024), 1),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+def write_workbook(file_path, sheets, progress=None, cancel_event=None):
+    """
+    Writes the sheets to an .xlsx file with a write-only workbook: rows go to disk
+    as they are read, so memory stays bounded whatever the size of the tables.
+    Returns the rows written per sheet, the time taken, the throughput and the
+    peak memory of the process.
+    """
+    start = time.perf_counter()
+    rows_per_sheet = {}
+    workbook = Workbook(write_only=True)
+    for sheet, rows in tracked_sheets(sheets, rows_per_sheet, progress, cancel_event):
+        worksheet = workbook.create_sheet(title=sheet.title)
+        for row in rows:
+            worksheet.append(row)
+    with atomic_path(file_path) as tmp_path:
+        workbook.save(tmp_path)
+    return _export_stats(rows_per_sheet, start, file_path)
+
+def write_csv_zip(file_path, sheets, progress=None, cancel_event=None):
+    """
+    Writes one UTF-8 CSV per sheet (e.g. estudiantes.csv) into a .zip file, streaming
+    the rows straight into the compressed entries.
+    """
+    start = time.perf_counter()
+    rows_per_sheet = {}
+    with atomic_path(file_path) as tmp_path:
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=COMPRESS_LEVEL) as archive:
+            for sheet, rows in tracked_sheets(sheets, rows_per_sheet, progress, cancel_event):
+                entry = archive.open(sheet_slug(sheet.title) + '.csv', 'w', force_zip64=True)
+                with io.TextIOWrapper(entry, encoding='utf-8', newline='') as f:
+                    csv.writer(f).writerows(rows)
+    return _export_stats(rows_per_sheet, start, file_path)
+
+def write_jsonl_gz(file_path, sheets, progress=None, cancel_event=None):
+    """
+    Writes every row of every sheet as one JSON object per line to a gzip file. Each
+    object has the sheet name under "_table" and the columns under their headers:
+        {"_table": "estudiantes", "Código": 20181000001, "Nombre": "...", ...}
+    """
+    start = time.perf_counter()
+    rows_per_sheet = {}
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str)
+    with atomic_path(file_path) as tmp_path:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=COMPRESS_LEVEL) as f:
+            for sheet, rows in tracked_sheets(sheets, rows_per_sheet, progress, cancel_event):
+                columns = ['_table'] + list(next(rows))
+                table = sheet_slug(sheet.title)
+                for row in rows:
+                    f.write(encoder.encode(dict(zip(columns, (table, *row)))))
+                    f.write('\n')
+    return _export_stats(rows_per_sheet, start, file_path)
+
+def backup_database(file_path, db_path, progress=None, cancel_event=None):
+    """
+    Copies the whole database to a standalone .db file with the SQLite backup API,
+    from a read snapshot: the copy is the database at one point in time, even with
+    loans being registered meanwhile. Progress is reported in pages.
+    """
+    start = time.perf_counter()
+
+    def on_pages(status, remaining, total):
+        _check_cancel(cancel_event)
+        if progress:
+            progress(0, 1, 'Copia de la base de datos', total - remaining, total)
+
+    with atomic_path(file_path) as tmp_path:
+        with ReadSnapshot(db_path) as snapshot:
+            snapshot.backup(tmp_path, progress=on_pages)
+    return _export_stats(None, start, file_path)
+
+def write_incremental(file_path, db_path, progress=None, cancel_event=None, since=None):
+    """
+    Writes only what changed since the last incremental export (or since the
+    watermark since) to a .zip: for every tracked table <table>.csv with the
+    current version of the rows inserted or updated and <table>.deleted.csv with
+    the keys deleted, plus a manifest.json describing how to apply them. The very
+    first export has no watermark and writes every row instead ("full": true).
+
+    Everything is read from one snapshot, and the watermark of the snapshot is
+    recorded in exportaciones once the file is in place. The log entries up to
+    that watermark are then deleted, so cambios only keeps what was not exported.
+    """
+    start = time.perf_counter()
+    rows_per_sheet = {}
+    with ReadSnapshot(db_path) as snapshot:
+        log = ChangeLogModel(snapshot)
+        if since is None:
+            since = log.get_last_export()
+        full = since is None
+        until = log.get_current_change()
+
+        sheets = []
+        tables = {}
+        for table, key in TRACKED_TABLES.items():
+            columns = log.get_columns(table)
+            if full:
+                chunks = lambda table=table: log.iter_rows(table)
+            else:
+                chunks = lambda table=table: log.iter_changed_rows(table, since, until)
+            sheets.append(ExportSheet(table, columns, chunks, None))
+            tables[table] = {'key': key, 'columns': columns, 'rows_file': f'{table}.csv'}
+            if not full:
+                sheets.append(ExportSheet(f'{table}.deleted', [key],
+                                          lambda table=table: log.iter_deleted_keys(table, since, until), None))
+                tables[table]['deleted_file'] = f'{table}.deleted.csv'
+
+        with atomic_path(file_path) as tmp_path:
+            with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=COMPRESS_LEVEL) as archive:
+                for sheet, rows in tracked_sheets(sheets, rows_per_sheet, progress, cancel_event):
+                    entry = archive.open(sheet.title + '.csv', 'w', force_zip64=True)
+                    with io.TextIOWrapper(entry, encoding='utf-8', newline='') as f:
+                        csv.writer(f).writerows(rows)
+
+                for table, info in tables.items():
+                    info['rows'] = rows_per_sheet[table]
+                    if not full:
+                        info['deleted'] = rows_per_sheet[f'{table}.deleted']
+                manifest = {
+                    'version': 1,
+                    'database': os.path.basename(db_path),
+                    'created': datetime.now().isoformat(timespec='seconds'),
+                    'full': full,
+                    'from_change': since or 0,
+                    'to_change': until,
+                    'apply': ('full: replace the rows of each table with <table>.csv. '
+                              'Otherwise, in the order of "tables", insert or replace the rows of '
+                              '<table>.csv by key; then, in reverse order, delete the keys of '
+                              '<table>.deleted.csv.'),
+                    'tables': tables,
+                }
+                archive.writestr('manifest.json', json.dumps(manifest, indent=2, ensure_ascii=False))
+
+    log = ChangeLogModel(DatabaseManager(db_path))
+    if log.record_export(since or 0, until, file_path):
+        # The exported changes are no longer needed, except by a catalog cache that
+        # has not read them yet
+        catalog_watermark = get_catalog_watermark(db_path)
+        log.prune_changes(until if catalog_watermark is None else min(until, catalog_watermark))
+    stats = _export_stats(rows_per_sheet, start, file_path)
+    stats.update(full=full, from_change=since or 0, to_change=until)
+    return stats
+
+# Export targets by key: a label and extension for the save dialog, the writer, and
+# whether the writer takes the export sheets (otherwise it copies the database file)
+ExportFormat = namedtuple('ExportFormat', ['label', 'extension', 'write', 'uses_sheets'])
+
+EXPORT_FORMATS = {
+    'xlsx': ExportFormat('Excel', '.xlsx', write_workbook, True),
+    'csv': ExportFormat('CSV por tabla (zip)', '.zip', write_csv_zip, True),
+    'jsonl': ExportFormat('JSON lines (gzip)', '.jsonl.gz', write_jsonl_gz, True),
+    'sqlite': ExportFormat('Copia SQLite', '.db', backup_database, False),
+    'delta': ExportFormat('Cambios desde la última exportación (zip)', '.delta.zip', write_incremental, False),
+}
+
+def format_for_path(file_path):
+    """Export format matching the extension of file_path, Excel when none does."""
+    name = file_path.lower()
+    # The longest extension wins, .delta.zip is not a CSV zip
+    matches = [key for key, export_format in EXPORT_FORMATS.items() if name.endswith(export_format.extension)]
+    return max(matches, key=lambda key: len(EXPORT_FORMATS[key].extension), default='xlsx')
+
+def render_sheet_part(db_path, index, part_path, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Worker process: reads sheet number index from db_path (the snapshot copy taken
+    by run_export, so every worker sees the same data) and writes
+    the rows, already without their internal column, to part_path as pickled
+    chunks. Returns the number of rows.
+    """
+    with ReadSnapshot(db_path) as snapshot:
+        sheet = export_sheets(snapshot, chunk_size)[index]
+        rows = sheet_rows(sheet)
+        next(rows) # The header is written by the workbook
+        count = 0
+        with open(part_path, 'wb') as part:
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    pickle.dump(chunk, part, pickle.HIGHEST_PROTOCOL)
+                    count += len(chunk)
+                    chunk = []
+            if chunk:
+                pickle.dump(chunk, part, pickle.HIGHEST_PROTOCOL)
+                count += len(chunk)
+    return count
+
+def read_sheet_part(part_path):
+    """Yields the chunks written by render_sheet_part."""
+    with open(part_path, 'rb') as part:
+        while True:
+            try:
+                yield pickle.load(part)
+            except EOFError:
+                return
+
+def _wait_part(future, cancel_event):
+    # Waits for a worker, checking now and then whether the export was cancelled
+    while not future.done():
+        if cancel_event is not None and cancel_event.is_set():
+            raise ExportCancelled()
+        wait([future], timeout=0.2)
+    return future.result()
+
+def parallel_sheets(pool, db_path, part_dir, chunk_size=EXPORT_CHUNK_SIZE, cancel_event=None):
+    """
+    Sends every sheet to the process pool and returns them as sheets that read the
+    rendered parts, for write_workbook. The loan histories go first so that the
+    largest sheets start right away; the workbook is still assembled in order.
+    """
+    # The snapshot is not opened here, it only describes the sheets
+    sheets = export_sheets(ReadSnapshot(db_path), chunk_size)
+    order = sorted(range(len(sheets)), key=lambda i: sheets[i].count is None)
+    futures = {}
+    for index in order:
+        part_path = os.path.join(part_dir, f'sheet_{index}.part')
+        futures[index] = (pool.submit(render_sheet_part, db_path, index, part_path, chunk_size), part_path)
+
+    def part_sheet(index, sheet):
+        future, part_path = futures[index]
+        drop = sheet.drop_column
+        columns = sheet.columns if drop is None else sheet.columns[:drop] + sheet.columns[drop + 1:]
+
+        def chunks():
+            _wait_part(future, cancel_event)
+            return read_sheet_part(part_path)
+
+        return ExportSheet(sheet.title, columns, chunks, None, lambda: _wait_part(future, cancel_event))
+
+    return [part_sheet(index, sheet) for index, sheet in enumerate(sheets)]
+
+def _discard_parts(pool, part_dir):
+    # Drops the sheets not started yet, waits for the running ones and removes the
+    # parts, away from the thread of the cancelled export
+    pool.shutdown(wait=True, cancel_futures=True)
+    shutil.rmtree(part_dir, ignore_errors=True)
+
+def run_export(file_path, db_path=None, progress=None, cancel_event=None, workers=EXPORT_WORKERS, fmt=None):
+    """
+    Exports the whole database to file_path in the format given by fmt (a key of
+    EXPORT_FORMATS), or else by the extension of file_path. Meant to run in a
+    worker thread.
+
+    With workers == 1 (the default) the sheets are read one after the other from a
+    single read snapshot, so loans registered meanwhile neither block the export nor
+    end up in half of its sheets. Otherwise the snapshot is first copied to a
+    temporary file with the backup API, and each sheet is queried from that copy and
+    formatted in a process pool, the parts assembled into the file as they finish:
+    all the sheets still show the database at one point in time. The workers are
+    started with spawn, since forking a process that runs Tk and the query threads
+    is unsafe.
+    """
+    db_path = db_path or DatabaseManager().db_path
+    export_format = EXPORT_FORMATS[fmt or format_for_path(file_path)]
+    if workers is None:
+        workers = min(os.cpu_count() or 1, len(export_sheets(ReadSnapshot(db_path))))
+
+    if not export_format.uses_sheets:
+        workers = 1
+        stats = export_format.write(file_path, db_path, progress, cancel_event)
+    elif workers <= 1:
+        with ReadSnapshot(db_path) as snapshot:
+            stats = export_format.write(file_path, export_sheets(snapshot), progress, cancel_event)
+    else:
+        part_dir = tempfile.mkdtemp(prefix='export_')
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        finished = False
+        try:
+            snapshot_path = os.path.join(part_dir, 'snapshot.db')
+            with ReadSnapshot(db_path) as snapshot:
+                snapshot.backup(snapshot_path)
+            _check_cancel(cancel_event)
+            sheets = parallel_sheets(pool, snapshot_path, part_dir, cancel_event=cancel_event)
+            stats = export_format.write(file_path, sheets, progress, cancel_event)
+            finished = True
+        finally:
+            if finished:
+                pool.shutdown(wait=True)
+                shutil.rmtree(part_dir, ignore_errors=True)
+            else:
+                # Cancelled or failed: return now instead of waiting for the sheets still
+                # rendering (the largest ones, sent first)
+                threading.Thread(target=_discard_parts, args=(pool, part_dir)).start()
+    stats['format'] = export_format.label
+    stats['workers'] = workers
+    rows = f"{stats['total_rows']} rows, " if stats['total_rows'] is not None else ''
+    print(f"Export ({export_format.label}): {rows}{stats['size_mb']} MB in {stats['seconds']} s "
+          f"with {workers} worker(s), peak RSS {stats['peak_rss_mb']} MB")
+    return stats
+
+def export_database(parent=None):
+    """
+    Asks where to save the report and exports all database tables to it: an Excel
+    file with one sheet per table, a zip with one CSV per table, a gzip'd JSON
+    lines dump, a copy of the SQLite database or the changes since the last
+    incremental export, depending on the chosen type.
+    The export runs in a background thread with a progress dialog that can
+    cancel it.
     """
     file_path = filedialog.asksaveasfilename(
         defaultextension=".xlsx",
-        filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")],
+        filetypes=[(f.label, "*" + f.extension) for f in EXPORT_FORMATS.values()] + [("All files", "*.*")],
         title="Guardar Reporte de Base de Datos"
     )
 
     if not file_path:
         return  # User cancelled the save dialog
 
-    try:
-        with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-            # Sheet 1: Proyectos Curriculares
-            proyectos_df = pd.DataFrame(
-                ProyectosCurricularesModel().get_all_proyectos(),
-                columns=['ID', 'Nombre del Proyecto']
-            )
-            proyectos_df.to_excel(writer, sheet_name='Proyectos Curriculares', index=False)
-
-            # Sheet 2: Sedes
-            sedes_df = pd.DataFrame(SedesModel().get_all_sedes(), columns=['ID', 'Nombre de la Sede'])
-            sedes_df.to_excel(writer, sheet_name='Sedes', index=False)
-            
-            # Sheet 3: Personal Laboratorio (using the new export method)
-            personal_df = pd.DataFrame(
-                PersonalLaboratorioModel().get_all_personal_for_export(),
-                columns=['ID', 'Nombre', 'Cargo']
-            )
-            personal_df.to_excel(writer, sheet_name='Personal Laboratorio', index=False)
-
-            # Sheet 4: Estudiantes
-            students_df = pd.DataFrame(
-                StudentModel().get_all_students(),
-                columns=['Código', 'Nombre', 'Cédula', 'Proyecto Curricular']
-            )
-            students_df.to_excel(writer, sheet_name='Estudiantes', index=False)
-
-            # Sheet 5: Profesores
-            profesores_df = pd.DataFrame(
-                ProfesorModel().get_all_profesores(),
-                columns=['Cédula', 'Nombre', 'Proyecto Curricular']
-            )
-            profesores_df.to_excel(writer, sheet_name='Profesores', index=False)
-
-            # Sheet 6: Salas
-            rooms_df = pd.DataFrame(
-                RoomModel().get_all_rooms_with_status(),
-                columns=['ID', 'Código Interno', 'Nombre', 'Estado Actual']
-            )
-            rooms_df.to_excel(writer, sheet_name='Salas', index=False)
-
-            # Sheet 7: Inventario General
-            inventory_df = pd.DataFrame(
-                InventoryModel().get_all_equipment(),
-                columns=['Código', 'Marca/Serie', 'Responsable', 'Sede', 'Descripción', 'Contenido', 'Estado']
-            )
-            inventory_df.to_excel(writer, sheet_name='Inventario General', index=False)
-
-            # Sheet 8: Equipos en Salas (using the new export method)
-            equipos_df = pd.DataFrame(
-                EquiposModel().get_all_equipos_for_export(),
-                columns=['Código', 'Sala', 'Num. Equipo', 'Descripción', 'Estado', 'Observaciones']
-            )
-            equipos_df.to_excel(writer, sheet_name='Equipos en Salas', index=False)
-            
-            # Sheet 9: Préstamos de Salas
-            room_loans_data = RoomLoanModel().get_room_loans()
-            room_loans_df = pd.DataFrame(room_loans_data, columns=['ID', 'Tipo Usuario', 'Usuario', 'Sala', 'Fecha Entrada', 'Hora Salida', 'Laboratorista', 'Monitor', 'Observaciones', 'ID Usuario', 'loan_type', 'Num. Equipo', 'Estado Préstamo', 'Firma', 'Código Equipo'])
-            room_loans_df.drop(columns=['loan_type']).to_excel(writer, sheet_name='Préstamos de Salas', index=False)
-
-            # Sheet 10: Préstamos de Equipos
-            equipment_loans_data = EquipmentLoanModel().get_equipment_loans()
-            equipment_loans_df = pd.DataFrame(equipment_loans_data, columns=['ID', 'Tipo Usuario', 'Usuario', 'Equipo', 'Fecha Entrega', 'Fecha Devolución', 'Lab. Entrega', 'Monitor Entrega', 'Lab. Devolución', 'Monitor Devolución', 'Práctica', 'Estado', 'Observaciones', 'ID Usuario', 'loan_type', 'Código Equipo', 'ID Sala', 'Firma'])
-            equipment_loans_df.drop(columns=['loan_type']).to_excel(writer, sheet_name='Préstamos de Equipos', index=False)
-            
-        messagebox.showinfo("Exportación Exitosa", f"Los datos se han guardado en:\n{file_path}")
-
-    except Exception as e:
-        messagebox.showerror("Error de Exportación", f"Ocurrió un error al exportar los datos: {e}")
\ No newline at end of file
+    # Imported here, the dialog needs a running Tk app and this module does not
+    from views.components.export_dialog import ExportProgressDialog
+    ExportProgressDialog(parent, file_path, run_export)
@@ -0,0 +1,381 @@
+import csv
+import time
+import unicodedata
+from collections import namedtuple
+from utils.batch_validators import not_empty, positive_integers, valid_ids, optional, first_problems
+from database.models import StudentModel, ProfesorModel, ProyectosCurricularesModel, InventoryModel, SedesModel
+
+# Rows validated and inserted at a time
+IMPORT_BATCH_SIZE = 1000
+
+# Bytes of a CSV file read to guess its encoding and delimiter
+CSV_SAMPLE_BYTES = 64 * 1024
+
+# A problem with one row of the file: its line (the header is line 1), the column
+# and value at fault, and a message for the user
+RowError = namedtuple('RowError', ['line', 'field', 'value', 'message'])
+
+# Summary of an import. existing are the keys that were already registered
+ImportResult = namedtuple('ImportResult', ['read', 'inserted', 'existing', 'errors', 'seconds'])
+
+def normalize_text(value):
+    """Lowercase, without accents and with single spaces: 'Código  Estudiante' -> 'codigo estudiante'."""
+    plain = unicodedata.normalize('NFKD', str(value)).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(plain.lower().replace('_', ' ').split())
+
+def cell_text(value):
+    """Text of a CSV or Excel cell. Whole numbers read as floats lose their '.0'."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+def _csv_rows(file_path):
+    with open(file_path, 'rb') as f:
+        sample = f.read(CSV_SAMPLE_BYTES)
+    # Excel on Windows saves CSV in cp1252 unless told otherwise
+    try:
+        sample.decode('utf-8-sig')
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # A multibyte character cut at the end of the sample is still UTF-8
+        encoding = 'utf-8-sig' if e.start >= len(sample) - 3 else 'cp1252'
+    text = sample.decode(encoding, errors='ignore')
+    try:
+        dialect = csv.Sniffer().sniff(text.split('\n', 1)[0], delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    with open(file_path, encoding=encoding, newline='') as f:
+        yield from csv.reader(f, dialect)
+
+def _excel_rows(file_path):
+    from openpyxl import load_workbook
+    # Read-only mode parses the sheet as it is iterated, rows are never all in memory
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+def iter_records(file_path, columns):
+    """
+    Streams the rows of a CSV or Excel file as (line, record) pairs. columns maps
+    each field to the header names accepted for it, e.g. {'codigo': ('codigo',
+    'código estudiante')}; headers are compared without case or accents and the
+    unknown ones are ignored. Raises ValueError when a required header (the first
+    field) is missing. Blank rows are skipped.
+    """
+    if file_path.lower().endswith(('.xlsx', '.xlsm')):
+        rows = _excel_rows(file_path)
+    else:
+        rows = _csv_rows(file_path)
+
+    header = [normalize_text(cell_text(name)) for name in next(rows, [])]
+    positions = {}
+    for field, names in columns.items():
+        accepted = {normalize_text(name) for name in names}
+        for index, name in enumerate(header):
+            if name in accepted:
+                positions[field] = index
+                break
+    key = next(iter(columns))
+    if key not in positions:
+        raise ValueError(f'No se encontró la columna "{columns[key][0]}" en el encabezado del archivo.')
+
+    for line, row in enumerate(rows, start=2):
+        record = {field: cell_text(row[index]) if index < len(row) else ''
+                  for field, index in positions.items()}
+        if any(record.values()):
+            yield line, record
+
+def iter_batches(records, size=IMPORT_BATCH_SIZE):
+    batch = []
+    for item in records:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def project_lookup(db_manager=None):
+    """Curricular projects by normalized name, read once for the whole import."""
+    return {normalize_text(nombre): id for id, nombre in ProyectosCurricularesModel(db_manager).get_all_proyectos()}
+
+def batch_columns(batch, fields):
+    """The lines of a batch of (line, record) pairs and one list per field, '' where missing."""
+    lines = [line for line, _ in batch]
+    return [lines] + [[record.get(field, '') for _, record in batch] for field in fields]
+
+def lookup_column(values, lookup):
+    """Ids of a column of names through lookup (normalized name -> id), normalizing each distinct name once."""
+    ids = {value: lookup.get(normalize_text(value)) for value in set(values) if value}
+    return [ids.get(value) for value in values]
+
+def _reject(batch, problems, errors):
+    """Adds a RowError for every row with a problem; returns the indexes of the others."""
+    accepted = []
+    for index, problem in enumerate(problems):
+        if problem is None:
+            accepted.append(index)
+        else:
+            line, record = batch[index]
+            field, message = problem
+            errors.append(RowError(line, field, record.get(field, ''), message))
+    return accepted
+
+# Accepted header names of the roster files, the key first
+STUDENT_COLUMNS = {
+    'codigo': ('Código', 'codigo estudiante', 'code'),
+    'nombre': ('Nombre', 'nombre completo', 'nombres'),
+    'cedula': ('Cédula', 'documento', 'numero documento', 'identificacion'),
+    'proyecto': ('Proyecto Curricular', 'proyecto', 'carrera'),
+}
+PROFESSOR_COLUMNS = {
+    'cedula': ('Cédula', 'documento', 'numero documento', 'identificacion'),
+    'nombre': ('Nombre', 'nombre completo', 'nombres'),
+    'proyecto': ('Proyecto Curricular', 'proyecto', 'carrera'),
+}
+
+def validate_students(batch, projects, seen, errors):
+    """
+    Validates a batch of (line, record) pairs from a student roster. Returns the
+    valid rows as (codigo, nombre, cedula, proyecto_id) and appends a RowError for
+    every rejected row. seen holds the codes already read, to catch repeats. The
+    rules are applied column by column over the whole batch.
+    """
+    lines, codigos, nombres, cedulas, proyectos = batch_columns(batch, ('codigo', 'nombre', 'cedula', 'proyecto'))
+    proyecto_ids = lookup_column(proyectos, projects)
+    problems = first_problems([
+        (valid_ids(codigos), 'codigo', 'El código debe tener 11 dígitos.'),
+        (not_empty(nombres), 'nombre', 'El nombre está vacío.'),
+        (optional(cedulas, positive_integers(cedulas)), 'cedula', 'La cédula debe ser un número entero.'),
+        (optional(proyectos, proyecto_ids), 'proyecto', 'Proyecto curricular desconocido.'),
+    ], len(lines))
+    # Repeats are checked last, against the rows accepted so far
+    for index, codigo in enumerate(codigos):
+        if problems[index] is None:
+            if int(codigo) in seen:
+                problems[index] = ('codigo', 'Código repetido en el archivo.')
+            else:
+                seen.add(int(codigo))
+    return [(int(codigos[i]), nombres[i], int(cedulas[i]) if cedulas[i] else None, proyecto_ids[i])
+            for i in _reject(batch, problems, errors)]
+
+def validate_professors(batch, projects, seen, errors):
+    """Like validate_students for a professor roster: rows are (cedula, nombre, proyecto_id)."""
+    lines, cedulas, nombres, proyectos = batch_columns(batch, ('cedula', 'nombre', 'proyecto'))
+    proyecto_ids = lookup_column(proyectos, projects)
+    problems = first_problems([
+        (positive_integers(cedulas), 'cedula', 'La cédula debe ser un número entero.'),
+        (not_empty(nombres), 'nombre', 'El nombre está vacío.'),
+        (optional(proyectos, proyecto_ids), 'proyecto', 'Proyecto curricular desconocido.'),
+    ], len(lines))
+    for index, cedula in enumerate(cedulas):
+        if problems[index] is None:
+            if int(cedula) in seen:
+                problems[index] = ('cedula', 'Cédula repetida en el archivo.')
+            else:
+                seen.add(int(cedula))
+    return [(int(cedulas[i]), nombres[i], proyecto_ids[i]) for i in _reject(batch, problems, errors)]
+
+def _import(file_path, columns, validate, insert, db_manager, batch_size):
+    start = time.perf_counter()
+    projects = project_lookup(db_manager)
+    errors = []
+    seen = set()
+    counter = {'read': 0}
+
+    def batches():
+        for batch in iter_batches(iter_records(file_path, columns), batch_size):
+            counter['read'] += len(batch)
+            yield validate(batch, projects, seen, errors)
+
+    inserted, existing = insert(batches())
+    return ImportResult(counter['read'], inserted, existing, errors, round(time.perf_counter() - start, 2))
+
+def import_students(file_path, db_manager=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Imports a student roster (CSV or Excel with Código, Nombre, Cédula and
+    Proyecto Curricular columns). The file is streamed and validated in batches
+    and the valid rows go in with executemany in a single transaction. Students
+    already registered are left as they are and listed in the result.
+    """
+    return _import(file_path, STUDENT_COLUMNS, validate_students,
+                   StudentModel(db_manager).import_students, db_manager, batch_size)
+
+def import_professors(file_path, db_manager=None, batch_size=IMPORT_BATCH_SIZE):
+    """Same as import_students for a professor roster (Cédula, Nombre, Proyecto Curricular)."""
+    return _import(file_path, PROFESSOR_COLUMNS, validate_professors,
+                   ProfesorModel(db_manager).import_profesores, db_manager, batch_size)
+
+# Summary of a roster sync: the RosterDiff of the model plus the file side
+SyncResult = namedtuple('SyncResult', ['read', 'diff', 'errors', 'seconds'])
+
+def sync_students(file_path, apply=False, db_manager=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Compares the semester roster in file_path (same columns as import_students)
+    with the registered students: new students, blank students it completes,
+    changed names, cédulas or projects, and students no longer listed. Nothing is
+    written unless apply is True, so the same call gives the dry run.
+    """
+    start = time.perf_counter()
+    projects = project_lookup(db_manager)
+    errors = []
+    seen = set()
+    counter = {'read': 0}
+
+    def batches():
+        for batch in iter_batches(iter_records(file_path, STUDENT_COLUMNS), batch_size):
+            counter['read'] += len(batch)
+            yield validate_students(batch, projects, seen, errors)
+
+    diff = StudentModel(db_manager).sync_students(batches(), apply)
+    return SyncResult(counter['read'], diff, errors, round(time.perf_counter() - start, 2))
+
+def summarize_sync(result):
+    """Text with the counts of a roster sync, for the confirmation dialog."""
+    diff = result.diff
+    lines = [f'Filas leídas: {result.read}',
+             f'Estudiantes nuevos: {len(diff.inserts)}',
+             f'Registros en blanco completados: {len(diff.filled)}',
+             f'Estudiantes con cambios: {len(diff.updates)}',
+             f'Sin cambios: {diff.unchanged}',
+             f'Registrados que no están en la lista: {len(diff.departures)}',
+             f'Filas con errores: {len(result.errors)}']
+    return '\n'.join(lines)
+
+def sync_report_rows(diff, project_names):
+    """Rows of the diff report: change, code, name, cédula, project and what changed."""
+    def project(proyecto_id):
+        return project_names.get(proyecto_id, '') if proyecto_id is not None else ''
+
+    for codigo, nombre, cedula, proyecto_id in diff.inserts:
+        yield ['Nuevo', codigo, nombre, cedula, project(proyecto_id), '']
+    for codigo, nombre, cedula, proyecto_id in diff.filled:
+        yield ['Completado', codigo, nombre, cedula, project(proyecto_id), 'Registro en blanco']
+    for codigo, old_nombre, nombre, old_cedula, cedula, old_proyecto, proyecto_id in diff.updates:
+        changes = []
+        if old_nombre != nombre:
+            changes.append(f'nombre: {old_nombre} -> {nombre}')
+        if old_cedula != cedula:
+            changes.append(f'cédula: {old_cedula} -> {cedula}')
+        if old_proyecto != proyecto_id:
+            changes.append(f'proyecto: {project(old_proyecto)} -> {project(proyecto_id)}')
+        yield ['Actualizado', codigo, nombre, cedula, project(proyecto_id), '; '.join(changes)]
+    for codigo, nombre, cedula, proyecto_id in diff.departures:
+        yield ['No está en la lista', codigo, nombre, cedula, project(proyecto_id), '']
+
+def write_sync_report(file_path, result, db_manager=None):
+    """Saves the diff of a roster sync (and the rejected rows) to a CSV file."""
+    project_names = {id: nombre for id, nombre in ProyectosCurricularesModel(db_manager).get_all_proyectos()}
+    with open(file_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Cambio', 'Código', 'Nombre', 'Cédula', 'Proyecto Curricular', 'Detalle'])
+        writer.writerows(sync_report_rows(result.diff, project_names))
+        for error in result.errors:
+            writer.writerow(['Error', error.value if error.field == 'codigo' else '', '', '', '',
+                             f'Línea {error.line}: {error.message}'])
+
+# Accepted header names of the inventory spreadsheets of the asset office, the key first
+INVENTORY_COLUMNS = {
+    'codigo': ('Código', 'codigo inventario', 'placa'),
+    'marca_serie': ('Marca/Serie', 'marca serie', 'marca', 'serie'),
+    'documento_funcionario': ('Documento Funcionario', 'cedula funcionario', 'documento'),
+    'nombre_funcionario': ('Funcionario', 'nombre funcionario', 'responsable'),
+    'descripcion': ('Descripción',),
+    'contenido': ('Contenido',),
+    'sede': ('Sede',),
+}
+
+# Summary of an inventory import. errors include the conflicts: items in use and unknown sedes
+InventoryImportResult = namedtuple('InventoryImportResult',
+                                   ['read', 'inserted', 'updated', 'unchanged', 'errors', 'seconds'])
+
+def sede_lookup(db_manager=None):
+    """Sedes by normalized name, read once for the whole import."""
+    return {normalize_text(nombre): id for id, nombre in SedesModel(db_manager).get_all_sedes()}
+
+def validate_inventory(batch, sedes, seen, errors):
+    """
+    Validates a batch of (line, record) pairs from an inventory spreadsheet. Returns
+    the rows as (codigo, marca_serie, documento_funcionario, nombre_funcionario,
+    descripcion, contenido, sede_id), with None for the empty cells. seen maps the
+    codes already read to their line.
+    """
+    lines, codigos, documentos, sedes_text = batch_columns(batch, ('codigo', 'documento_funcionario', 'sede'))
+    sede_ids = lookup_column(sedes_text, sedes)
+    problems = first_problems([
+        (not_empty(codigos), 'codigo', 'El código está vacío.'),
+        (optional(documentos, positive_integers(documentos)), 'documento_funcionario',
+         'El documento del funcionario debe ser un número entero.'),
+        (optional(sedes_text, sede_ids), 'sede', 'Sede desconocida.'),
+    ], len(lines))
+    for index, codigo in enumerate(codigos):
+        if problems[index] is None:
+            if codigo in seen:
+                problems[index] = ('codigo', f'Código repetido en el archivo (línea {seen[codigo]}).')
+            else:
+                seen[codigo] = lines[index]
+    rows = []
+    for index in _reject(batch, problems, errors):
+        record = batch[index][1]
+        rows.append((codigos[index], record.get('marca_serie') or None,
+                     int(documentos[index]) if documentos[index] else None,
+                     record.get('nombre_funcionario') or None, record.get('descripcion') or None,
+                     record.get('contenido') or None, sede_ids[index]))
+    return rows
+
+def import_inventory(file_path, db_manager=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Imports an inventory spreadsheet (Excel or CSV). The workbook is read in
+    read-only mode and the rows go to the database batch by batch, all in one
+    transaction, so the sheet is never whole in memory. New codes are added as
+    DISPONIBLE and registered ones are updated, except the items EN USO, which are
+    reported as conflicts together with the unknown sedes.
+    """
+    start = time.perf_counter()
+    sedes = sede_lookup(db_manager)
+    errors = []
+    seen = {}
+    counter = {'read': 0}
+
+    def batches():
+        for batch in iter_batches(iter_records(file_path, INVENTORY_COLUMNS), batch_size):
+            counter['read'] += len(batch)
+            yield validate_inventory(batch, sedes, seen, errors)
+
+    inserted, updated, unchanged, in_use = InventoryModel(db_manager).import_equipment(batches())
+    for codigo in in_use:
+        errors.append(RowError(seen[codigo], 'codigo', codigo,
+                               'El equipo está EN USO por un préstamo abierto, no se actualizó.'))
+    errors.sort(key=lambda error: error.line)
+    return InventoryImportResult(counter['read'], inserted, updated, unchanged, errors,
+                                 round(time.perf_counter() - start, 2))
+
+def summarize_inventory(result):
+    """Text for the message shown when an inventory import ends."""
+    lines = [f'Filas leídas: {result.read}',
+             f'Equipos nuevos: {result.inserted}',
+             f'Equipos actualizados: {result.updated}',
+             f'Sin cambios: {result.unchanged}',
+             f'Filas con errores o conflictos: {len(result.errors)}',
+             f'Tiempo: {result.seconds} s']
+    return '\n'.join(lines)
+
+def write_error_report(file_path, errors):
+    """Saves the rejected rows of an import to a CSV file that opens in Excel."""
+    with open(file_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Línea', 'Columna', 'Valor', 'Error'])
+        writer.writerows(errors)
+
+def summarize(result, key_name):
+    """Text for the message shown when an import ends."""
+    lines = [f'Filas leídas: {result.read}',
+             f'Registros nuevos: {result.inserted}',
+             f'{key_name} ya registrados (sin cambios): {len(result.existing)}',
+             f'Filas con errores: {len(result.errors)}',
+             f'Tiempo: {result.seconds} s']
+    return '\n'.join(lines)
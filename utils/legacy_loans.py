@@ -0,0 +1,210 @@
+import time
+import pandas as pd
+from collections import namedtuple
+from database.connection import DatabaseManager
+from database.models import import_loan_history, RoomModel, PersonalLaboratorioModel
+from utils.importer import RowError, normalize_text, iter_records, iter_batches
+
+# Rows of the legacy file turned into a DataFrame and validated at a time
+LEGACY_CHUNK_ROWS = 50000
+
+# Date formats found in the legacy spreadsheets, tried in order. Excel date cells
+# arrive as '2019-03-04 00:00:00', the ones typed by hand day first
+LEGACY_DATE_FORMATS = (
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y',
+    '%d-%m-%Y %H:%M:%S', '%d-%m-%Y %H:%M', '%d-%m-%Y',
+    '%d/%m/%y', '%d-%m-%y',
+)
+
+# Accepted header names of the legacy room loan logs, the key first
+ROOM_HISTORY_COLUMNS = {
+    'fecha': ('Fecha', 'fecha entrada', 'fecha de entrada'),
+    'hora_entrada': ('Hora Entrada', 'hora de entrada', 'hora'),
+    'hora_salida': ('Hora Salida', 'hora de salida'),
+    'codigo_estudiante': ('Código Estudiante', 'codigo'),
+    'cedula_profesor': ('Cédula Profesor', 'cedula', 'documento profesor'),
+    'sala': ('Sala',),
+    'equipo': ('Equipo', 'codigo equipo'),
+    'laboratorista': ('Laboratorista',),
+    'monitor': ('Monitor',),
+    'observaciones': ('Observaciones', 'novedad'),
+}
+
+# Accepted header names of the legacy equipment loan logs, the key first
+EQUIPMENT_HISTORY_COLUMNS = {
+    'fecha': ('Fecha Entrega', 'fecha', 'fecha de entrega'),
+    'hora_entrada': ('Hora Entrega', 'hora de entrega', 'hora'),
+    'fecha_devolucion': ('Fecha Devolución', 'fecha de devolucion'),
+    'hora_salida': ('Hora Devolución', 'hora de devolucion'),
+    'codigo_estudiante': ('Código Estudiante', 'codigo'),
+    'cedula_profesor': ('Cédula Profesor', 'cedula', 'documento profesor'),
+    'equipo': ('Código Equipo', 'equipo', 'codigo inventario', 'placa'),
+    'sala': ('Sala',),
+    'laboratorista': ('Laboratorista',),
+    'monitor': ('Monitor',),
+    'titulo': ('Título Práctica', 'practica'),
+    'observaciones': ('Observaciones',),
+}
+
+LEGACY_COLUMNS = {'salas': ROOM_HISTORY_COLUMNS, 'equipos': EQUIPMENT_HISTORY_COLUMNS}
+
+# Summary of a legacy loan import. duplicates are loans already in the history
+LegacyImportResult = namedtuple('LegacyImportResult',
+                                ['read', 'inserted', 'duplicates', 'students_created',
+                                 'professors_created', 'errors', 'seconds'])
+
+def parse_dates(text):
+    """
+    Parses a column of legacy dates at once: each format of LEGACY_DATE_FORMATS is
+    tried, vectorized, on the values the previous ones left unparsed. The empty
+    and unrecognized values end as NaT.
+    """
+    parsed = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns]')
+    for fmt in LEGACY_DATE_FORMATS:
+        pending = parsed.isna() & text.ne('')
+        if not pending.any():
+            break
+        parsed[pending] = pd.to_datetime(text[pending], format=fmt, errors='coerce')
+    return parsed
+
+def parse_times(text):
+    """Parses a column of 'HH:MM' or 'HH:MM:SS' times as offsets from midnight (NaT if empty or invalid)."""
+    text = text.where(text.str.count(':') != 1, text + ':00')
+    return pd.to_timedelta(text.where(text.ne(''), None), errors='coerce')
+
+def name_lookup(values, lookup):
+    """Maps a column of names through lookup (normalized name -> id), normalizing each distinct value once."""
+    return values.map({value: lookup.get(normalize_text(value)) for value in values.unique()})
+
+def legacy_lookups(db_manager):
+    """Rooms by normalized name or internal code and staff by normalized name, read once."""
+    rooms = {}
+    for sala_id, codigo_interno, nombre in RoomModel(db_manager).get_room_keys():
+        rooms[normalize_text(nombre)] = sala_id
+        if codigo_interno:
+            rooms[normalize_text(codigo_interno)] = sala_id
+    staff = {normalize_text(nombre): id for id, nombre, _ in PersonalLaboratorioModel(db_manager).get_all_personal()}
+    return rooms, staff
+
+def _person_ids(text):
+    """Integer ids of a column of codes or cedulas; <NA> where empty or not a whole number."""
+    numbers = pd.to_numeric(text.where(text.ne(''), None), errors='coerce')
+    return numbers.where(numbers.mod(1).eq(0) & numbers.gt(0)).astype('Int64')
+
+def validate_loans(frame, kind, rooms, staff, errors):
+    """
+    Validates a chunk of legacy loans (a DataFrame of the file columns as text,
+    indexed by line) with column operations, and returns the rows to stage as
+    tuples in the order of import_loan_history. Each rejected row adds one
+    RowError, for its first problem.
+    """
+    start_day = parse_dates(frame['fecha'])
+    start_time = parse_times(frame['hora_entrada'])
+    end_time = parse_times(frame['hora_salida'])
+    start = start_day.where(start_time.isna(), start_day.dt.normalize() + start_time)
+    if kind == 'equipos':
+        end_day = parse_dates(frame['fecha_devolucion'])
+        # Only the return time written: it was returned the same day
+        end_day = end_day.where(end_day.notna() | end_time.isna(), start.dt.normalize())
+        end = end_day.where(end_time.isna(), end_day.dt.normalize() + end_time)
+        bad_end = frame['fecha_devolucion'].ne('') & end_day.isna()
+    else:
+        end = start.dt.normalize() + end_time
+        bad_end = pd.Series(False, index=frame.index)
+    estudiante = _person_ids(frame['codigo_estudiante'])
+    profesor = _person_ids(frame['cedula_profesor'])
+    has_student = frame['codigo_estudiante'].ne('')
+    has_professor = frame['cedula_profesor'].ne('')
+    sala_id = name_lookup(frame['sala'], rooms)
+    laboratorista = name_lookup(frame['laboratorista'], staff)
+    monitor = name_lookup(frame['monitor'], staff)
+
+    checks = [
+        (start_day.isna(), 'fecha', 'Fecha no reconocida.'),
+        (frame['hora_entrada'].ne('') & start_time.isna(), 'hora_entrada', 'Hora de entrada no reconocida.'),
+        (frame['hora_salida'].ne('') & end_time.isna(), 'hora_salida', 'Hora de salida no reconocida.'),
+        (bad_end, 'fecha_devolucion', 'Fecha de devolución no reconocida.'),
+        (end.notna() & (end < start), 'hora_salida', 'La salida es anterior a la entrada.'),
+        (has_student == has_professor, 'codigo_estudiante',
+         'Debe tener el código del estudiante o la cédula del profesor (solo uno).'),
+        (has_student & estudiante.isna(), 'codigo_estudiante', 'El código del estudiante debe ser un número.'),
+        (has_professor & profesor.isna(), 'cedula_profesor', 'La cédula del profesor debe ser un número.'),
+        (frame['sala'].ne('') & sala_id.isna(), 'sala', 'Sala desconocida.'),
+    ]
+    if kind == 'salas':
+        checks.append((frame['sala'].eq(''), 'sala', 'Falta la sala.'))
+    else:
+        checks.append((frame['equipo'].eq(''), 'equipo', 'Falta el código del equipo.'))
+
+    rejected = pd.Series(False, index=frame.index)
+    for mask, field, message in checks:
+        new = mask.fillna(False).astype(bool) & ~rejected
+        for line in new.index[new]:
+            errors.append(RowError(line, field, frame.at[line, field], message))
+        rejected |= new
+
+    # The paper records are of loans long closed; with no exit or return written
+    # the loan is closed at its start, so it neither shows as open nor occupies the
+    # room or the equipment
+    end = end.where(end.notna(), start)
+    end_text = end.dt.strftime('%H:%M:%S' if kind == 'salas' else '%Y-%m-%d %H:%M:%S')
+    staged = pd.DataFrame({
+        'fecha': start.dt.strftime('%Y-%m-%d %H:%M:%S'),
+        'fin': end_text,
+        'estudiante': estudiante,
+        'profesor': profesor,
+        'sala_id': sala_id.astype('Int64'),
+        'equipo': frame['equipo'],
+        'laboratorista': laboratorista.astype('Int64'),
+        'monitor': monitor.astype('Int64'),
+        'titulo': frame['titulo'] if 'titulo' in frame else '',
+        'observaciones': frame['observaciones'],
+    })[~rejected]
+    staged = staged.astype(object)
+    staged = staged.where(staged.notna() & staged.ne(''), None)
+    return list(staged.itertuples(name=None))
+
+def import_legacy_loans(file_path, kind, db_manager=None, chunk_rows=LEGACY_CHUNK_ROWS):
+    """
+    Imports a legacy loan log of kind 'salas' or 'equipos' (Excel or CSV). The file
+    is streamed in chunks of chunk_rows that are validated as DataFrames, so the
+    dates of a whole chunk are parsed in a few vectorized calls; rooms, staff and
+    people are then resolved in the database with set-based statements. Students
+    and professors not registered are created blank. Every loan is stored closed
+    (at its start when the file has no exit or return), so the import does not touch
+    the inventory or the room status; the room occupancy is recomputed at the end.
+    """
+    start = time.perf_counter()
+    db_manager = db_manager or DatabaseManager()
+    columns = LEGACY_COLUMNS[kind]
+    rooms, staff = legacy_lookups(db_manager)
+    errors = []
+    counter = {'read': 0}
+
+    def batches():
+        for chunk in iter_batches(iter_records(file_path, columns), chunk_rows):
+            counter['read'] += len(chunk)
+            lines = [line for line, _ in chunk]
+            frame = pd.DataFrame.from_records([record for _, record in chunk], index=lines)
+            frame = frame.reindex(columns=list(columns), fill_value='').fillna('')
+            yield validate_loans(frame, kind, rooms, staff, errors)
+
+    inserted, duplicates, students, professors, missing = import_loan_history(db_manager, kind, batches())
+    RoomModel(db_manager).rebuild_occupancy()
+    for line, codigo in missing:
+        errors.append(RowError(line, 'equipo', codigo, 'El equipo no está en el inventario.'))
+    errors.sort(key=lambda error: error.line)
+    return LegacyImportResult(counter['read'], inserted, duplicates, students, professors, errors,
+                              round(time.perf_counter() - start, 2))
+
+def summarize_legacy(result):
+    """Text for the message shown when a legacy loan import ends."""
+    lines = [f'Filas leídas: {result.read}',
+             f'Préstamos cargados: {result.inserted}',
+             f'Ya registrados (omitidos): {result.duplicates}',
+             f'Estudiantes creados sin datos: {result.students_created}',
+             f'Profesores creados sin datos: {result.professors_created}',
+             f'Filas con errores: {len(result.errors)}',
+             f'Tiempo: {result.seconds} s']
+    return '\n'.join(lines)
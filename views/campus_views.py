@@ -2,6 +2,9 @@ import customtkinter as ctk
 from tkinter import messagebox, ttk
 from database.models import SedesModel
 from utils.font_config import get_font
+from views.components.async_query import AsyncQuery
+from views.components.search_controller import SearchController
+from views.components.virtual_tree import sync_treeview
 from utils.validators import *
 
 class SedesView(ctk.CTkFrame):
@@ -9,6 +12,9 @@ class SedesView(ctk.CTkFrame):
         super().__init__(parent, fg_color="transparent")
         
         self.sedes_model = SedesModel()
+        self.query = AsyncQuery(self)
+        # Search-as-you-type: waits for a pause and reuses the recent results
+        self.search = SearchController(self.query, "sedes", self.sedes_model.get_all_sedes, self._show_sedes)
         
         self.pack_propagate(False)
         self.pack(padx=15, pady=15, fill="both", expand=True)
@@ -68,20 +74,13 @@ class SedesView(ctk.CTkFrame):
         self.tree.bind("<Button-1>", self.prevent_resize)
         self.tree.bind("<B1-Motion>", self.prevent_resize)
 
-    def refresh_sedes(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
+    def refresh_sedes(self, debounce=False):
+        # Reads the list in the background; with debounce (typing) it waits for a pause
         search_term = self.search_entry.get()
-        sedes_list = self.sedes_model.get_all_sedes(search_term)
-        
-        for i, sede_data in enumerate(sedes_list):
-            item_id = self.tree.insert("", "end", iid=str(sede_data[0]), values=(sede_data[0], sede_data[1]))
-            if i % 2 == 1:
-                self.tree.item(item_id, tags=('alternate',))
-        
-        current_mode = ctk.get_appearance_mode()
-        self.tree.tag_configure('alternate', background=('#f8f9fa' if current_mode == "Light" else '#323232'))
+        if debounce:
+            self.search.request(search_term)
+        else:
+            self.search.refresh(search_term)
         
         if not hasattr(self, 'selected_actions_frame'):
             self.selected_actions_frame = ctk.CTkFrame(self, corner_radius=12)
@@ -97,6 +96,17 @@ class SedesView(ctk.CTkFrame):
         
         self.on_sede_select()
 
+    def _show_sedes(self, sedes_list):
+        # Reconciled with the rows already in the table, keeping the selection and the scroll position
+        rows = [(str(sede_data[0]), (sede_data[0], sede_data[1]), ('alternate',) if i % 2 == 1 else ())
+                for i, sede_data in enumerate(sedes_list)]
+        sync_treeview(self.tree, rows)
+        
+        current_mode = ctk.get_appearance_mode()
+        self.tree.tag_configure('alternate', background=('#f8f9fa' if current_mode == "Light" else '#323232'))
+        
+        self.on_sede_select()
+
     def on_sede_select(self, event=None):
         if hasattr(self, 'edit_selected_btn'):
             if self.tree.focus():
@@ -132,7 +142,7 @@ class SedesView(ctk.CTkFrame):
                 self.refresh_sedes()
     
     def on_search(self, event=None): 
-        self.refresh_sedes()
+        self.refresh_sedes(debounce=True)
     
     def add_sede_dialog(self):
         dialog = SedeDialog(self, "Agregar Sede")
@@ -0,0 +1,97 @@
+import tkinter as tk
+import customtkinter as ctk
+from database.executor import get_executor
+from utils.font_config import get_font
+
+# How often the Tk thread checks for finished queries
+POLL_INTERVAL_MS = 20
+
+class AsyncQuery:
+    """
+    Runs model calls off the Tk thread on behalf of a widget and hands the results
+    back to it with after(). Each call has a key (e.g. "search"): a newer call with
+    the same key supersedes the older one, whose result is dropped even if it was
+    already running.
+    """
+    def __init__(self, widget, executor=None):
+        self.widget = widget
+        self.executor = executor or get_executor()
+        self._pending = {} # key -> (future, on_result, on_error, on_busy)
+        self._poll_id = None
+
+    def run(self, key, fn, *args, on_result=None, on_error=None, on_busy=None, **kwargs):
+        future = self.executor.submit(fn, *args, key=(id(self), key), **kwargs)
+        self._pending[key] = (future, on_result, on_error, on_busy)
+        if on_busy:
+            on_busy(True)
+        self._schedule()
+        return future
+
+    def is_pending(self, key):
+        return key in self._pending
+
+    def cancel(self, key):
+        """Drops the pending call with this key, e.g. when its widgets are destroyed."""
+        pending = self._pending.pop(key, None)
+        if pending is not None:
+            pending[0].cancel()
+
+    def cancel_all(self):
+        for key, (future, _, _, _) in self._pending.items():
+            future.cancel()
+        self._pending.clear()
+        if self._poll_id is not None:
+            try:
+                self.widget.after_cancel(self._poll_id)
+            except tk.TclError:
+                pass
+            self._poll_id = None
+
+    def _schedule(self):
+        if self._poll_id is None:
+            try:
+                self._poll_id = self.widget.after(POLL_INTERVAL_MS, self._poll)
+            except tk.TclError:
+                # The widget was destroyed, nobody is waiting for the results
+                self._pending.clear()
+
+    def _poll(self):
+        self._poll_id = None
+        try:
+            if not self.widget.winfo_exists():
+                self.cancel_all()
+                return
+        except tk.TclError:
+            self._pending.clear()
+            return
+
+        for key, (future, on_result, on_error, on_busy) in list(self._pending.items()):
+            if not future.done():
+                continue
+            del self._pending[key]
+            if on_busy:
+                on_busy(False)
+            if future.cancelled():
+                continue
+            error = future.exception()
+            if error is not None:
+                if on_error:
+                    on_error(error)
+                else:
+                    print(f"Error en consulta en segundo plano ({key}): {error}")
+            elif on_result:
+                on_result(future.result())
+
+        if self._pending:
+            self._schedule()
+
+class LoadingLabel(ctk.CTkLabel):
+    """Small label that shows a loading message while a query is running."""
+    def __init__(self, parent, text="Cargando...", **kwargs):
+        kwargs.setdefault("font", get_font("small"))
+        kwargs.setdefault("text_color", "gray")
+        super().__init__(parent, text="", **kwargs)
+        self.loading_text = text
+
+    def set_loading(self, busy):
+        self.configure(text=self.loading_text if busy else "")
@@ -0,0 +1,120 @@
+import queue
+import threading
+import tkinter as tk
+import customtkinter as ctk
+from tkinter import messagebox
+from utils.font_config import get_font
+
+# How often the dialog reads the progress reported by the worker
+POLL_INTERVAL_MS = 100
+
+class ExportProgressDialog(ctk.CTkToplevel):
+    """
+    Runs an export in a worker thread and shows its progress. The worker only
+    talks to the dialog through a queue, which is read on the Tk thread with
+    after(); Cancel sets an event that the export checks between rows.
+
+    export_fn is called as export_fn(file_path, progress=..., cancel_event=...)
+    and returns the export statistics.
+    """
+    def __init__(self, parent, file_path, export_fn):
+        super().__init__(parent)
+        self.title("Exportando datos")
+        self.geometry("420x160")
+        self.resizable(False, False)
+        if parent is not None:
+            self.transient(parent)
+        self.protocol("WM_DELETE_WINDOW", self._cancel)
+
+        self.file_path = file_path
+        self.export_fn = export_fn
+        self.cancel_event = threading.Event()
+        self.messages = queue.Queue()
+
+        self.grid_columnconfigure(0, weight=1)
+        self.status_label = ctk.CTkLabel(self, text="Preparando exportación...", font=get_font("normal"), anchor="w")
+        self.status_label.grid(row=0, column=0, padx=20, pady=(20, 5), sticky="ew")
+        self.progress_bar = ctk.CTkProgressBar(self)
+        self.progress_bar.grid(row=1, column=0, padx=20, pady=5, sticky="ew")
+        self.progress_bar.set(0)
+        self.rows_label = ctk.CTkLabel(self, text="", font=get_font("small"), text_color="gray", anchor="w")
+        self.rows_label.grid(row=2, column=0, padx=20, pady=0, sticky="ew")
+        self.cancel_btn = ctk.CTkButton(self, text="Cancelar", command=self._cancel, font=get_font("normal"))
+        self.cancel_btn.grid(row=3, column=0, padx=20, pady=(10, 20))
+
+        self.worker = threading.Thread(target=self._work, daemon=True)
+        self.worker.start()
+        self.after(POLL_INTERVAL_MS, self._poll)
+
+    def _work(self):
+        # Worker thread: never touches the widgets
+        from utils.exporter import ExportCancelled
+        try:
+            stats = self.export_fn(self.file_path, progress=self._report, cancel_event=self.cancel_event)
+            self.messages.put(("done", stats))
+        except ExportCancelled:
+            self.messages.put(("cancelled", None))
+        except Exception as e:
+            self.messages.put(("error", e))
+
+    def _report(self, sheet_index, sheet_count, title, rows, total):
+        self.messages.put(("progress", (sheet_index, sheet_count, title, rows, total)))
+
+    def _cancel(self):
+        if not self.cancel_event.is_set():
+            self.cancel_event.set()
+            self.cancel_btn.configure(text="Cancelando...", state="disabled")
+
+    def _poll(self):
+        try:
+            if not self.winfo_exists():
+                self.cancel_event.set()
+                return
+        except tk.TclError:
+            self.cancel_event.set()
+            return
+
+        # Only the last progress report matters, the rest are skipped
+        progress = None
+        while True:
+            try:
+                kind, payload = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                progress = payload
+            else:
+                self._finish(kind, payload)
+                return
+        if progress is not None:
+            self._show_progress(*progress)
+        self.after(POLL_INTERVAL_MS, self._poll)
+
+    def _show_progress(self, sheet_index, sheet_count, title, rows, total):
+        fraction = min(rows / total, 1) if total else 0
+        self.progress_bar.set((sheet_index + fraction) / sheet_count)
+        self.status_label.configure(text=f"Hoja {sheet_index + 1} de {sheet_count}: {title}")
+        if total:
+            self.rows_label.configure(text=f"{rows:,} de {total:,}")
+        else:
+            self.rows_label.configure(text=f"{rows:,}" if rows else "")
+
+    def _finish(self, kind, payload):
+        parent = self.master
+        self.destroy()
+        if kind == "done":
+            # The SQLite copy is measured in MB, the other formats in rows
+            if payload.get('total_rows') is None:
+                summary = f"{payload['size_mb']} MB"
+            else:
+                summary = f"{payload['total_rows']} filas"
+            messagebox.showinfo(
+                "Exportación Exitosa",
+                f"Los datos se han guardado en:\n{self.file_path}\n\n"
+                f"{summary} en {payload['seconds']} s",
+                parent=parent
+            )
+        elif kind == "cancelled":
+            messagebox.showinfo("Exportación cancelada", "La exportación fue cancelada, no se creó el archivo.", parent=parent)
+        else:
+            messagebox.showerror("Error de Exportación", f"Ocurrió un error al exportar los datos: {payload}", parent=parent)
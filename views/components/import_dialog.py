@@ -0,0 +1,98 @@
+import customtkinter as ctk
+from tkinter import filedialog, messagebox
+from utils.font_config import get_font
+from utils.importer import summarize, summarize_sync, sync_report_rows, write_error_report, write_sync_report
+
+# Changes listed in the sync preview; the saved report has all of them
+SYNC_PREVIEW_ROWS = 200
+
+IMPORT_FILETYPES = [("Excel o CSV", "*.xlsx *.xlsm *.csv"), ("All files", "*.*")]
+
+def ask_import_file(parent, title):
+    """Asks for the roster file to import; returns None if the user cancels."""
+    return filedialog.askopenfilename(title=title, filetypes=IMPORT_FILETYPES, parent=parent) or None
+
+def show_import_result(parent, result, key_name, summary=None):
+    """
+    Shows the summary of an import and, when some rows were rejected, offers to
+    save them with their errors to a CSV file. summary replaces the default text
+    for the imports with other counts, like the inventory.
+    """
+    summary = summary or summarize(result, key_name)
+    if not result.errors:
+        messagebox.showinfo("Importación Terminada", summary, parent=parent)
+        return
+    first = "\n".join(f"Línea {e.line}: {e.message} ({e.value})" for e in result.errors[:5])
+    save = messagebox.askyesno(
+        "Importación Terminada",
+        f"{summary}\n\nPrimeros errores:\n{first}\n\n¿Desea guardar el reporte de errores?",
+        parent=parent
+    )
+    if save:
+        report_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv")],
+            title="Guardar Reporte de Errores",
+            parent=parent
+        )
+        if report_path:
+            write_error_report(report_path, result.errors)
+
+def show_import_error(parent, error):
+    messagebox.showerror("Error de Importación", f"No se pudo importar el archivo: {error}", parent=parent)
+
+class RosterSyncDialog(ctk.CTkToplevel):
+    """
+    Dry run of a semester roster sync: shows the counts and the first changes,
+    and lets the user apply them, save the full report or cancel. on_apply is
+    called with no arguments when the user confirms.
+    """
+    def __init__(self, parent, result, project_names, on_apply):
+        super().__init__(parent)
+        self.title("Sincronizar Lista del Semestre")
+        self.geometry("720x520")
+        self.transient(parent)
+        self.result = result
+        self.project_names = project_names
+        self.on_apply = on_apply
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+        ctk.CTkLabel(self, text=summarize_sync(result), font=get_font("normal"), justify="left", anchor="w") \
+            .grid(row=0, column=0, padx=20, pady=(20, 10), sticky="ew")
+
+        preview = ctk.CTkTextbox(self, font=get_font("small"), wrap="none")
+        preview.grid(row=1, column=0, padx=20, pady=5, sticky="nsew")
+        for count, row in enumerate(sync_report_rows(result.diff, project_names)):
+            if count >= SYNC_PREVIEW_ROWS:
+                preview.insert("end", "... (ver el reporte completo)\n")
+                break
+            cambio, codigo, nombre, _, _, detalle = row
+            preview.insert("end", f"{cambio}: {codigo} {nombre or ''} {detalle}\n")
+        preview.configure(state="disabled")
+
+        buttons = ctk.CTkFrame(self, fg_color="transparent")
+        buttons.grid(row=2, column=0, padx=20, pady=(10, 20), sticky="e")
+        diff = result.diff
+        has_changes = bool(diff.inserts or diff.filled or diff.updates)
+        ctk.CTkButton(buttons, text="Aplicar Cambios", command=self._apply, font=get_font("normal"),
+                      state="normal" if has_changes else "disabled").pack(side="left", padx=5)
+        ctk.CTkButton(buttons, text="Guardar Reporte", command=self._save_report, font=get_font("normal")) \
+            .pack(side="left", padx=5)
+        ctk.CTkButton(buttons, text="Cancelar", command=self.destroy, font=get_font("normal"),
+                      fg_color="gray").pack(side="left", padx=5)
+        self.grab_set()
+
+    def _apply(self):
+        self.destroy()
+        self.on_apply()
+
+    def _save_report(self):
+        report_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv")],
+            title="Guardar Reporte de Sincronización",
+            parent=self
+        )
+        if report_path:
+            write_sync_report(report_path, self.result)
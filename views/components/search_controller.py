@@ -0,0 +1,197 @@
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from database import instrumentation
+
+# Quiet time after the last keystroke before the query runs
+SEARCH_DELAY_MS = 250
+
+# Shorter wait for the searches answered by the catalog cache (database.catalog),
+# which take a few milliseconds
+CATALOG_SEARCH_DELAY_MS = 80
+
+# Recent searches of each controller kept with their results
+SEARCH_CACHE_SIZE = 16
+
+# Age after which a cached result is read again, since other views (loans,
+# imports) also change the tables
+SEARCH_CACHE_SECONDS = 30
+
+_stats = {} # controller name -> SearchStats, summed over every view instance
+_stats_lock = threading.Lock()
+
+class SearchStats:
+    """
+    Counters of one kind of search. Every request that did not end in a query is
+    a query saved: coalesced while typing, same terms as the last search or
+    answered from the cache.
+    """
+    __slots__ = ('requests', 'coalesced', 'unchanged', 'cache_hits', 'queries', 'superseded')
+
+    def __init__(self):
+        self.requests = 0
+        self.coalesced = 0
+        self.unchanged = 0
+        self.cache_hits = 0
+        self.queries = 0
+        self.superseded = 0
+
+    @property
+    def saved(self):
+        return self.requests - self.queries
+
+    def as_dict(self):
+        stats = {name: getattr(self, name) for name in self.__slots__}
+        stats['saved'] = self.saved
+        return stats
+
+def _search_stats(name):
+    with _stats_lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = SearchStats()
+        return stats
+
+def get_search_stats():
+    """Counters recorded so far, by controller name."""
+    with _stats_lock:
+        return {name: stats.as_dict() for name, stats in _stats.items()}
+
+def reset_search_stats():
+    with _stats_lock:
+        _stats.clear()
+
+def format_search_stats():
+    """Table of the searches, most requests first."""
+    rows = sorted(get_search_stats().items(), key=lambda item: item[1]['requests'], reverse=True)
+    lines = [f"{'search':<20} {'requests':>9} {'queries':>8} {'saved':>6} {'coalesced':>10} "
+             f"{'unchanged':>10} {'cached':>7} {'superseded':>11}"]
+    for name, s in rows:
+        lines.append(f"{name:<20} {s['requests']:>9} {s['queries']:>8} {s['saved']:>6} {s['coalesced']:>10} "
+                     f"{s['unchanged']:>10} {s['cache_hits']:>7} {s['superseded']:>11}")
+    return '\n'.join(lines)
+
+def _freeze(value):
+    # The keyword arguments and the filters of the loan histories come as dicts;
+    # the cache needs hashable keys
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (tuple, list)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+class SearchController:
+    """
+    Search-as-you-type on top of an AsyncQuery. request() is called on every
+    keystroke with the arguments for fetch; the call waits for delay_ms of quiet,
+    so a burst of keys ends in a single query for the last terms. Terms equal to
+    the ones already shown do not query again, recent terms are answered from a
+    small cache, and a result that arrives after a newer request was made is
+    dropped (the AsyncQuery key takes care of the queries still running).
+
+    refresh() runs at once and empties the cache, for the reloads after an edit.
+    The counters are kept per name in SearchStats (see get_search_stats).
+    """
+    def __init__(self, query, name, fetch, on_result, key="refresh", on_busy=None,
+                 delay_ms=SEARCH_DELAY_MS, cache_size=SEARCH_CACHE_SIZE, cache_seconds=SEARCH_CACHE_SECONDS):
+        self.query = query
+        self.widget = query.widget
+        self.fetch = fetch
+        self.on_result = on_result
+        self.key = key
+        self.on_busy = on_busy
+        self.delay_ms = delay_ms
+        self.cache_size = cache_size
+        self.cache_seconds = cache_seconds
+        self.stats = _search_stats(name)
+        self._cache = OrderedDict() # frozen arguments -> (time, result)
+        self._after_id = None
+        self._waiting = None  # (args, kwargs) of the request waiting for the quiet time
+        self._current = None  # frozen arguments of the result shown or the query running
+
+    def request(self, *args, **kwargs):
+        """Debounced search: only the last call of a burst goes on."""
+        self.stats.requests += 1
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self.stats.coalesced += 1
+        self._waiting = (args, kwargs)
+        self._after_id = self.widget.after(self.delay_ms, self._flush)
+
+    def refresh(self, *args, **kwargs):
+        """Runs the search now, skipping the cache, which is emptied (the data changed)."""
+        self.stats.requests += 1
+        self._cancel_wait()
+        self._cache.clear()
+        self._run(args, kwargs, _freeze((args, kwargs)))
+
+    def is_pending(self):
+        """True while a request waits for the quiet time or its query runs."""
+        return self._after_id is not None or self.query.is_pending(self.key)
+
+    def cancel(self):
+        self._cancel_wait()
+        self.query.cancel(self.key)
+
+    def _cancel_wait(self):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        self._waiting = None
+
+    def _flush(self):
+        self._after_id = None
+        args, kwargs = self._waiting
+        self._waiting = None
+        frozen = _freeze((args, kwargs))
+        if frozen == self._current:
+            # e.g. the arrow or shift keys: same terms as what is shown or loading
+            self.stats.unchanged += 1
+            return
+        cached = self._cache.get(frozen)
+        if cached is not None and time.monotonic() - cached[0] < self.cache_seconds:
+            self._cache.move_to_end(frozen)
+            self.stats.cache_hits += 1
+            self._drop_running()
+            self._current = frozen
+            self.on_result(cached[1])
+            return
+        self._run(args, kwargs, frozen)
+
+    def _run(self, args, kwargs, frozen):
+        self._drop_running()
+        self.stats.queries += 1
+        self._current = frozen
+        self.query.run(self.key, self.fetch, *args, **kwargs,
+                       on_result=lambda result: self._show(frozen, result), on_error=self._failed,
+                       on_busy=self.on_busy)
+
+    def _drop_running(self):
+        # The query of older terms is still running: its result is not wanted anymore
+        if self.query.is_pending(self.key):
+            self.stats.superseded += 1
+            self.query.cancel(self.key)
+            if self.on_busy:
+                self.on_busy(False)
+
+    def _show(self, frozen, result):
+        if frozen != self._current:
+            return
+        self._cache[frozen] = (time.monotonic(), result)
+        self._cache.move_to_end(frozen)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        self.on_result(result)
+
+    def _failed(self, error):
+        # The same terms have to be able to query again
+        self._current = None
+        print(f"Error en la búsqueda: {error}")
+
+def _write_summary():
+    # Same switch as the model timings (LAB_DB_INSTRUMENT)
+    if instrumentation.is_enabled() and _stats:
+        print('Búsquedas\n' + format_search_stats())
+
+atexit.register(_write_summary)
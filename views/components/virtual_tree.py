@@ -0,0 +1,479 @@
+import tkinter as tk
+from tkinter import ttk
+
+# Items kept in the widget beyond the rows that fit, so a partially visible last row
+# and a small resize are covered without waiting for the next render
+VIRTUAL_BUFFER_ROWS = 2
+
+# Rows moved by one step of the mouse wheel
+WHEEL_ROWS = 3
+
+# Row height used until the style reports one
+DEFAULT_ROW_HEIGHT = 25
+
+class VirtualTreeview(ttk.Treeview):
+    """
+    A ttk.Treeview for long result sets. The rows live in plain lists (iid, values
+    and tags) and the widget only holds the items that fit on screen plus
+    VIRTUAL_BUFFER_ROWS; scrolling rewrites those same items instead of walking
+    through one Tk item per row, so filling it with 100k rows costs about as much
+    as appending them to a list.
+
+    insert, item, delete, get_children, exists, index, focus, selection, see and
+    identify_row take and return the row iids (e.g. "student_12") like a normal
+    Treeview, yview and yscrollcommand cover the whole result set, and the tags,
+    styles, headings and <<TreeviewSelect>> bindings work as usual. Only top level
+    rows are supported. With selectmode="extended" (the default) Shift-click and
+    Shift with the navigation keys select the range from the anchor, the last row
+    chosen without Shift, over every row and not only the visible ones. sync_rows
+    swaps in a new result set keeping the selection and the scroll position.
+    near_end_command, if given, is called when the view gets close to the last row
+    (to fetch the next page of a paged listing).
+    """
+    def __init__(self, master=None, near_end_command=None, **kw):
+        self._yscroll = kw.pop("yscrollcommand", None)
+        super().__init__(master, **kw)
+        self.near_end_command = near_end_command
+        self._iids = []
+        self._values = []
+        self._tags = []
+        self._positions = {}
+        self._selected = set()
+        self._focus = ""
+        self._anchor = ""
+        self._top = 0
+        self._slots = []
+        self._slot_rows = []
+        self._rendered = []
+        self._visible = 1
+        self._auto_id = 0
+        self._render_id = None
+
+        # Own bindtag ahead of the widget's, so the row selection is up to date
+        # before the <<TreeviewSelect>> handlers bound by the views run
+        tag = f"VirtualTreeview{id(self)}"
+        self.bindtags((tag,) + self.bindtags())
+        self.bind_class(tag, "<<TreeviewSelect>>", self._sync_selection)
+        self.bind_class(tag, "<Configure>", self._on_resize)
+        self.bind_class(tag, "<MouseWheel>", self._on_wheel)
+        self.bind_class(tag, "<Button-4>", self._on_wheel)
+        self.bind_class(tag, "<Button-5>", self._on_wheel)
+        self.bind_class(tag, "<Shift-Button-1>", self._on_shift_click)
+        for key, step in (("Up", -1), ("Down", 1), ("Prior", "page_up"), ("Next", "page_down"),
+                          ("Home", "home"), ("End", "end")):
+            self.bind_class(tag, f"<{key}>", lambda event, step=step: self._on_key(step))
+            self.bind_class(tag, f"<Shift-{key}>", lambda event, step=step: self._on_key(step, extend=True))
+
+    # --- Rows --------------------------------------------------------------
+
+    def insert(self, parent, index, iid=None, **kw):
+        if parent != "":
+            raise tk.TclError("VirtualTreeview only holds top level rows")
+        if iid is None:
+            self._auto_id += 1
+            iid = f"I{self._auto_id:03X}"
+        iid = str(iid)
+        if iid in self._positions:
+            raise tk.TclError(f"Item {iid} already exists")
+        values = tuple(kw.get("values", ()))
+        tags = self._tag_tuple(kw.get("tags", ()))
+        if index == "end" or int(index) >= len(self._iids):
+            self._positions[iid] = len(self._iids)
+            self._iids.append(iid)
+            self._values.append(values)
+            self._tags.append(tags)
+        else:
+            position = max(int(index), 0)
+            self._iids.insert(position, iid)
+            self._values.insert(position, values)
+            self._tags.insert(position, tags)
+            self._reindex()
+        self._schedule_render()
+        return iid
+
+    def set_rows(self, rows):
+        """Replaces every row with rows, an iterable of (iid, values, tags)."""
+        self.clear()
+        for iid, values, tags in rows:
+            self.insert("", "end", iid=iid, values=values, tags=tags)
+
+    def sync_rows(self, rows):
+        """
+        Reconciles the rows with a new result set of (iid, values, tags), matched by
+        iid: rows that went away are dropped, new ones added and the rest updated or
+        moved in place. The selection and focus are kept for the iids still present
+        and the row at the top of the view stays there, so a refresh after an edit
+        does not jump back to the start. Only the visible items whose content
+        changed are rewritten. Returns True if anything changed.
+        """
+        iids, values, tags = [], [], []
+        for iid, row_values, row_tags in rows:
+            iids.append(str(iid))
+            values.append(tuple(row_values))
+            tags.append(self._tag_tuple(row_tags))
+        if iids == self._iids and values == self._values and tags == self._tags:
+            return False
+        positions = {iid: position for position, iid in enumerate(iids)}
+        if len(positions) != len(iids):
+            raise tk.TclError("Repeated iid in the rows")
+
+        anchor = self._iids[self._top] if self._top < len(self._iids) else None
+        self._iids, self._values, self._tags = iids, values, tags
+        self._positions = positions
+        # Without the old top row, the view stays at the same offset
+        self._top = positions.get(anchor, self._top)
+        if self._focus not in positions:
+            self._focus = ""
+        selected = self._selected & positions.keys()
+        selection_changed = selected != self._selected
+        self._selected = selected
+        self._schedule_render()
+        if selection_changed:
+            self.event_generate("<<TreeviewSelect>>")
+        return True
+
+    def clear(self):
+        """Deletes every row, which also clears the selection and the focus."""
+        had_selection = bool(self._selected)
+        self._iids, self._values, self._tags = [], [], []
+        self._positions = {}
+        self._selected = set()
+        self._focus = ""
+        self._top = 0
+        self._schedule_render()
+        if had_selection:
+            self.event_generate("<<TreeviewSelect>>")
+
+    def delete(self, *items):
+        doomed = {str(iid) for iid in items}
+        missing = doomed - self._positions.keys()
+        if missing:
+            raise tk.TclError(f"Item {missing.pop()} not found")
+        if len(doomed) == len(self._iids):
+            self.clear()
+            return
+        keep = [i for i, iid in enumerate(self._iids) if iid not in doomed]
+        self._iids = [self._iids[i] for i in keep]
+        self._values = [self._values[i] for i in keep]
+        self._tags = [self._tags[i] for i in keep]
+        self._reindex()
+        self._selected -= doomed
+        if self._focus in doomed:
+            self._focus = ""
+        self._schedule_render()
+
+    def get_children(self, item=None):
+        return tuple(self._iids) if not item else ()
+
+    def exists(self, item):
+        return str(item) in self._positions
+
+    def index(self, item):
+        return self._position(item)
+
+    def item(self, item, option=None, **kw):
+        position = self._position(item)
+        if kw:
+            if "values" in kw:
+                self._values[position] = tuple(kw["values"])
+            if "tags" in kw:
+                self._tags[position] = self._tag_tuple(kw["tags"])
+            self._schedule_render()
+            return None
+        # Like Tk, the values come back as text
+        values = tuple(str(value) for value in self._values[position])
+        info = {"text": "", "image": "", "values": values, "open": 0, "tags": list(self._tags[position])}
+        return info[option] if option is not None else info
+
+    def _position(self, item):
+        try:
+            return self._positions[str(item)]
+        except KeyError:
+            raise tk.TclError(f"Item {item} not found") from None
+
+    def _reindex(self):
+        self._positions = {iid: position for position, iid in enumerate(self._iids)}
+
+    @staticmethod
+    def _tag_tuple(tags):
+        if isinstance(tags, str):
+            return tuple(tags.split()) if tags else ()
+        return tuple(tags or ())
+
+    # --- Selection and focus -----------------------------------------------
+
+    def focus(self, item=None):
+        if item is None:
+            return self._focus if self._focus in self._positions else ""
+        self._focus = self._anchor = str(item) if item else ""
+        if self._focus:
+            self.see(self._focus)
+        self._schedule_render()
+        return None
+
+    def selection(self):
+        return tuple(sorted(self._selected, key=self._positions.__getitem__))
+
+    def selection_set(self, *items):
+        self._change_selection(set(self._flatten(items)), replace=True)
+
+    def selection_add(self, *items):
+        self._change_selection(set(self._flatten(items)), replace=False)
+
+    def selection_remove(self, *items):
+        self._selected -= set(self._flatten(items))
+        self._schedule_render()
+        self.event_generate("<<TreeviewSelect>>")
+
+    def _change_selection(self, items, replace):
+        for iid in items:
+            self._position(iid)
+        self._selected = items if replace else self._selected | items
+        self._schedule_render()
+        self.event_generate("<<TreeviewSelect>>")
+
+    @staticmethod
+    def _flatten(items):
+        for item in items:
+            if isinstance(item, (list, tuple)):
+                yield from (str(i) for i in item)
+            else:
+                yield str(item)
+
+    def identify_row(self, y):
+        slot = super().identify_row(y)
+        return self._slot_iid(slot)
+
+    def _slot_iid(self, slot):
+        try:
+            return self._rendered[self._slots.index(slot)]
+        except ValueError:
+            return ""
+
+    def _sync_selection(self, event=None):
+        # Takes the clicks on the visible items back to the rows they show. The rows
+        # selected outside the window keep their state. With a render pending the
+        # items are behind the rows, which already have the right state
+        if self._render_id is not None:
+            return
+        window = {iid for iid in self._rendered if iid}
+        chosen = {self._slot_iid(slot) for slot in super().selection()} - {""}
+        self._selected = (self._selected - window) | chosen
+        focused = self._slot_iid(super().focus())
+        if focused:
+            self._focus = self._anchor = focused
+        # A click on the partially visible last row makes Tk scroll its own view
+        super().yview_moveto(0)
+
+    # --- Scrolling ---------------------------------------------------------
+
+    def configure(self, cnf=None, **kw):
+        if isinstance(cnf, dict) and "yscrollcommand" in cnf:
+            cnf = dict(cnf)
+            kw["yscrollcommand"] = cnf.pop("yscrollcommand")
+        if "yscrollcommand" in kw:
+            self._yscroll = kw.pop("yscrollcommand")
+            self._update_scrollbar()
+        if not cnf and not kw:
+            return super().configure() if cnf is None else None
+        return super().configure(cnf, **kw)
+
+    config = configure
+
+    def yview(self, *args):
+        if not args:
+            return self._fractions()
+        if args[0] == "moveto":
+            self._scroll_to(round(float(args[1]) * len(self._iids)))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            rows = amount * self._visible if args[2] == "pages" else amount
+            self._scroll_to(self._top + rows)
+        return None
+
+    def yview_moveto(self, fraction):
+        self.yview("moveto", fraction)
+
+    def yview_scroll(self, number, what):
+        self.yview("scroll", number, what)
+
+    def see(self, item):
+        position = self._position(item)
+        if position < self._top:
+            self._scroll_to(position)
+        elif position >= self._top + self._visible:
+            self._scroll_to(position - self._visible + 1)
+
+    def _scroll_to(self, top):
+        top = max(0, min(top, len(self._iids) - self._visible))
+        if top != self._top:
+            self._top = top
+            self._schedule_render()
+
+    def _fractions(self):
+        total = len(self._iids)
+        if total <= self._visible:
+            return 0.0, 1.0
+        return self._top / total, min(self._top + self._visible, total) / total
+
+    def _update_scrollbar(self):
+        if self._yscroll:
+            first, last = self._fractions()
+            self._yscroll(first, last)
+
+    def _on_wheel(self, event):
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self._scroll_to(self._top - WHEEL_ROWS)
+        else:
+            self._scroll_to(self._top + WHEEL_ROWS)
+        return "break"
+
+    def _extends(self):
+        return str(self.cget("selectmode")) == "extended"
+
+    def _select_range(self, iid):
+        # From the anchor to iid, in row order; the anchor stays for the next Shift
+        anchor = self._anchor if self._anchor in self._positions else iid
+        first, last = sorted((self._positions[anchor], self._positions[iid]))
+        self._selected = set(self._iids[first:last + 1])
+        self._anchor = anchor
+        self._focus = iid
+
+    def _on_shift_click(self, event):
+        # Tk would only extend over the visible items
+        if not self._extends():
+            return None
+        self.focus_set()
+        iid = self.identify_row(event.y)
+        if iid:
+            self._select_range(iid)
+            self._schedule_render()
+            self.event_generate("<<TreeviewSelect>>")
+        return "break"
+
+    def _on_key(self, step, extend=False):
+        if not self._iids:
+            return "break"
+        current = self._positions.get(self._focus, -1)
+        if step == "home":
+            target = 0
+        elif step == "end":
+            target = len(self._iids) - 1
+        elif step in ("page_up", "page_down"):
+            target = current + (self._visible if step == "page_down" else -self._visible)
+        else:
+            target = current + step
+        target = max(0, min(target, len(self._iids) - 1))
+        iid = self._iids[target]
+        if extend and self._extends():
+            self._select_range(iid)
+        else:
+            self._focus = self._anchor = iid
+            self._selected = {iid}
+        self.see(iid)
+        self._schedule_render()
+        self.event_generate("<<TreeviewSelect>>")
+        return "break"
+
+    def _on_resize(self, event=None):
+        style = ttk.Style(self)
+        row_height = int(style.lookup(self.cget("style") or "Treeview", "rowheight") or DEFAULT_ROW_HEIGHT)
+        self._visible = max(1, self.winfo_height() // row_height - 1) # the heading takes about one row
+        self._scroll_to(self._top)
+        self._schedule_render()
+
+    # --- Rendering ---------------------------------------------------------
+
+    def _schedule_render(self):
+        if self._render_id is None:
+            self._render_id = self.after_idle(self._render)
+
+    def _render(self):
+        self._render_id = None
+        total = len(self._iids)
+        self._top = max(0, min(self._top, total - self._visible))
+        wanted = min(self._visible + VIRTUAL_BUFFER_ROWS, total - self._top)
+
+        # Recycles the existing items; new ones are only created when the widget grows.
+        # _slot_rows keeps what each item shows (None if detached), so only the items
+        # whose values or tags changed are rewritten
+        while len(self._slots) < wanted:
+            self._slots.append(super().insert("", "end", iid=f"__slot{len(self._slots)}"))
+            self._slot_rows.append(None)
+        rendered = []
+        selected_slots = []
+        focus_slot = ""
+        for index, slot in enumerate(self._slots):
+            position = self._top + index
+            if index >= wanted:
+                if self._slot_rows[index] is not None:
+                    super().detach(slot)
+                    self._slot_rows[index] = None
+                rendered.append("")
+                continue
+            iid = self._iids[position]
+            row = (self._values[position], self._tags[position])
+            if self._slot_rows[index] is None:
+                super().move(slot, "", index)
+            if self._slot_rows[index] != row:
+                super().item(slot, values=row[0], tags=row[1])
+                self._slot_rows[index] = row
+            rendered.append(iid)
+            if iid in self._selected:
+                selected_slots.append(slot)
+            if iid == self._focus:
+                focus_slot = slot
+        self._rendered = rendered
+
+        if set(super().selection()) != set(selected_slots):
+            super().selection_set(selected_slots)
+        super().focus(focus_slot)
+        super().yview_moveto(0)
+        self._update_scrollbar()
+
+        if (self.near_end_command and total
+                and self._top + self._visible + VIRTUAL_BUFFER_ROWS >= total):
+            self.near_end_command()
+
+    def destroy(self):
+        if self._render_id is not None:
+            self.after_cancel(self._render_id)
+            self._render_id = None
+        super().destroy()
+
+def sync_treeview(tree, rows):
+    """
+    sync_rows for any Treeview: reconciles its top level items with rows, an
+    iterable of (iid, values, tags), deleting, inserting, moving and updating only
+    the items that differ, so the selection and the scroll position survive a
+    refresh. A VirtualTreeview does it on its row lists.
+    """
+    if isinstance(tree, VirtualTreeview):
+        return tree.sync_rows(rows)
+    rows = [(str(iid), tuple(values), VirtualTreeview._tag_tuple(tags)) for iid, values, tags in rows]
+    wanted = {iid for iid, _, _ in rows}
+    stale = [iid for iid in tree.get_children() if iid not in wanted]
+    if stale:
+        tree.delete(*stale)
+    current = list(tree.get_children())
+    present = set(current)
+    changed = bool(stale)
+    for index, (iid, values, tags) in enumerate(rows):
+        if iid not in present:
+            tree.insert("", index, iid=iid, values=values, tags=tags)
+            current.insert(index, iid)
+            present.add(iid)
+            changed = True
+            continue
+        if current[index] != iid:
+            tree.move(iid, "", index)
+            current.remove(iid)
+            current.insert(index, iid)
+            changed = True
+        # Tk hands the values back as text (or numbers), so both sides are compared as text
+        old_values = tuple(str(value) for value in tree.item(iid, "values"))
+        old_tags = tuple(str(tag) for tag in tree.item(iid, "tags"))
+        if old_values != tuple(str(value) for value in values) or old_tags != tags:
+            tree.item(iid, values=values, tags=tags)
+            changed = True
+    return changed
@@ -10,6 +10,7 @@ from PIL import Image, ImageTk
 import os
 import math
 from database.models import DashboardModel
+from views.components.async_query import AsyncQuery
 
 class DashboardView(ctk.CTkScrollableFrame):
     def __init__(self, parent, main_window=None):
@@ -17,6 +18,8 @@ class DashboardView(ctk.CTkScrollableFrame):
         self.parent = parent
         self.main_window = main_window
         self.dashboard_model = DashboardModel()
+        # The metrics are read off the Tk thread
+        self.query = AsyncQuery(self)
         
         # Auto-refresh control
         self.auto_refresh = True
@@ -270,24 +273,40 @@ class DashboardView(ctk.CTkScrollableFrame):
         self.refresh_button.pack(side="right", padx=(0, 24))
     
     def load_data(self):
-        """Load and update all dashboard data"""
+        """Load all dashboard data in the background and update the widgets when it arrives"""
+        self.query.run("load", self.fetch_data, on_result=self.show_data,
+                       on_error=lambda e: print(f"Error loading dashboard data: {e}"),
+                       on_busy=self.set_loading)
+
+    def fetch_data(self):
+        """Runs in a worker thread: reads every metric, no widgets are touched here"""
+        return {
+            'room_metrics': self.dashboard_model.get_room_metrics(),
+            'equipment_metrics': self.dashboard_model.get_equipment_metrics(),
+            'active_loans': self.dashboard_model.get_active_loans(),
+            'alerts': self.dashboard_model.get_alerts(),
+        }
+
+    def show_data(self, data):
+        """Update all dashboard widgets with the data read by fetch_data"""
         try:
             # Métricas de salas
-            room_metrics = self.dashboard_model.get_room_metrics()
-            self.update_room_metrics(room_metrics)
+            self.update_room_metrics(data['room_metrics'])
             # Métricas de equipos
-            equipment_metrics = self.dashboard_model.get_equipment_metrics()
-            self.update_equipment_metrics(equipment_metrics)
+            self.update_equipment_metrics(data['equipment_metrics'])
             # Préstamos activos
-            active_loans = self.dashboard_model.get_active_loans()
-            self.update_active_loans(active_loans)
+            self.update_active_loans(data['active_loans'])
             # Alertas
-            alerts = self.dashboard_model.get_alerts()
-            self.update_alerts(alerts)
+            self.update_alerts(data['alerts'])
             # Actualizar hora
             self.last_updated_label.configure(text=f"Última actualización: {datetime.now().strftime('%H:%M:%S')}")
         except Exception as e:
             print(f"Error loading dashboard data: {e}")
+
+    def set_loading(self, busy):
+        """Disable the refresh button while the data is being read"""
+        self.refresh_button.configure(state="disabled" if busy else "normal",
+                                      text="Actualizando..." if busy else "Actualizar")
     
     def update_room_metrics(self, room_metrics):
         try:
@@ -453,6 +472,7 @@ class DashboardView(ctk.CTkScrollableFrame):
     def destroy(self):
         """Clean up when destroying the widget"""
         self.auto_refresh = False
+        self.query.cancel_all()
         if self.refresh_thread and self.refresh_thread.is_alive():
             self.refresh_thread.join(timeout=1)
         super().destroy()
\ No newline at end of file
@@ -1,6 +1,6 @@
 import customtkinter as ctk
 from tkinter import messagebox, ttk
-from database.models import EquipmentLoanModel, InventoryModel, PersonalLaboratorioModel, StudentModel, ProfesorModel, RoomModel
+from database.models import EquipmentLoanModel, InventoryModel, PersonalLaboratorioModel, StudentModel, ProfesorModel, RoomModel, HISTORY_PAGE_SIZE
 from utils.font_config import get_font
 from datetime import datetime
 import os, sys
@@ -9,6 +9,11 @@ from PIL import Image, ImageTk
 from views.students_view import StudentDialog
 from views.profesores_view import ProfessorDialog
 from views.components.suggestion_box import SuggestionBox
+from views.components.async_query import AsyncQuery
+from views.components.search_controller import SearchController
+from views.components.virtual_tree import VirtualTreeview
+from views.components.import_dialog import ask_import_file, show_import_result, show_import_error
+from utils.legacy_loans import import_legacy_loans, summarize_legacy
 
 class EquipmentLoansView(ctk.CTkFrame):
     def __init__(self, parent):
@@ -26,6 +31,13 @@ class EquipmentLoansView(ctk.CTkFrame):
         self.profesor_model = ProfesorModel()
         self.room_model = RoomModel()
 
+        # Las consultas corren en segundo plano para no congelar la ventana
+        self.query = AsyncQuery(self)
+        # Primeras páginas del historial: la búsqueda espera una pausa y reutiliza resultados recientes
+        self.history_search = SearchController(self.query, "equipment_history", self._fetch_history_page,
+                                               self._show_history_page, key="history",
+                                               on_busy=self._set_history_loading)
+
         self.setup_ui()
         self._show_new_loan_view() # Mostrar la vista de nuevo préstamo por defecto
 
@@ -40,11 +52,38 @@ class EquipmentLoansView(ctk.CTkFrame):
         self.history_btn = ctk.CTkButton(self.nav_frame, text="Historial de Préstamos", command=self._show_history_view, font=get_font("normal", "bold"), text_color=("#222","#fff"))
         self.history_btn.pack(side="left", padx=5)
 
+        # Carga del historial de préstamos llevado antes en papel o Excel
+        self.import_history_btn = ctk.CTkButton(self.nav_frame, text="Importar Historial", command=self.import_history, font=get_font("normal", "bold"), text_color=("#222","#fff"))
+        self.import_history_btn.pack(side="right", padx=(5, 0))
+
         # Frame principal para el contenido
         self.content_frame = ctk.CTkFrame(self, fg_color="transparent")
         self.content_frame.pack(fill="both", expand=True, padx=0, pady=0)
     
+    def import_history(self):
+        """
+        Importa el historial de préstamos desde un archivo Excel o CSV. La carga corre
+        en segundo plano; al terminar se muestra el resumen y el historial.
+        """
+        file_path = ask_import_file(self, "Importar Historial de Préstamos")
+        if not file_path:
+            return
+        self.query.run("import", import_legacy_loans, file_path, "equipos",
+                       on_result=self._on_history_imported,
+                       on_error=lambda e: show_import_error(self, e),
+                       on_busy=self._set_importing)
+
+    def _set_importing(self, busy):
+        self.import_history_btn.configure(state="disabled" if busy else "normal",
+                                          text="Importando..." if busy else "Importar Historial")
+
+    def _on_history_imported(self, result):
+        show_import_result(self, result, "Préstamos", summarize_legacy(result))
+        self._show_history_view()
+
     def _clear_content_frame(self):
+        # Una página del historial que aún carga ya no tiene tabla a donde ir
+        self.history_search.cancel()
         for widget in self.content_frame.winfo_children():
             widget.destroy()
 
@@ -142,8 +181,8 @@ class EquipmentLoansView(ctk.CTkFrame):
         self.obs_textbox.grid(row=8, column=1, padx=5, pady=10, sticky="ew")
 
         # Botón de guardar
-        save_btn = ctk.CTkButton(form_grid, text="Guardar Préstamo", command=self._save_loan, font=get_font("normal", "bold"))
-        save_btn.grid(row=9, column=0, columnspan=2, pady=20, padx=5, sticky="ew")
+        self.save_btn = ctk.CTkButton(form_grid, text="Guardar Préstamo", command=self._save_loan, font=get_font("normal", "bold"))
+        self.save_btn.grid(row=9, column=0, columnspan=2, pady=20, padx=5, sticky="ew")
 
     def _update_equipment_suggestions(self, event=None):
         query = self.equipo_code_entry.get()
@@ -338,6 +377,11 @@ class EquipmentLoansView(ctk.CTkFrame):
                 else:
                     return # Cancelar si el usuario cierra el diálogo
 
+        # Con las llaves foráneas activas el préstamo debe guardar el código del estudiante,
+        # también cuando se buscó por su cédula
+        if user_type == "Estudiante" and isinstance(user_exists, tuple):
+            user_id = user_exists[0]
+
         # --- Si todas las validaciones pasan (o se crearon los registros), proceder a guardar ---
         sala_nombre = self.sala_combo.get()
         num_estudiantes_str = self.num_estudiantes_entry.get().strip()
@@ -359,16 +403,29 @@ class EquipmentLoansView(ctk.CTkFrame):
 
         fecha_entrega = datetime.now()
 
+        # El registro se guarda en segundo plano; el botón queda deshabilitado hasta que termine
         if user_type == "Estudiante":
-            result = self.equipment_loan_model.add_loan_student(fecha_entrega, equipo_codigo, laboratorista_id, monitor_id, 
-                                                              user_id, num_estudiantes, sala_id, titulo_practica, observaciones)
+            self.query.run("save", self.equipment_loan_model.add_loan_student, fecha_entrega, equipo_codigo, laboratorista_id, monitor_id, 
+                           user_id, num_estudiantes, sala_id, titulo_practica, observaciones,
+                           on_result=self._on_loan_saved, on_busy=self._set_saving)
         else: # Profesor
-            result = self.equipment_loan_model.add_loan_professor(fecha_entrega, equipo_codigo, laboratorista_id, monitor_id, 
-                                                                user_id, sala_id, titulo_practica, observaciones)
-
+            self.query.run("save", self.equipment_loan_model.add_loan_professor, fecha_entrega, equipo_codigo, laboratorista_id, monitor_id, 
+                           user_id, sala_id, titulo_practica, observaciones,
+                           on_result=self._on_loan_saved, on_busy=self._set_saving)
+
+    def _set_saving(self, busy):
+        # Deshabilita el botón de guardar mientras se escribe el préstamo
+        if self.save_btn.winfo_exists():
+            self.save_btn.configure(state="disabled" if busy else "normal",
+                                    text="Guardando..." if busy else "Guardar Préstamo")
+
+    def _on_loan_saved(self, result):
+        # Informa el resultado del registro iniciado en _save_loan
         if result:
             messagebox.showinfo("Éxito", "Préstamo de equipo registrado correctamente.", parent=self)
-            self._show_new_loan_view()
+            # Solo limpia el formulario si el usuario sigue en él
+            if self.save_btn.winfo_exists():
+                self._show_new_loan_view()
         else:
             messagebox.showerror("Error en Base de Datos", "No se pudo registrar el préstamo. Verifique los datos e intente de nuevo.", parent=self)
 
@@ -416,7 +473,8 @@ class EquipmentLoansView(ctk.CTkFrame):
         
         # Nuevo orden de columnas: tipo_usuario, fecha_entrega, estado_prestamo, usuario_id, usuario_nombre, equipo_codigo, equipo_desc, ...
         columns = ("tipo_usuario", "fecha_entrega", "estado_prestamo", "usuario_id", "usuario_nombre", "equipo_codigo", "equipo_desc", "titulo_practica", "laboratorista_entrega", "monitor_entrega", "fecha_devolucion", "laboratorista_devolucion", "monitor_devolucion", "firma", "observaciones")
-        self.tree = ttk.Treeview(table_container_frame, columns=columns, show="headings", style="Modern.Treeview")
+        self.tree = VirtualTreeview(table_container_frame, columns=columns, show="headings", style="Modern.Treeview",
+                                    near_end_command=self._load_more_on_scroll)
         
         # Configure headers in the new order
         self.tree.heading("tipo_usuario", text="👤 Usuario", anchor='w')
@@ -463,6 +521,17 @@ class EquipmentLoansView(ctk.CTkFrame):
         
         corner_frame = ctk.CTkFrame(table_container_frame, width=16, height=16, fg_color=("gray90", "gray25"))
         corner_frame.grid(row=1, column=1, padx=(0, 5), pady=(0, 5))
+
+        # El historial se carga por páginas; "Cargar más" trae la siguiente
+        self.loan_data = {}
+        self.history_cursor = None
+        self.history_total = 0
+        self.pager_frame = ctk.CTkFrame(self.content_frame, fg_color="transparent")
+        self.pager_frame.pack(fill="x", padx=0)
+        self.page_info_label = ctk.CTkLabel(self.pager_frame, text="", font=get_font("small"))
+        self.page_info_label.pack(side="left", padx=10)
+        self.load_more_btn = ctk.CTkButton(self.pager_frame, text="Cargar más", command=self._load_more_loans, state="disabled", font=get_font("normal"), corner_radius=8, height=30, text_color=("#222","#fff"))
+        self.load_more_btn.pack(side="right", padx=8)
         
         self._populate_history_treeview()
         
@@ -481,29 +550,58 @@ class EquipmentLoansView(ctk.CTkFrame):
 
     def _apply_filters(self, event=None):
         if hasattr(self, 'tree'):
-            self._populate_history_treeview()
-
-    def _populate_history_treeview(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        # Get current filter values
-        search_term = self.search_entry.get()
-        user_type = self.user_type_filter.get()
-        status = self.status_filter.get()
-        
-        loans = self.equipment_loan_model.get_equipment_loans(
-            search_term=search_term,
-            user_type_filter=user_type,
-            status_filter=status
+            self._populate_history_treeview(debounce=True)
+
+    def _populate_history_treeview(self, keep_loaded=False, debounce=False):
+        # Get current filter values, kept so that "Cargar más" continues the same listing.
+        # With keep_loaded the first page covers every row already loaded (refresh after a return or an edit),
+        # with debounce (typing, filters) it waits for a pause and may come from the cache
+        self.history_filters = dict(
+            search_term=self.search_entry.get(),
+            user_type_filter=self.user_type_filter.get(),
+            status_filter=self.status_filter.get()
         )
-        
-        current_mode = ctk.get_appearance_mode()
-        tag_config = {'active_loan': ("#f59e0b",), 'alternate': ('#323232',) if current_mode == "Dark" else ('#f8f9fa',)}
-        self.tree.tag_configure('active_loan', foreground=tag_config['active_loan'][0])
-        self.tree.tag_configure('alternate', background=tag_config['alternate'][0])
-
-        for i, loan in enumerate(loans):
+        page_size = max(HISTORY_PAGE_SIZE, len(self.loan_data)) if keep_loaded else HISTORY_PAGE_SIZE
+        if debounce:
+            self.history_search.request(self.history_filters, None, page_size)
+        else:
+            self.history_search.refresh(self.history_filters, None, page_size)
+
+    def _load_more_loans(self):
+        # Requests the next page of the history, once the first page of the current filters is in
+        if self.history_cursor is not None and not self.history_search.is_pending():
+            self._request_history_page(self.history_cursor)
+
+    def _load_more_on_scroll(self):
+        # The table got to the last loaded rows: requests the next page without waiting for "Cargar más"
+        self._load_more_loans()
+
+    def _request_history_page(self, cursor, page_size=HISTORY_PAGE_SIZE):
+        # Todas las consultas usan la llave "history": un filtro nuevo reemplaza a la página que aún carga
+        self.query.run("history", self._fetch_history_page, self.history_filters, cursor, page_size,
+                       on_result=self._show_history_page, on_busy=self._set_history_loading)
+
+    def _fetch_history_page(self, filters, cursor, page_size):
+        # Runs in a worker thread: one page and, for the first one, the total
+        loans, next_cursor = self.equipment_loan_model.get_equipment_loans_page(page_size=page_size, cursor=cursor, **filters)
+        total = self.equipment_loan_model.count_equipment_loans(**filters) if cursor is None else None
+        return loans, next_cursor, total
+
+    def _show_history_page(self, page):
+        # Adds a fetched page to the Treeview; the first page is reconciled with the rows shown,
+        # so the unchanged loans, the selection and the scroll position stay
+        loans, self.history_cursor, total = page
+        if total is not None:
+            self.loan_data = {}
+            self.history_total = total
+
+            current_mode = ctk.get_appearance_mode()
+            tag_config = {'active_loan': ("#f59e0b",), 'alternate': ('#323232',) if current_mode == "Dark" else ('#f8f9fa',)}
+            self.tree.tag_configure('active_loan', foreground=tag_config['active_loan'][0])
+            self.tree.tag_configure('alternate', background=tag_config['alternate'][0])
+
+        rows = []
+        for i, loan in enumerate(loans, start=len(self.loan_data)):
             loan_id, tipo, nombre, equipo_desc, f_entrega, f_devolucion, lab_ent, mon_ent, lab_dev, mon_dev, titulo_practica, estado_prestamo, obs, user_id, loan_type, equipo_codigo, sala_id, firma_db = loan
             f_entrega_str = datetime.fromisoformat(f_entrega).strftime('%Y-%m-%d %H:%M') if f_entrega else 'N/A'
             f_devolucion_str = datetime.fromisoformat(f_devolucion).strftime('%Y-%m-%d %H:%M') if f_devolucion else "PENDIENTE"
@@ -529,10 +627,29 @@ class EquipmentLoansView(ctk.CTkFrame):
             if estado_prestamo == 'En Préstamo':
                 tags += ('active_loan',)
                 
-            iid = f"{loan_type}_{loan_id}"
-            self.tree.insert("", "end", iid=iid, values=values, tags=tags)
-        
-        self.loan_data = {f"{loan[14]}_{loan[0]}": loan for loan in loans}
+            rows.append((f"{loan_type}_{loan_id}", values, tags))
+
+        if total is not None:
+            self.tree.sync_rows(rows)
+        else:
+            for iid, values, tags in rows:
+                self.tree.insert("", "end", iid=iid, values=values, tags=tags)
+        self.loan_data.update({f"{loan[14]}_{loan[0]}": loan for loan in loans})
+        self._update_pager()
+        if total is not None:
+            self._on_loan_select()
+
+    def _set_history_loading(self, busy):
+        # Muestra el estado de carga en el paginador mientras se lee una página
+        if busy:
+            self.page_info_label.configure(text="Cargando préstamos...")
+            self.load_more_btn.configure(state="disabled")
+        else:
+            self._update_pager()
+
+    def _update_pager(self):
+        self.page_info_label.configure(text=f"Mostrando {len(self.loan_data)} de {self.history_total} préstamos")
+        self.load_more_btn.configure(state="normal" if self.history_cursor is not None else "disabled")
 
     def _on_loan_select(self, event=None):
         # --- MODIFICADO --- Actualiza el estado de los tres botones
@@ -618,7 +735,7 @@ class EquipmentLoansView(ctk.CTkFrame):
     
     def refresh_loans(self):
         if hasattr(self, 'tree'):
-            self._populate_history_treeview()
+            self._populate_history_treeview(keep_loaded=True)
             self._on_loan_select()
             self.update_idletasks()
 
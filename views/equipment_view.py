@@ -1,7 +1,11 @@
 import customtkinter as ctk
 from tkinter import messagebox, ttk
+from database.catalog import get_catalog
 from database.models import EquiposModel, RoomModel
 from utils.font_config import get_font
+from views.components.async_query import AsyncQuery
+from views.components.search_controller import SearchController, CATALOG_SEARCH_DELAY_MS
+from views.components.virtual_tree import VirtualTreeview
 from utils.validators import *
 
 class EquiposView(ctk.CTkFrame):
@@ -10,6 +14,12 @@ class EquiposView(ctk.CTkFrame):
         
         self.equipos_model = EquiposModel()
         self.room_model = RoomModel() # To get rooms for the filter
+        self.query = AsyncQuery(self)
+        # Search-as-you-type on the in-memory catalog: short pause and no result cache,
+        # the catalog is always up to date
+        self.catalog = get_catalog(self.equipos_model.db_manager)
+        self.search = SearchController(self.query, "equipos", self.catalog.get_all_equipos, self._show_equipos,
+                                       delay_ms=CATALOG_SEARCH_DELAY_MS, cache_size=0)
         
         self.pack_propagate(False)
         self.pack(padx=15, pady=15, fill="both", expand=True)
@@ -66,9 +76,9 @@ class EquiposView(ctk.CTkFrame):
         table_container_frame.grid_rowconfigure(0, weight=1)
         table_container_frame.grid_columnconfigure(0, weight=1)
 
-        self.tree = ttk.Treeview(table_container_frame,
-                               columns=("Codigo", "Sala", "NumEquipo", "Descripcion", "Estado", "Observaciones"),
-                               show="headings", style="Modern.Treeview")
+        self.tree = VirtualTreeview(table_container_frame,
+                                  columns=("Codigo", "Sala", "NumEquipo", "Descripcion", "Estado", "Observaciones"),
+                                  show="headings", style="Modern.Treeview")
 
         self.tree.heading("Codigo", text="🔑 Código", anchor="w")
         self.tree.heading("Sala", text="🚪 Sala", anchor="w")
@@ -95,10 +105,8 @@ class EquiposView(ctk.CTkFrame):
         self.tree.bind("<Button-1>", self.prevent_resize)
         self.tree.bind("<B1-Motion>", self.prevent_resize)
 
-    def refresh_equipos(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
+    def refresh_equipos(self, debounce=False):
+        # Reads the equipment in the background; with debounce (typing) it waits for a pause
         search_term = self.search_entry.get()
         
         selected_room_name = self.room_filter.get()
@@ -112,27 +120,40 @@ class EquiposView(ctk.CTkFrame):
         status_map = {"Activo": 1, "Inactivo": 0, "Todos": -1}
         status_filter = status_map.get(self.status_filter.get())
 
-        equipos_list = self.equipos_model.get_all_equipos(search_term, sala_filter_id, status_filter)
+        if debounce:
+            self.search.request(search_term, sala_filter_id, status_filter)
+        else:
+            self.search.refresh(search_term, sala_filter_id, status_filter)
         
+        if not hasattr(self, 'selected_actions_frame'):
+            self.selected_actions_frame = ctk.CTkFrame(self, corner_radius=12)
+            self.selected_actions_frame.pack(pady=(15,0), padx=0, fill="x")
+
+            self.edit_selected_btn = ctk.CTkButton(self.selected_actions_frame, text="Editar Seleccionado", command=self.edit_selected_equipo, state="disabled", font=get_font("normal"), corner_radius=8, height=35)
+            self.edit_selected_btn.pack(side="left", padx=8, pady=8)
+
+            self.delete_selected_btn = ctk.CTkButton(self.selected_actions_frame, text="Eliminar Seleccionado", command=self.delete_selected_equipo, state="disabled", fg_color=("#ef4444", "#dc2626"), hover_color=("#dc2626", "#b91c1c"), font=get_font("normal"), corner_radius=8, height=35)
+            self.delete_selected_btn.pack(side="right", padx=8, pady=8)
+            
+            self.tree.bind("<<TreeviewSelect>>", self.on_equipo_select)
+        
+        self.on_equipo_select()
+
+    def _show_equipos(self, equipos_list):
+        # Reconciled with the rows already in the table, keeping the selection and the scroll position
+        rows = []
         for i, equipo_data in enumerate(equipos_list):
             estado_display = "Activo" if equipo_data[4] == 1 else "Inactivo"
-            
-            item_id = self.tree.insert("", "end", iid=str(equipo_data[0]), values=(
+            tags = ('available',) if estado_display == "Activo" else ('damaged',)
+            rows.append((str(equipo_data[0]), (
                 equipo_data[0], # Codigo
                 equipo_data[1], # Sala
                 equipo_data[2], # NumEquipo
                 equipo_data[3], # Descripcion
                 estado_display, # Estado
                 equipo_data[5]  # Observaciones
-            ))
-            
-            if i % 2 == 1:
-                self.tree.item(item_id, tags=('alternate',))
-            
-            if estado_display == "Activo":
-                self.tree.item(item_id, tags=('available',))
-            else:
-                self.tree.item(item_id, tags=('damaged',))
+            ), tags))
+        self.tree.sync_rows(rows)
         
         current_mode = ctk.get_appearance_mode()
         if current_mode == "Dark":
@@ -144,18 +165,6 @@ class EquiposView(ctk.CTkFrame):
             self.tree.tag_configure('available', foreground='#16a34a')
             self.tree.tag_configure('damaged', foreground='#d97706')
         
-        if not hasattr(self, 'selected_actions_frame'):
-            self.selected_actions_frame = ctk.CTkFrame(self, corner_radius=12)
-            self.selected_actions_frame.pack(pady=(15,0), padx=0, fill="x")
-
-            self.edit_selected_btn = ctk.CTkButton(self.selected_actions_frame, text="Editar Seleccionado", command=self.edit_selected_equipo, state="disabled", font=get_font("normal"), corner_radius=8, height=35)
-            self.edit_selected_btn.pack(side="left", padx=8, pady=8)
-
-            self.delete_selected_btn = ctk.CTkButton(self.selected_actions_frame, text="Eliminar Seleccionado", command=self.delete_selected_equipo, state="disabled", fg_color=("#ef4444", "#dc2626"), hover_color=("#dc2626", "#b91c1c"), font=get_font("normal"), corner_radius=8, height=35)
-            self.delete_selected_btn.pack(side="right", padx=8, pady=8)
-            
-            self.tree.bind("<<TreeviewSelect>>", self.on_equipo_select)
-        
         self.on_equipo_select()
 
     def on_equipo_select(self, event=None):
@@ -194,10 +203,10 @@ class EquiposView(ctk.CTkFrame):
                 self.refresh_equipos()
     
     def on_search(self, event=None): 
-        self.refresh_equipos()
+        self.refresh_equipos(debounce=True)
     
     def on_filter_change(self, value=None): 
-        self.refresh_equipos()
+        self.refresh_equipos(debounce=True)
     
     def add_equipo_dialog(self):
         dialog = EquipoDialog(self, "Agregar Equipo", equipos_model=self.equipos_model, room_model=self.room_model)
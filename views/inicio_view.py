@@ -4,7 +4,7 @@ import os
 import sys
 from PIL import Image, ImageTk
 from utils.font_config import get_font
-from utils.exporter import export_database_to_excel
+from utils.exporter import export_database
 from .personal_view import PersonalView
 from .students_view import StudentsView
 from .profesores_view import ProfessorsView
@@ -193,7 +193,7 @@ class MainWindow(ctk.CTk):
 
         self.export_button = ctk.CTkButton(
             self.sidebar_frame,
-            text="Exportar a Excel",
+            text="Exportar Datos",
             image=excel_icon_image,
             compound="left",  # Icono a la izquierda del texto
             command=self.export_data,
@@ -225,11 +225,11 @@ class MainWindow(ctk.CTk):
     
     def export_data(self):
         """
-        Calls the exporter utility to save all database data to an Excel file.
+        Calls the exporter utility to save all database data (Excel, CSV, JSON lines or a SQLite copy).
         """
         try:
             # The exporter function handles the file dialog and messaging
-            export_database_to_excel()
+            export_database(self)
         except Exception as e:
             messagebox.showerror("Error", f"No se pudo iniciar el proceso de exportación: {e}")
 
@@ -1,7 +1,13 @@
 import customtkinter as ctk
 from tkinter import messagebox, ttk
+from database.catalog import get_catalog
 from database.models import InventoryModel
 from utils.font_config import get_font
+from views.components.async_query import AsyncQuery, LoadingLabel
+from views.components.search_controller import SearchController, CATALOG_SEARCH_DELAY_MS
+from views.components.virtual_tree import VirtualTreeview
+from views.components.import_dialog import ask_import_file, show_import_result, show_import_error
+from utils.importer import import_inventory, summarize_inventory
 from utils.validators import *
 
 class InventoryView(ctk.CTkFrame):
@@ -12,6 +18,9 @@ class InventoryView(ctk.CTkFrame):
         # Inicializa el modelo de datos para interactuar con la base de datos de inventario
         self.inventory_model = InventoryModel()
         
+        # Las consultas corren en segundo plano para no congelar la ventana
+        self.query = AsyncQuery(self)
+        
         # Configurar padding para el frame principal de la vista
         self.pack_propagate(False) # Evitar que los widgets hijos controlen el tamaño del frame principal
         self.pack(padx=15, pady=15, fill="both", expand=True) # Padding general para la vista
@@ -21,6 +30,12 @@ class InventoryView(ctk.CTkFrame):
 
         # Creacion de UI y llenar datos de tabla
         self.setup_ui()
+        # Búsqueda mientras se escribe sobre la copia en memoria del catálogo: la pausa es corta
+        # y no hace falta guardar resultados, el catálogo siempre está al día
+        self.catalog = get_catalog(self.inventory_model.db_manager)
+        self.search = SearchController(self.query, "inventory", self.catalog.get_all_equipment, self._show_inventory,
+                                       on_busy=self.loading_label.set_loading,
+                                       delay_ms=CATALOG_SEARCH_DELAY_MS, cache_size=0)
         self.refresh_inventory()
     
     def prevent_resize(self, event):
@@ -64,7 +79,15 @@ class InventoryView(ctk.CTkFrame):
         
         # Boton añadir equipo
         add_btn = ctk.CTkButton(search_frame, text="+ Agregar Equipo", command=self.add_equipment_dialog, font=get_font("normal"))
-        add_btn.grid(row=0, column=6, padx=(10,10), pady=10)
+        add_btn.grid(row=0, column=7, padx=(10,5), pady=10)
+        
+        # Boton importar inventario desde Excel o CSV
+        self.import_btn = ctk.CTkButton(search_frame, text="Importar Inventario", command=self.import_inventory, font=get_font("normal"))
+        self.import_btn.grid(row=0, column=8, padx=(5,10), pady=10)
+        
+        # Indicador de carga mientras corre la consulta
+        self.loading_label = LoadingLabel(search_frame)
+        self.loading_label.grid(row=0, column=6, padx=(10,0), pady=10)
         
         # Configura la expansión de las columnas en el grid del frame de búsqueda
         search_frame.grid_columnconfigure(1, weight=3) # Más peso a la búsqueda
@@ -96,10 +119,10 @@ class InventoryView(ctk.CTkFrame):
         table_container_frame.grid_columnconfigure(0, weight=1)
 
         # Create the Treeview using the global "Modern.Treeview" style
-        self.tree = ttk.Treeview(table_container_frame,
-                               columns=("Codigo", "MarcaSerie", "Responsable", "Ubicacion", "Descripcion", "Contenido", "Estado"),
-                               show="headings", # Use "headings" to hide the first empty column
-                               style="Modern.Treeview")
+        self.tree = VirtualTreeview(table_container_frame,
+                                  columns=("Codigo", "MarcaSerie", "Responsable", "Ubicacion", "Descripcion", "Contenido", "Estado"),
+                                  show="headings", # Use "headings" to hide the first empty column
+                                  style="Modern.Treeview")
 
         # Table Headers
         self.tree.heading("Codigo", text="🔑 Código", anchor="w")
@@ -144,24 +167,60 @@ class InventoryView(ctk.CTkFrame):
         self.tree.bind("<Button-1>", self.prevent_resize)
         self.tree.bind("<B1-Motion>", self.prevent_resize)
 
-    def refresh_inventory(self):
+    def refresh_inventory(self, debounce=False):
         """
-        Limpia la tabla, obtiene los equipos del inventario aplicando
-        los filtros de búsqueda, estado y marca/serie, y vuelve a llenar la tabla.
+        Obtiene en segundo plano los equipos del inventario aplicando
+        los filtros de búsqueda, estado y marca/serie. La tabla se vuelve a llenar
+        en _show_inventory cuando llega el resultado. Con debounce (al escribir) la consulta
+        espera a que el usuario haga una pausa y puede salir de la caché de búsquedas.
         """
-        # Elimina todos los items existentes en el Treeview
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
         # Obtiene los términos de búsqueda y filtros actuales
         search_term = self.search_entry.get() if hasattr(self, 'search_entry') else ""
         status_filter = self.status_filter.get() if hasattr(self, 'status_filter') and self.status_filter.get() != "Todos" else ""
         brand_serial_filter = self.brand_serial_entry.get() if hasattr(self, 'brand_serial_entry') else ""
         
-        # Llama al modelo para obtener la lista de equipos filtrada
-        equipment = self.inventory_model.get_all_equipment(search_term, status_filter, brand_serial_filter)
+        # Consulta en segundo plano; una búsqueda nueva reemplaza a la anterior
+        if debounce:
+            self.search.request(search_term, status_filter, brand_serial_filter)
+        else:
+            self.search.refresh(search_term, status_filter, brand_serial_filter)
+        
+        # Crea el frame y los botones de acciones (Editar/Eliminar) si no existen.
+        if not hasattr(self, 'selected_actions_frame'):
+            self.selected_actions_frame = ctk.CTkFrame(self, corner_radius=12)
+            self.selected_actions_frame.pack(pady=(15,0), padx=0, fill="x")
+
+            self.edit_selected_btn = ctk.CTkButton(self.selected_actions_frame, 
+                                                 text="Editar Seleccionado",
+                                                 command=self.edit_selected_equipment, 
+                                                 state="disabled", 
+                                                 font=get_font("normal"),
+                                                 corner_radius=8,
+                                                 height=35)
+            self.edit_selected_btn.pack(side="left", padx=8, pady=8)
+
+            self.delete_selected_btn = ctk.CTkButton(self.selected_actions_frame, 
+                                                   text="Eliminar Seleccionado",
+                                                   command=self.delete_selected_equipment, 
+                                                   state="disabled", 
+                                                   fg_color=("#ef4444", "#dc2626"),
+                                                   hover_color=("#dc2626", "#b91c1c"),
+                                                   font=get_font("normal"),
+                                                   corner_radius=8,
+                                                   height=35)
+            self.delete_selected_btn.pack(side="right", padx=8, pady=8)
+            
+            # Vincula el evento de selección en la tabla a la función on_equipment_select.
+            self.tree.bind("<<TreeviewSelect>>", self.on_equipment_select)
         
-        # Itera sobre los equipos obtenidos y los inserta en la tabla.
+        # Llama a on_equipment_select para establecer el estado inicial de los botones.
+        self.on_equipment_select()
+
+    def _show_inventory(self, equipment):
+        """Vuelve a llenar la tabla con los equipos obtenidos por refresh_inventory."""
+        # Arma las filas (iid, valores, tags) y las reconcilia con las de la tabla:
+        # solo cambia lo distinto y se conservan la selección y el desplazamiento
+        rows = []
         for i, equipment_data in enumerate(equipment):
             # Simplificar la visualización sin iconos excesivos para mejor legibilidad
             codigo_display = str(equipment_data[0])
@@ -172,8 +231,18 @@ class InventoryView(ctk.CTkFrame):
             contenido_display = equipment_data[5]
             estado_display = equipment_data[6]
             
-            # Inserta una nueva fila en el Treeview.
-            item_id = self.tree.insert("", "end", iid=str(equipment_data[0]), values=(
+            # Alternar colores de fila para mejor legibilidad
+            tags = ('alternate',) if i % 2 == 1 else ()
+            
+            # Colorear el estado
+            if estado_display == "EN USO":
+                tags = ('in_use',)
+            elif estado_display == "DAÑADO":
+                tags = ('damaged',)
+            elif estado_display == "DISPONIBLE":
+                tags = ('available',)
+            
+            rows.append((str(equipment_data[0]), (
                 codigo_display,
                 marca_serie_display,
                 responsable_display,
@@ -181,19 +250,8 @@ class InventoryView(ctk.CTkFrame):
                 descripcion_display,
                 contenido_display,
                 estado_display
-            ))
-            
-            # Alternar colores de fila para mejor legibilidad
-            if i % 2 == 1:
-                self.tree.item(item_id, tags=('alternate',))
-            
-            # Colorear el estado
-            if estado_display == "EN USO":
-                self.tree.item(item_id, tags=('in_use',))
-            elif estado_display == "DAÑADO":
-                self.tree.item(item_id, tags=('damaged',))
-            elif estado_display == "DISPONIBLE":
-                self.tree.item(item_id, tags=('available',))
+            ), tags))
+        self.tree.sync_rows(rows)
         
         # Configurar el color de las filas alternas y estados según el tema actual
         current_mode = ctk.get_appearance_mode()
@@ -208,35 +266,7 @@ class InventoryView(ctk.CTkFrame):
             self.tree.tag_configure('damaged', foreground='#dc2626')
             self.tree.tag_configure('available', foreground='#16a34a')
         
-        # Crea el frame y los botones de acciones (Editar/Eliminar) si no existen.
-        if not hasattr(self, 'selected_actions_frame'):
-            self.selected_actions_frame = ctk.CTkFrame(self, corner_radius=12)
-            self.selected_actions_frame.pack(pady=(15,0), padx=0, fill="x")
-
-            self.edit_selected_btn = ctk.CTkButton(self.selected_actions_frame, 
-                                                 text="Editar Seleccionado",
-                                                 command=self.edit_selected_equipment, 
-                                                 state="disabled", 
-                                                 font=get_font("normal"),
-                                                 corner_radius=8,
-                                                 height=35)
-            self.edit_selected_btn.pack(side="left", padx=8, pady=8)
-
-            self.delete_selected_btn = ctk.CTkButton(self.selected_actions_frame, 
-                                                   text="Eliminar Seleccionado",
-                                                   command=self.delete_selected_equipment, 
-                                                   state="disabled", 
-                                                   fg_color=("#ef4444", "#dc2626"),
-                                                   hover_color=("#dc2626", "#b91c1c"),
-                                                   font=get_font("normal"),
-                                                   corner_radius=8,
-                                                   height=35)
-            self.delete_selected_btn.pack(side="right", padx=8, pady=8)
-            
-            # Vincula el evento de selección en la tabla a la función on_equipment_select.
-            self.tree.bind("<<TreeviewSelect>>", self.on_equipment_select)
-        
-        # Llama a on_equipment_select para establecer el estado inicial de los botones.
+        # La selección pudo cambiar (filas que ya no están), actualiza los botones
         self.on_equipment_select()
 
     def on_equipment_select(self, event=None):
@@ -316,17 +346,39 @@ class InventoryView(ctk.CTkFrame):
     def on_search(self, event=None): 
         """
         Se ejecuta cada vez que el usuario escribe en el campo de búsqueda.
-        Llama a refresh_inventory para filtrar los resultados.
+        Llama a refresh_inventory con debounce: las teclas seguidas terminan en una sola consulta.
         """
-        self.refresh_inventory()
+        self.refresh_inventory(debounce=True)
     
     def on_filter_change(self, value=None): 
         """
         Se ejecuta cuando el usuario cambia el valor del filtro de estado.
-        Llama a refresh_inventory para aplicar el nuevo filtro.
+        Llama a refresh_inventory para aplicar el nuevo filtro (puede salir de la caché).
         """
-        self.refresh_inventory()
+        self.refresh_inventory(debounce=True)
     
+    def import_inventory(self):
+        """
+        Importa el inventario desde un archivo Excel o CSV. La carga corre en segundo
+        plano; al terminar se muestra el resumen con los equipos en uso y las sedes
+        desconocidas que no se pudieron cargar.
+        """
+        file_path = ask_import_file(self, "Importar Inventario")
+        if not file_path:
+            return
+        self.query.run("import", import_inventory, file_path,
+                       on_result=self._on_inventory_imported,
+                       on_error=lambda e: show_import_error(self, e),
+                       on_busy=self._set_importing)
+
+    def _set_importing(self, busy):
+        self.import_btn.configure(state="disabled" if busy else "normal",
+                                  text="Importando..." if busy else "Importar Inventario")
+
+    def _on_inventory_imported(self, result):
+        show_import_result(self, result, "Equipos", summarize_inventory(result))
+        self.refresh_inventory()
+
     def add_equipment_dialog(self):
         """
         Abre un diálogo para agregar un nuevo equipo.
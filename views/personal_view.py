@@ -1,7 +1,11 @@
 import customtkinter as ctk
 from tkinter import messagebox, ttk
+from database.catalog import get_catalog
 from database.models import PersonalLaboratorioModel
 from utils.font_config import get_font
+from views.components.async_query import AsyncQuery
+from views.components.search_controller import SearchController, CATALOG_SEARCH_DELAY_MS
+from views.components.virtual_tree import sync_treeview
 from utils.validators import *
 
 class PersonalView(ctk.CTkFrame):
@@ -12,6 +16,13 @@ class PersonalView(ctk.CTkFrame):
         # Inicializa el modelo de datos para interactuar con la base de datos de Personal
         self.personal_model = PersonalLaboratorioModel()
         
+        # Las búsquedas se resuelven en segundo plano sobre la copia en memoria del
+        # catálogo; al escribir se espera una pausa corta
+        self.query = AsyncQuery(self)
+        self.catalog = get_catalog(self.personal_model.db_manager)
+        self.search = SearchController(self.query, "personal", self.catalog.get_all_personal, self._show_personal,
+                                       delay_ms=CATALOG_SEARCH_DELAY_MS, cache_size=0)
+        
         # Configurar padding para el frame principal de la vista
         self.pack_propagate(False) # Evitar que los widgets hijos controlen el tamaño del frame principal
         self.pack(padx=15, pady=15, fill="both", expand=True) # Padding general para la vista
@@ -116,44 +127,21 @@ class PersonalView(ctk.CTkFrame):
         # Configura el Treeview para que se desplace con la scrollbar
         self.tree.configure(yscrollcommand=scrollbar.set)
 
-    def refresh_personal(self):
+    def refresh_personal(self, debounce=False):
         """
-        Limpia la tabla, obtiene los Personal de la base de datos aplicando
-        los filtros de búsqueda y cargo, y vuelve a llenar la tabla.
+        Obtiene en segundo plano los Personal de la base de datos aplicando los
+        filtros de búsqueda y cargo. La tabla se actualiza en _show_personal. Con
+        debounce (al escribir) la consulta espera a que el usuario haga una pausa.
         """
-        # Elimina todos los items existentes en el Treeview
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
         # Obtiene los términos de búsqueda y el filtro de cargo actuales
         search_term = self.search_entry.get() if hasattr(self, 'search_entry') else ""
         cargo_filter = self.cargo_filter.get() if hasattr(self, 'cargo_filter') and self.cargo_filter.get() != "Todos" else ""
         
-        # Llama al modelo para obtener la lista de Personal filtrada
-        personal = self.personal_model.get_all_personal(search_term, cargo_filter_name=cargo_filter) 
-        
-        # Itera sobre los Personal obtenidos y los inserta en la tabla
-        for i, personal_data in enumerate(personal):
-            nombre_display = personal_data[1]
-            # Convertir el valor numérico del cargo a texto
-            cargo_display = "Monitor" if personal_data[2] == 1 else "Laboratorista"
-            
-            # Inserta una nueva fila en el Treeview
-            item_id = self.tree.insert("", "end", iid=str(personal_data[0]), values=(
-                nombre_display,
-                cargo_display
-            ))
-            
-            # Alternar colores de fila para mejor legibilidad
-            if i % 2 == 1:
-                self.tree.item(item_id, tags=('alternate',))
-        
-        # Configurar el color de las filas alternas según el tema actual
-        current_mode = ctk.get_appearance_mode()
-        if current_mode == "Dark":
-            self.tree.tag_configure('alternate', background='#323232')
+        # Consulta en segundo plano; una búsqueda nueva reemplaza a la anterior
+        if debounce:
+            self.search.request(search_term, cargo_filter_name=cargo_filter)
         else:
-            self.tree.tag_configure('alternate', background='#f8f9fa')
+            self.search.refresh(search_term, cargo_filter_name=cargo_filter)
         
         # Crea el frame y los botones de acciones (Editar/Eliminar) si no existen.
         if not hasattr(self, 'selected_actions_frame'):
@@ -186,6 +174,35 @@ class PersonalView(ctk.CTkFrame):
         # Llama a on_professor_select para establecer el estado inicial de los botones.
         self.on_professor_select()
 
+    def _show_personal(self, personal):
+        """
+        Reconcilia las filas de la tabla con los Personal obtenidos, conservando
+        la selección y el desplazamiento.
+        """
+        # Arma las filas (iid, valores, tags) de los Personal obtenidos
+        rows = []
+        for i, personal_data in enumerate(personal):
+            nombre_display = personal_data[1]
+            # Convertir el valor numérico del cargo a texto
+            cargo_display = "Monitor" if personal_data[2] == 1 else "Laboratorista"
+            
+            # Alternar colores de fila para mejor legibilidad
+            tags = ('alternate',) if i % 2 == 1 else ()
+            rows.append((str(personal_data[0]), (
+                nombre_display,
+                cargo_display
+            ), tags))
+        sync_treeview(self.tree, rows)
+        
+        # Configurar el color de las filas alternas según el tema actual
+        current_mode = ctk.get_appearance_mode()
+        if current_mode == "Dark":
+            self.tree.tag_configure('alternate', background='#323232')
+        else:
+            self.tree.tag_configure('alternate', background='#f8f9fa')
+        
+        self.on_professor_select()
+
     def on_professor_select(self, event=None):
         """
         Manejador de evento para la selección de un profesor en la tabla.
@@ -270,13 +287,13 @@ class PersonalView(ctk.CTkFrame):
     def on_search(self, event=None): 
         """
         Se ejecuta cada vez que el usuario escribe en el campo de búsqueda.
-        Llama a refresh_personal para filtrar los resultados.
+        Llama a refresh_personal con debounce: las teclas seguidas terminan en una sola consulta.
         """
-        self.refresh_personal()
+        self.refresh_personal(debounce=True)
     
     def on_filter_change(self, _=None):
         """Actualiza la tabla cuando cambia el filtro"""
-        self.refresh_personal()
+        self.refresh_personal(debounce=True)
 
     def add_personal_dialog(self):
         """
@@ -1,7 +1,13 @@
 import customtkinter as ctk
 from tkinter import messagebox, ttk
+from database.catalog import get_catalog
 from database.models import ProfesorModel
 from utils.font_config import get_font
+from views.components.async_query import AsyncQuery, LoadingLabel
+from views.components.search_controller import SearchController, CATALOG_SEARCH_DELAY_MS
+from views.components.virtual_tree import VirtualTreeview
+from views.components.import_dialog import ask_import_file, show_import_result, show_import_error
+from utils.importer import import_professors
 from utils.validators import *
 
 class ProfessorsView(ctk.CTkFrame):
@@ -12,6 +18,9 @@ class ProfessorsView(ctk.CTkFrame):
         # Inicializa el modelo de datos para interactuar con la base de datos de profesores
         self.profesor_model = ProfesorModel()
         
+        # Las consultas corren en segundo plano para no congelar la ventana
+        self.query = AsyncQuery(self)
+        
         # Configurar padding para el frame principal de la vista
         self.pack_propagate(False) # Evitar que los widgets hijos controlen el tamaño del frame principal
         self.pack(padx=15, pady=15, fill="both", expand=True) # Padding general para la vista
@@ -21,6 +30,12 @@ class ProfessorsView(ctk.CTkFrame):
 
         # Creacion de UI y llenar datos de tabla
         self.setup_ui()
+        # Búsqueda mientras se escribe sobre la copia en memoria del catálogo: la pausa es corta
+        # y no hace falta guardar resultados, el catálogo siempre está al día
+        self.catalog = get_catalog(self.profesor_model.db_manager)
+        self.search = SearchController(self.query, "professors", self.catalog.get_all_profesores, self._show_professors,
+                                       on_busy=self.loading_label.set_loading,
+                                       delay_ms=CATALOG_SEARCH_DELAY_MS, cache_size=0)
         self.refresh_professors()
     
     def prevent_resize(self, event):
@@ -58,7 +73,15 @@ class ProfessorsView(ctk.CTkFrame):
         
         # Boton añadir profesor
         add_btn = ctk.CTkButton(search_frame, text="+ Agregar Profesor", command=self.add_professor_dialog, font=get_font("normal"))
-        add_btn.grid(row=0, column=4, padx=(10,10), pady=10)
+        add_btn.grid(row=0, column=5, padx=(10,5), pady=10)
+        
+        # Boton importar lista (Excel o CSV)
+        self.import_btn = ctk.CTkButton(search_frame, text="Importar Lista", command=self.import_roster, font=get_font("normal"))
+        self.import_btn.grid(row=0, column=6, padx=(5,10), pady=10)
+        
+        # Indicador de carga mientras corre la consulta
+        self.loading_label = LoadingLabel(search_frame)
+        self.loading_label.grid(row=0, column=4, padx=(10,0), pady=10)
         
         # Configura la expansión de las columnas en el grid del frame de búsqueda
         search_frame.grid_columnconfigure(1, weight=3) # Más peso a la búsqueda
@@ -85,10 +108,10 @@ class ProfessorsView(ctk.CTkFrame):
         table_container_frame.pack(fill="both", expand=True, padx=8, pady=8)
 
         # Crear el Treeview APLICANDO el estilo global "Modern.Treeview"
-        self.tree = ttk.Treeview(table_container_frame,
-                               columns=("Cedula", "Nombre", "Proyecto"),
-                               show="tree headings",
-                               style="Modern.Treeview") # Se aplica el estilo definido en MainWindow
+        self.tree = VirtualTreeview(table_container_frame,
+                                  columns=("Cedula", "Nombre", "Proyecto"),
+                                  show="tree headings",
+                                  style="Modern.Treeview") # Se aplica el estilo definido en MainWindow
 
         # Encabezados de la tabla
         self.tree.heading("Cedula", text="🆔 Cédula", anchor="w")
@@ -118,46 +141,22 @@ class ProfessorsView(ctk.CTkFrame):
         # Configura el Treeview para que se desplace con la scrollbar
         self.tree.configure(yscrollcommand=scrollbar.set)
 
-    def refresh_professors(self):
+    def refresh_professors(self, debounce=False):
         """
-        Limpia la tabla, obtiene los profesores de la base de datos aplicando
-        los filtros de búsqueda y proyecto, y vuelve a llenar la tabla.
+        Obtiene en segundo plano los profesores de la base de datos aplicando
+        los filtros de búsqueda y proyecto. La tabla se vuelve a llenar
+        en _show_professors cuando llega el resultado. Con debounce (al escribir) la consulta
+        espera a que el usuario haga una pausa y puede salir de la caché de búsquedas.
         """
-        # Elimina todos los items existentes en el Treeview
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
         # Obtiene los términos de búsqueda y el filtro de proyecto actuales
         search_term = self.search_entry.get() if hasattr(self, 'search_entry') else ""
         project_filter = self.project_filter.get() if hasattr(self, 'project_filter') and self.project_filter.get() != "Todos" else ""
         
-        # Llama al modelo para obtener la lista de profesores filtrada
-        profesores = self.profesor_model.get_all_profesores(search_term, project_filter_name=project_filter) 
-        
-        # Itera sobre los profesores obtenidos y los inserta en la tabla.
-        for i, profesor_data in enumerate(profesores):
-            # Simplificar la visualización sin iconos excesivos para mejor legibilidad
-            cedula_display = str(profesor_data[0])
-            nombre_display = profesor_data[1]
-            proyecto_display = profesor_data[2] or 'Sin proyecto'
-            
-            # Inserta una nueva fila en el Treeview.
-            item_id = self.tree.insert("", "end", iid=str(profesor_data[0]), values=(
-                cedula_display,
-                nombre_display, 
-                proyecto_display
-            ))
-            
-            # Alternar colores de fila para mejor legibilidad
-            if i % 2 == 1:
-                self.tree.item(item_id, tags=('alternate',))
-        
-        # Configurar el color de las filas alternas según el tema actual
-        current_mode = ctk.get_appearance_mode()
-        if current_mode == "Dark":
-            self.tree.tag_configure('alternate', background='#323232')
+        # Consulta en segundo plano; una búsqueda nueva reemplaza a la anterior
+        if debounce:
+            self.search.request(search_term, project_filter_name=project_filter)
         else:
-            self.tree.tag_configure('alternate', background='#f8f9fa')
+            self.search.refresh(search_term, project_filter_name=project_filter)
         
         # Crea el frame y los botones de acciones (Editar/Eliminar) si no existen.
         if not hasattr(self, 'selected_actions_frame'):
@@ -190,6 +189,36 @@ class ProfessorsView(ctk.CTkFrame):
         # Llama a on_professor_select para establecer el estado inicial de los botones.
         self.on_professor_select()
 
+    def _show_professors(self, profesores):
+        """Vuelve a llenar la tabla con los profesores obtenidos por refresh_professors."""
+        # Arma las filas (iid, valores, tags) y las reconcilia con las de la tabla:
+        # solo cambia lo distinto y se conservan la selección y el desplazamiento
+        rows = []
+        for i, profesor_data in enumerate(profesores):
+            # Simplificar la visualización sin iconos excesivos para mejor legibilidad
+            cedula_display = str(profesor_data[0])
+            nombre_display = profesor_data[1]
+            proyecto_display = profesor_data[2] or 'Sin proyecto'
+            
+            # Alternar colores de fila para mejor legibilidad
+            tags = ('alternate',) if i % 2 == 1 else ()
+            rows.append((str(profesor_data[0]), (
+                cedula_display,
+                nombre_display, 
+                proyecto_display
+            ), tags))
+        self.tree.sync_rows(rows)
+        
+        # Configurar el color de las filas alternas según el tema actual
+        current_mode = ctk.get_appearance_mode()
+        if current_mode == "Dark":
+            self.tree.tag_configure('alternate', background='#323232')
+        else:
+            self.tree.tag_configure('alternate', background='#f8f9fa')
+        
+        # La selección pudo cambiar (filas que ya no están), actualiza los botones
+        self.on_professor_select()
+
     def on_professor_select(self, event=None):
         """
         Manejador de evento para la selección de un profesor en la tabla.
@@ -262,16 +291,16 @@ class ProfessorsView(ctk.CTkFrame):
     def on_search(self, event=None): 
         """
         Se ejecuta cada vez que el usuario escribe en el campo de búsqueda.
-        Llama a refresh_professors para filtrar los resultados.
+        Llama a refresh_professors con debounce: las teclas seguidas terminan en una sola consulta.
         """
-        self.refresh_professors()
+        self.refresh_professors(debounce=True)
     
     def on_filter_change(self, value=None): 
         """
         Se ejecuta cuando el usuario cambia el valor del filtro de proyecto.
-        Llama a refresh_professors para aplicar el nuevo filtro.
+        Llama a refresh_professors para aplicar el nuevo filtro (puede salir de la caché).
         """
-        self.refresh_professors()
+        self.refresh_professors(debounce=True)
     
     def add_professor_dialog(self):
         """
@@ -287,6 +316,27 @@ class ProfessorsView(ctk.CTkFrame):
             # Refresca la tabla para mostrar el nuevo registro.
             self.refresh_professors()
     
+    def import_roster(self):
+        """
+        Importa una lista de profesores desde un archivo Excel o CSV. La carga corre
+        en segundo plano y al terminar se muestra el resumen y los errores por fila.
+        """
+        file_path = ask_import_file(self, "Importar Profesores")
+        if not file_path:
+            return
+        self.query.run("import", import_professors, file_path,
+                       on_result=self._on_roster_imported,
+                       on_error=lambda e: show_import_error(self, e),
+                       on_busy=self._set_importing)
+
+    def _set_importing(self, busy):
+        self.import_btn.configure(state="disabled" if busy else "normal",
+                                  text="Importando..." if busy else "Importar Lista")
+
+    def _on_roster_imported(self, result):
+        show_import_result(self, result, "Profesores")
+        self.refresh_professors()
+    
     def on_theme_change(self, event=None):
         """
         Actualiza la vista cuando cambia el tema. Los estilos ya fueron 
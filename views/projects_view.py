@@ -2,6 +2,9 @@ import customtkinter as ctk
 from tkinter import messagebox, ttk
 from database.models import ProyectosCurricularesModel
 from utils.font_config import get_font
+from views.components.async_query import AsyncQuery
+from views.components.search_controller import SearchController
+from views.components.virtual_tree import sync_treeview
 from utils.validators import *
 
 class ProyectosView(ctk.CTkFrame):
@@ -9,6 +12,9 @@ class ProyectosView(ctk.CTkFrame):
         super().__init__(parent, fg_color="transparent")
         
         self.proyectos_model = ProyectosCurricularesModel()
+        self.query = AsyncQuery(self)
+        # Search-as-you-type: waits for a pause and reuses the recent results
+        self.search = SearchController(self.query, "proyectos", self.proyectos_model.get_all_proyectos, self._show_proyectos)
         
         self.pack_propagate(False)
         self.pack(padx=15, pady=15, fill="both", expand=True)
@@ -68,20 +74,13 @@ class ProyectosView(ctk.CTkFrame):
         self.tree.bind("<Button-1>", self.prevent_resize)
         self.tree.bind("<B1-Motion>", self.prevent_resize)
 
-    def refresh_proyectos(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
+    def refresh_proyectos(self, debounce=False):
+        # Reads the list in the background; with debounce (typing) it waits for a pause
         search_term = self.search_entry.get()
-        proyectos_list = self.proyectos_model.get_all_proyectos(search_term)
-        
-        for i, proyecto_data in enumerate(proyectos_list):
-            item_id = self.tree.insert("", "end", iid=str(proyecto_data[0]), values=(proyecto_data[0], proyecto_data[1]))
-            if i % 2 == 1:
-                self.tree.item(item_id, tags=('alternate',))
-        
-        current_mode = ctk.get_appearance_mode()
-        self.tree.tag_configure('alternate', background=('#f8f9fa' if current_mode == "Light" else '#323232'))
+        if debounce:
+            self.search.request(search_term)
+        else:
+            self.search.refresh(search_term)
         
         if not hasattr(self, 'selected_actions_frame'):
             self.selected_actions_frame = ctk.CTkFrame(self, corner_radius=12)
@@ -97,6 +96,17 @@ class ProyectosView(ctk.CTkFrame):
         
         self.on_proyecto_select()
 
+    def _show_proyectos(self, proyectos_list):
+        # Reconciled with the rows already in the table, keeping the selection and the scroll position
+        rows = [(str(proyecto_data[0]), (proyecto_data[0], proyecto_data[1]), ('alternate',) if i % 2 == 1 else ())
+                for i, proyecto_data in enumerate(proyectos_list)]
+        sync_treeview(self.tree, rows)
+        
+        current_mode = ctk.get_appearance_mode()
+        self.tree.tag_configure('alternate', background=('#f8f9fa' if current_mode == "Light" else '#323232'))
+        
+        self.on_proyecto_select()
+
     def on_proyecto_select(self, event=None):
         if hasattr(self, 'edit_selected_btn'):
             if self.tree.focus():
@@ -132,7 +142,7 @@ class ProyectosView(ctk.CTkFrame):
                 self.refresh_proyectos()
     
     def on_search(self, event=None): 
-        self.refresh_proyectos()
+        self.refresh_proyectos(debounce=True)
     
     def add_proyecto_dialog(self):
         dialog = ProyectoDialog(self, "Agregar Proyecto Curricular")
@@ -1,6 +1,6 @@
 import customtkinter as ctk
 from tkinter import messagebox, ttk
-from database.models import RoomLoanModel, PersonalLaboratorioModel, StudentModel, ProfesorModel, RoomModel, EquiposModel
+from database.models import RoomLoanModel, PersonalLaboratorioModel, StudentModel, ProfesorModel, RoomModel, EquiposModel, HISTORY_PAGE_SIZE
 from utils.font_config import get_font
 from datetime import datetime
 import os, sys
@@ -9,6 +9,11 @@ from PIL import Image, ImageTk
 from views.students_view import StudentDialog
 from views.profesores_view import ProfessorDialog
 from views.components.suggestion_box import SuggestionBox
+from views.components.async_query import AsyncQuery
+from views.components.search_controller import SearchController
+from views.components.virtual_tree import VirtualTreeview
+from views.components.import_dialog import ask_import_file, show_import_result, show_import_error
+from utils.legacy_loans import import_legacy_loans, summarize_legacy
 
 class RoomLoansView(ctk.CTkFrame):
     """
@@ -29,6 +34,13 @@ class RoomLoansView(ctk.CTkFrame):
         self.room_model = RoomModel()
         self.equipos_model = EquiposModel()
 
+        # Runs the model calls off the Tk thread
+        self.query = AsyncQuery(self)
+        # First pages of the history: the search box waits for a pause and reuses recent results
+        self.history_search = SearchController(self.query, "room_history", self._fetch_history_page,
+                                               self._show_history_page, key="history",
+                                               on_busy=self._set_history_loading)
+
         self.setup_ui()
         self._show_new_loan_view()
 
@@ -43,11 +55,38 @@ class RoomLoansView(ctk.CTkFrame):
         self.history_btn = ctk.CTkButton(self.nav_frame, text="Historial de Préstamos", command=self._show_history_view, font=get_font("normal", "bold"), text_color=("#222","#fff"))
         self.history_btn.pack(side="left", padx=5)
 
+        # Carga del historial de préstamos llevado antes en papel o Excel
+        self.import_history_btn = ctk.CTkButton(self.nav_frame, text="Importar Historial", command=self.import_history, font=get_font("normal", "bold"), text_color=("#222","#fff"))
+        self.import_history_btn.pack(side="right", padx=(5, 0))
+
         self.content_frame = ctk.CTkFrame(self, fg_color="transparent")
         self.content_frame.pack(fill="both", expand=True, padx=0, pady=0)
     
+    def import_history(self):
+        """
+        Importa el historial de préstamos desde un archivo Excel o CSV. La carga corre
+        en segundo plano; al terminar se muestra el resumen y el historial.
+        """
+        file_path = ask_import_file(self, "Importar Historial de Préstamos")
+        if not file_path:
+            return
+        self.query.run("import", import_legacy_loans, file_path, "salas",
+                       on_result=self._on_history_imported,
+                       on_error=lambda e: show_import_error(self, e),
+                       on_busy=self._set_importing)
+
+    def _set_importing(self, busy):
+        self.import_history_btn.configure(state="disabled" if busy else "normal",
+                                          text="Importando..." if busy else "Importar Historial")
+
+    def _on_history_imported(self, result):
+        show_import_result(self, result, "Préstamos", summarize_legacy(result))
+        self._show_history_view()
+
     def _clear_content_frame(self):
         """Clears all widgets from the content frame."""
+        # A history page still loading has no Treeview to go to anymore
+        self.history_search.cancel()
         for widget in self.content_frame.winfo_children():
             widget.destroy()
 
@@ -139,8 +178,8 @@ class RoomLoansView(ctk.CTkFrame):
         self.obs_textbox.grid(row=6, column=1, padx=5, pady=10, sticky="ew")
 
         # Save Button
-        save_btn = ctk.CTkButton(form_grid, text="Guardar Préstamo", command=self._save_loan, font=get_font("normal", "bold"))
-        save_btn.grid(row=7, column=0, columnspan=2, pady=20, padx=5, sticky="ew")
+        self.save_btn = ctk.CTkButton(form_grid, text="Guardar Préstamo", command=self._save_loan, font=get_font("normal", "bold"))
+        self.save_btn.grid(row=7, column=0, columnspan=2, pady=20, padx=5, sticky="ew")
 
         self._on_user_type_change()
 
@@ -345,6 +384,11 @@ class RoomLoansView(ctk.CTkFrame):
                 else:
                     return # Cancelar si el usuario cierra el diálogo
 
+        # Con las llaves foráneas activas el préstamo debe guardar el código del estudiante,
+        # también cuando se buscó por su cédula
+        if user_type == "Estudiante" and isinstance(user_exists, tuple):
+            user_id = user_exists[0]
+
         monitor_nombre = self.monitor_combo.get()
         observaciones = self.obs_textbox.get("1.0", "end-1c").strip()
         
@@ -353,14 +397,27 @@ class RoomLoansView(ctk.CTkFrame):
         
         fecha_entrada = datetime.now()
 
+        # The insert runs in the background; the button stays disabled until it finishes
         if user_type == "Estudiante":
-            result = self.room_loan_model.add_loan_student(fecha_entrada, laboratorista_id, monitor_id, sala_id, user_id, equipo_codigo_val, observaciones)
+            self.query.run("save", self.room_loan_model.add_loan_student, fecha_entrada, laboratorista_id, monitor_id, sala_id, user_id, equipo_codigo_val, observaciones,
+                           on_result=self._on_loan_saved, on_busy=self._set_saving)
         else:
-            result = self.room_loan_model.add_loan_professor(fecha_entrada, laboratorista_id, monitor_id, sala_id, user_id, observaciones)
+            self.query.run("save", self.room_loan_model.add_loan_professor, fecha_entrada, laboratorista_id, monitor_id, sala_id, user_id, observaciones,
+                           on_result=self._on_loan_saved, on_busy=self._set_saving)
+
+    def _set_saving(self, busy):
+        """Disables the save button while the loan is being written."""
+        if self.save_btn.winfo_exists():
+            self.save_btn.configure(state="disabled" if busy else "normal",
+                                    text="Guardando..." if busy else "Guardar Préstamo")
 
+    def _on_loan_saved(self, result):
+        """Reports the result of the insert started by _save_loan."""
         if result:
             messagebox.showinfo("Éxito", "Préstamo de sala registrado correctamente.", parent=self)
-            self._show_new_loan_view()
+            # Only reset the form if the user is still on it
+            if self.save_btn.winfo_exists():
+                self._show_new_loan_view()
         else:
             messagebox.showerror("Error en Base de Datos", "No se pudo registrar el préstamo. Verifique que la sala esté disponible.", parent=self)
 
@@ -410,7 +467,8 @@ class RoomLoansView(ctk.CTkFrame):
         table_container_frame.grid_columnconfigure(0, weight=1)
         
         columns = ("tipo_usuario", "fecha_entrada", "estado", "usuario_nombre", "usuario_id", "sala_nombre", "laboratorista", "monitor", "hora_salida", "numero_equipo", "firma", "observaciones")
-        self.tree = ttk.Treeview(table_container_frame, columns=columns, show="headings", style="Modern.Treeview")
+        self.tree = VirtualTreeview(table_container_frame, columns=columns, show="headings", style="Modern.Treeview",
+                                    near_end_command=self._load_more_on_scroll)
         
         for col, text in [
             ("tipo_usuario", "👤 Tipo"), ("fecha_entrada", "📅 Fecha Entrada"), ("estado", "📊 Estado"),
@@ -436,6 +494,17 @@ class RoomLoansView(ctk.CTkFrame):
         self.tree.grid(row=0, column=0, sticky="nsew", padx=(5, 0), pady=(5, 0))
         v_scroll.grid(row=0, column=1, sticky="ns", padx=(0, 5), pady=(5, 0))
         h_scroll.grid(row=1, column=0, sticky="ew", padx=(5, 0), pady=(0, 5))
+
+        # El historial se carga por páginas; "Cargar más" trae la siguiente
+        self.loan_data = {}
+        self.history_cursor = None
+        self.history_total = 0
+        self.pager_frame = ctk.CTkFrame(self.content_frame, fg_color="transparent")
+        self.pager_frame.pack(fill="x", padx=0)
+        self.page_info_label = ctk.CTkLabel(self.pager_frame, text="", font=get_font("small"))
+        self.page_info_label.pack(side="left", padx=10)
+        self.load_more_btn = ctk.CTkButton(self.pager_frame, text="Cargar más", command=self._load_more_loans, state="disabled", font=get_font("normal"), corner_radius=8, height=30, text_color=("#222","#fff"))
+        self.load_more_btn.pack(side="right", padx=8)
         
         self._populate_history_treeview()
         
@@ -455,29 +524,68 @@ class RoomLoansView(ctk.CTkFrame):
     def _apply_filters(self, event=None):
         """Repopulates the history view when a filter changes."""
         if hasattr(self, 'tree'):
-            self._populate_history_treeview()
-
-    def _populate_history_treeview(self):
-        """Fetches data from the model and populates the Treeview."""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
+            self._populate_history_treeview(debounce=True)
+
+    def _populate_history_treeview(self, keep_loaded=False, debounce=False):
+        """
+        Loads the first page for the current filters in the background. With
+        keep_loaded the first page covers every row already loaded, so a refresh
+        after a return or an edit keeps the pages the user scrolled through. With
+        debounce (typing, filters) it waits for a pause and may come from the cache.
+        """
         sala_filter_name = self.sala_filter_combo.get()
         sala_filter_id = next((s[0] for s in self.all_salas_data if s[1] == sala_filter_name), None)
 
-        loans = self.room_loan_model.get_room_loans(
+        # Filters are kept so that "Cargar más" continues the same listing
+        self.history_filters = dict(
             search_term=self.search_entry.get(),
             user_type_filter=self.user_type_filter.get(),
             status_filter=self.status_filter.get(),
             sala_filter_id=sala_filter_id
         )
-        
-        current_mode = ctk.get_appearance_mode()
-        yellow_fg = '#f59e0b'
-        self.tree.tag_configure('active_loan', foreground=yellow_fg)
-        self.tree.tag_configure('alternate', background='#323232' if current_mode == "Dark" else '#f8f9fa')
-
-        for i, loan in enumerate(loans):
+        page_size = max(HISTORY_PAGE_SIZE, len(self.loan_data)) if keep_loaded else HISTORY_PAGE_SIZE
+        if debounce:
+            self.history_search.request(self.history_filters, None, page_size)
+        else:
+            self.history_search.refresh(self.history_filters, None, page_size)
+
+    def _load_more_loans(self):
+        """Requests the next page of the history, once the first page of the current filters is in."""
+        if self.history_cursor is not None and not self.history_search.is_pending():
+            self._request_history_page(self.history_cursor)
+
+    def _load_more_on_scroll(self):
+        """Requests the next page when the table gets to the last loaded rows, without waiting for "Cargar más"."""
+        self._load_more_loans()
+
+    def _request_history_page(self, cursor, page_size=HISTORY_PAGE_SIZE):
+        # Every request shares the "history" key, so a newer filter supersedes a page still loading
+        self.query.run("history", self._fetch_history_page, self.history_filters, cursor, page_size,
+                       on_result=self._show_history_page, on_busy=self._set_history_loading)
+
+    def _fetch_history_page(self, filters, cursor, page_size):
+        """Runs in a worker thread: reads one page and, for the first one, the total."""
+        loans, next_cursor = self.room_loan_model.get_room_loans_page(page_size=page_size, cursor=cursor, **filters)
+        total = self.room_loan_model.count_room_loans(**filters) if cursor is None else None
+        return loans, next_cursor, total
+
+    def _show_history_page(self, page):
+        """
+        Adds a fetched page to the Treeview. The first page is reconciled with the
+        rows shown, so the unchanged loans, the selection and the scroll position stay.
+        """
+        loans, self.history_cursor, total = page
+        if total is not None:
+            self.loan_data = {}
+            self.history_total = total
+
+            current_mode = ctk.get_appearance_mode()
+            yellow_fg = '#f59e0b'
+            self.tree.tag_configure('active_loan', foreground=yellow_fg)
+            self.tree.tag_configure('alternate', background='#323232' if current_mode == "Dark" else '#f8f9fa')
+
+        rows = []
+        for i, loan in enumerate(loans, start=len(self.loan_data)):
             (loan_id, tipo_usuario, usuario_nombre, sala_nombre, fecha_entrada, hora_salida, 
              laboratorista, monitor, observaciones, user_id, loan_type, numero_equipo, 
              estado_prestamo, firma, equipo_codigo) = loan
@@ -493,10 +601,29 @@ class RoomLoansView(ctk.CTkFrame):
             tags = ('alternate',) if i % 2 == 1 else ()
             if estado_prestamo == 'En Préstamo':
                 tags += ('active_loan',)
-            iid = f"{loan_type}_{loan_id}"
-            self.tree.insert("", "end", iid=iid, values=values, tags=tags)
-        
-        self.loan_data = {f"{loan[10]}_{loan[0]}": loan for loan in loans}
+            rows.append((f"{loan_type}_{loan_id}", values, tags))
+
+        if total is not None:
+            self.tree.sync_rows(rows)
+        else:
+            for iid, values, tags in rows:
+                self.tree.insert("", "end", iid=iid, values=values, tags=tags)
+        self.loan_data.update({f"{loan[10]}_{loan[0]}": loan for loan in loans})
+        self._update_pager()
+        if total is not None:
+            self._on_loan_select()
+
+    def _set_history_loading(self, busy):
+        """Shows the loading state in the pager while a page is being read."""
+        if busy:
+            self.page_info_label.configure(text="Cargando préstamos...")
+            self.load_more_btn.configure(state="disabled")
+        else:
+            self._update_pager()
+
+    def _update_pager(self):
+        self.page_info_label.configure(text=f"Mostrando {len(self.loan_data)} de {self.history_total} préstamos")
+        self.load_more_btn.configure(state="normal" if self.history_cursor is not None else "disabled")
 
     def _on_loan_select(self, event=None):
         """Updates button states based on the selected loan."""
@@ -568,9 +695,9 @@ class RoomLoansView(ctk.CTkFrame):
                 messagebox.showerror("Error", "No se pudo eliminar el préstamo.", parent=self)
     
     def refresh_loans(self):
-        """Refreshes the loan history table."""
+        """Refreshes the loan history table, keeping the rows loaded so far."""
         if hasattr(self, 'tree'):
-            self._populate_history_treeview()
+            self._populate_history_treeview(keep_loaded=True)
             self._on_loan_select()
             self.update_idletasks()
 
@@ -1,7 +1,9 @@
 import customtkinter as ctk
 from tkinter import messagebox, ttk
+from database.catalog import get_catalog
 from database.models import RoomModel
 from utils.font_config import get_font
+from views.components.virtual_tree import sync_treeview
 from utils.validators import *
 
 class RoomsView(ctk.CTkFrame):
@@ -11,6 +13,8 @@ class RoomsView(ctk.CTkFrame):
         
         # Inicializa el modelo de datos para interactuar con la base de datos de salas
         self.room_model = RoomModel()
+        # Copia en memoria de las salas, filtrada sin consultar la base de datos
+        self.catalog = get_catalog(self.room_model.db_manager)
         
         # Configurar padding para el frame principal de la vista
         self.pack_propagate(False) # Evitar que los widgets hijos controlen el tamaño del frame principal
@@ -109,41 +113,31 @@ class RoomsView(ctk.CTkFrame):
 
     def refresh_rooms(self):
         """
-        Limpia la tabla, obtiene las salas de la base de datos y vuelve a llenar la tabla.
+        Obtiene las salas de la base de datos y las reconcilia con las filas de la
+        tabla, conservando la selección y el desplazamiento.
         """
-        # Elimina todos los items existentes en el Treeview
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
         # Obtiene los términos de búsqueda actuales
         search_term = self.search_entry.get() if hasattr(self, 'search_entry') else ""
         
-        # Llama al modelo para obtener la lista de salas
-        rooms = self.room_model.get_all_rooms_with_status()
+        # Filtra las salas por código o nombre en el catálogo en memoria
+        rooms = self.catalog.get_all_rooms_with_status(search_term)
         
-        # Itera sobre las salas obtenidas y las inserta en la tabla.
+        # Arma las filas (iid, valores, tags) de las salas obtenidas.
+        rows = []
         for i, room_data in enumerate(rooms):
             # Simplificar la visualización sin iconos excesivos para mejor legibilidad
             codigo_display = str(room_data[1])  # codigo_interno
             nombre_display = room_data[2]       # nombre
             estado_display = room_data[3]       # estado
             
-            # Inserta una nueva fila en el Treeview.
-            item_id = self.tree.insert("", "end", iid=str(room_data[0]), values=(
+            # Colorear el estado
+            tags = ('occupied',) if estado_display == "Ocupada" else ('available',)
+            rows.append((str(room_data[0]), (
                 codigo_display,
                 nombre_display, 
                 estado_display
-            ))
-            
-            # Alternar colores de fila para mejor legibilidad
-            if i % 2 == 1:
-                self.tree.item(item_id, tags=('alternate',))
-            
-            # Colorear el estado
-            if estado_display == "Ocupada":
-                self.tree.item(item_id, tags=('occupied',))
-            else:
-                self.tree.item(item_id, tags=('available',))
+            ), tags))
+        sync_treeview(self.tree, rows)
         
         # Configurar el color de las filas alternas según el tema actual
         current_mode = ctk.get_appearance_mode()
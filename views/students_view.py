@@ -1,7 +1,13 @@
 import customtkinter as ctk
 from tkinter import messagebox, ttk
+from database.catalog import get_catalog
 from database.models import StudentModel
 from utils.font_config import get_font
+from views.components.async_query import AsyncQuery, LoadingLabel
+from views.components.search_controller import SearchController, CATALOG_SEARCH_DELAY_MS
+from views.components.virtual_tree import VirtualTreeview
+from views.components.import_dialog import ask_import_file, show_import_result, show_import_error, RosterSyncDialog
+from utils.importer import import_students, sync_students
 from utils.validators import *
 
 class StudentsView(ctk.CTkFrame):
@@ -12,6 +18,9 @@ class StudentsView(ctk.CTkFrame):
         # Inicializa el modelo de datos para interactuar con la base de datos de estudiantes
         self.student_model = StudentModel()
         
+        # Las consultas corren en segundo plano para no congelar la ventana
+        self.query = AsyncQuery(self)
+        
         # Configurar padding para el frame principal de la vista
         self.pack_propagate(False) # Evitar que los widgets hijos controlen el tamaño del frame principal
         self.pack(padx=15, pady=15, fill="both", expand=True) # Padding general para la vista
@@ -21,6 +30,12 @@ class StudentsView(ctk.CTkFrame):
 
         # Creacion de UI y llenar datos de tabla
         self.setup_ui()
+        # Búsqueda mientras se escribe sobre la copia en memoria del catálogo: la pausa es corta
+        # y no hace falta guardar resultados, el catálogo siempre está al día
+        self.catalog = get_catalog(self.student_model.db_manager)
+        self.search = SearchController(self.query, "students", self.catalog.get_all_students, self._show_students,
+                                       on_busy=self.loading_label.set_loading,
+                                       delay_ms=CATALOG_SEARCH_DELAY_MS, cache_size=0)
         self.refresh_students()
     
     def prevent_resize(self, event):
@@ -58,7 +73,19 @@ class StudentsView(ctk.CTkFrame):
         
         # Boton añadir estudiante
         add_btn = ctk.CTkButton(search_frame, text="+ Agregar Estudiante", command=self.add_student_dialog, font=get_font("normal"))
-        add_btn.grid(row=0, column=4, padx=(10,10), pady=10)
+        add_btn.grid(row=0, column=5, padx=(10,5), pady=10)
+        
+        # Boton importar lista (Excel o CSV)
+        self.import_btn = ctk.CTkButton(search_frame, text="Importar Lista", command=self.import_roster, font=get_font("normal"))
+        self.import_btn.grid(row=0, column=6, padx=5, pady=10)
+        
+        # Boton sincronizar con la lista completa del semestre
+        self.sync_btn = ctk.CTkButton(search_frame, text="Sincronizar Semestre", command=self.sync_roster, font=get_font("normal"))
+        self.sync_btn.grid(row=0, column=7, padx=(5,10), pady=10)
+        
+        # Indicador de carga mientras corre la consulta
+        self.loading_label = LoadingLabel(search_frame)
+        self.loading_label.grid(row=0, column=4, padx=(10,0), pady=10)
         
         # Configura la expansión de las columnas en el grid del frame de búsqueda
         search_frame.grid_columnconfigure(1, weight=3) # Más peso a la búsqueda
@@ -85,10 +112,10 @@ class StudentsView(ctk.CTkFrame):
         table_container_frame.pack(fill="both", expand=True, padx=8, pady=8)
 
         # Crear el Treeview APLICANDO el estilo global "Modern.Treeview"
-        self.tree = ttk.Treeview(table_container_frame,
-                               columns=("Codigo", "Nombre", "Cedula", "Proyecto"),
-                               show="tree headings",
-                               style="Modern.Treeview") # Se aplica el estilo definido en MainWindow
+        self.tree = VirtualTreeview(table_container_frame,
+                                  columns=("Codigo", "Nombre", "Cedula", "Proyecto"),
+                                  show="tree headings",
+                                  style="Modern.Treeview") # Se aplica el estilo definido en MainWindow
 
         # Encabezados de la tabla
         self.tree.heading("Codigo", text="📋 Código", anchor="w")
@@ -120,48 +147,22 @@ class StudentsView(ctk.CTkFrame):
         # Configura el Treeview para que se desplace con la scrollbar
         self.tree.configure(yscrollcommand=scrollbar.set)
 
-    def refresh_students(self):
+    def refresh_students(self, debounce=False):
         """
-        Limpia la tabla, obtiene los estudiantes de la base de datos aplicando
-        los filtros de búsqueda y proyecto, y vuelve a llenar la tabla.
+        Obtiene en segundo plano los estudiantes de la base de datos aplicando
+        los filtros de búsqueda y proyecto. La tabla se vuelve a llenar
+        en _show_students cuando llega el resultado. Con debounce (al escribir) la consulta
+        espera a que el usuario haga una pausa y puede salir de la caché de búsquedas.
         """
-        # Elimina todos los items existentes en el Treeview
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
         # Obtiene los términos de búsqueda y el filtro de proyecto actuales
         search_term = self.search_entry.get() if hasattr(self, 'search_entry') else ""
         project_filter = self.project_filter.get() if hasattr(self, 'project_filter') and self.project_filter.get() != "Todos" else ""
         
-        # Llama al modelo para obtener la lista de estudiantes filtrada
-        students = self.student_model.get_all_students(search_term, project_filter_name=project_filter) 
-        
-        # Itera sobre los estudiantes obtenidos y los inserta en la tabla.
-        for i, student_data in enumerate(students):
-            # Simplificar la visualización sin iconos excesivos para mejor legibilidad
-            codigo_display = str(student_data[0])
-            nombre_display = student_data[1]
-            cedula_display = str(student_data[2])
-            proyecto_display = student_data[3] or 'Sin proyecto'
-            
-            # Inserta una nueva fila en el Treeview.
-            item_id = self.tree.insert("", "end", iid=str(student_data[0]), values=(
-                codigo_display,
-                nombre_display, 
-                cedula_display,
-                proyecto_display
-            ))
-            
-            # Alternar colores de fila para mejor legibilidad
-            if i % 2 == 1:
-                self.tree.item(item_id, tags=('alternate',))
-        
-        # Configurar el color de las filas alternas según el tema actual
-        current_mode = ctk.get_appearance_mode()
-        if current_mode == "Dark":
-            self.tree.tag_configure('alternate', background='#323232')
+        # Consulta en segundo plano; una búsqueda nueva reemplaza a la anterior
+        if debounce:
+            self.search.request(search_term, project_filter_name=project_filter)
         else:
-            self.tree.tag_configure('alternate', background='#f8f9fa')
+            self.search.refresh(search_term, project_filter_name=project_filter)
         
         # Crea el frame y los botones de acciones (Editar/Eliminar) si no existen.
         if not hasattr(self, 'selected_actions_frame'):
@@ -194,6 +195,38 @@ class StudentsView(ctk.CTkFrame):
         # Llama a on_student_select para establecer el estado inicial de los botones.
         self.on_student_select()
 
+    def _show_students(self, students):
+        """Vuelve a llenar la tabla con los estudiantes obtenidos por refresh_students."""
+        # Arma las filas (iid, valores, tags) y las reconcilia con las de la tabla:
+        # solo cambia lo distinto y se conservan la selección y el desplazamiento
+        rows = []
+        for i, student_data in enumerate(students):
+            # Simplificar la visualización sin iconos excesivos para mejor legibilidad
+            codigo_display = str(student_data[0])
+            nombre_display = student_data[1]
+            cedula_display = str(student_data[2])
+            proyecto_display = student_data[3] or 'Sin proyecto'
+            
+            # Alternar colores de fila para mejor legibilidad
+            tags = ('alternate',) if i % 2 == 1 else ()
+            rows.append((str(student_data[0]), (
+                codigo_display,
+                nombre_display, 
+                cedula_display,
+                proyecto_display
+            ), tags))
+        self.tree.sync_rows(rows)
+        
+        # Configurar el color de las filas alternas según el tema actual
+        current_mode = ctk.get_appearance_mode()
+        if current_mode == "Dark":
+            self.tree.tag_configure('alternate', background='#323232')
+        else:
+            self.tree.tag_configure('alternate', background='#f8f9fa')
+        
+        # La selección pudo cambiar (filas que ya no están), actualiza los botones
+        self.on_student_select()
+
     def on_student_select(self, event=None):
         """
         Manejador de evento para la selección de un estudiante en la tabla.
@@ -275,16 +308,16 @@ class StudentsView(ctk.CTkFrame):
     def on_search(self, event=None): 
         """
         Se ejecuta cada vez que el usuario escribe en el campo de búsqueda.
-        Llama a refresh_students para filtrar los resultados.
+        Llama a refresh_students con debounce: las teclas seguidas terminan en una sola consulta.
         """
-        self.refresh_students()
+        self.refresh_students(debounce=True)
     
     def on_filter_change(self, value=None): 
         """
         Se ejecuta cuando el usuario cambia el valor del filtro de proyecto.
-        Llama a refresh_students para aplicar el nuevo filtro.
+        Llama a refresh_students para aplicar el nuevo filtro (puede salir de la caché).
         """
-        self.refresh_students()
+        self.refresh_students(debounce=True)
     
     def add_student_dialog(self):
         """
@@ -300,6 +333,63 @@ class StudentsView(ctk.CTkFrame):
             # Refresca la tabla para mostrar el nuevo registro.
             self.refresh_students()
     
+    def import_roster(self):
+        """
+        Importa una lista de estudiantes desde un archivo Excel o CSV. La carga corre
+        en segundo plano y al terminar se muestra el resumen y los errores por fila.
+        """
+        file_path = ask_import_file(self, "Importar Estudiantes")
+        if not file_path:
+            return
+        self.query.run("import", import_students, file_path,
+                       on_result=self._on_roster_imported,
+                       on_error=lambda e: show_import_error(self, e),
+                       on_busy=self._set_importing)
+
+    def _set_importing(self, busy):
+        self.import_btn.configure(state="disabled" if busy else "normal",
+                                  text="Importando..." if busy else "Importar Lista")
+
+    def _on_roster_imported(self, result):
+        show_import_result(self, result, "Estudiantes")
+        self.refresh_students()
+
+    def sync_roster(self):
+        """
+        Compara la lista completa del semestre con los estudiantes registrados. Primero
+        se muestran los cambios (simulación) y solo se escriben si el usuario los aplica.
+        """
+        file_path = ask_import_file(self, "Sincronizar Lista del Semestre")
+        if not file_path:
+            return
+        self.query.run("sync", sync_students, file_path,
+                       on_result=lambda result: self._show_sync_preview(file_path, result),
+                       on_error=lambda e: show_import_error(self, e),
+                       on_busy=self._set_syncing)
+
+    def _show_sync_preview(self, file_path, result):
+        project_names = dict(self.student_model.get_curriculum_projects())
+        RosterSyncDialog(self, result, project_names, on_apply=lambda: self._apply_sync(file_path))
+
+    def _apply_sync(self, file_path):
+        self.query.run("sync", sync_students, file_path, apply=True,
+                       on_result=self._on_roster_synced,
+                       on_error=lambda e: show_import_error(self, e),
+                       on_busy=self._set_syncing)
+
+    def _set_syncing(self, busy):
+        self.sync_btn.configure(state="disabled" if busy else "normal",
+                                text="Sincronizando..." if busy else "Sincronizar Semestre")
+
+    def _on_roster_synced(self, result):
+        diff = result.diff
+        messagebox.showinfo(
+            "Sincronización Terminada",
+            f"Nuevos: {len(diff.inserts)}\nCompletados: {len(diff.filled)}\nActualizados: {len(diff.updates)}",
+            parent=self
+        )
+        self.refresh_students()
+    
     # --- MODIFICADO: Simplificar el método de cambio de tema ---
     def on_theme_change(self, event=None):
         """